@@ -0,0 +1,170 @@
+# benchmarks/analyzer.py
+"""
+Конвейеры анализатора BM25 (ANALYZER_STEPS) на HTML-фикстурах: размер постингов, латентность
+запроса (анализ + оценки BM25) и качество выдачи одного только BM25 (recall@k / MRR по страницам).
+
+    python -m benchmarks.analyzer
+    python -m benchmarks.analyzer --scale 200 --repeat 5 --output analyzer.json
+    python -m benchmarks.analyzer --pipeline regex= --pipeline full=translit,stopwords,stem
+
+--scale N повторяет корпус N раз: постинги и стоимость запроса растут как на большом пространстве.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.stubs import CORPUS_DIR, QUERIES_PATH, StubConfluenceAPI
+from hybrid_search.analyzer import Analyzer
+from hybrid_search.bm25 import StreamingBM25
+from hybrid_search.utils import html_to_text, logger
+
+K_VALUES = (1, 3, 5)
+DEFAULT_PIPELINES = ['regex=', 'stem=stopwords,stem', 'translit=translit,stopwords,stem']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Анализатор BM25: постинги, латентность, recall")
+    parser.add_argument('--corpus', default=CORPUS_DIR)
+    parser.add_argument('--queries', default=QUERIES_PATH)
+    parser.add_argument('--pipeline', action='append', metavar='NAME=STEPS',
+                        help="Конвейер (можно несколько): имя=шаги через запятую; пусто — только regex")
+    parser.add_argument('--scale', type=int, default=1, help="Повторить корпус N раз")
+    parser.add_argument('--repeat', type=int, default=3, help="Прогонов запросов для латентности")
+    parser.add_argument('--output', help="Куда сохранить JSON-отчёт")
+    return parser.parse_args(argv)
+
+
+def load_corpus(corpus_dir: str) -> Dict[str, str]:
+    """page_id → текст страницы (как при полной загрузке: BM25 строится по страницам)"""
+    api = StubConfluenceAPI(corpus_dir)
+    return {page_id: html_to_text(api.get_content(page_id)) for page_id in api.index}
+
+
+def percentiles_us(values: List[float]) -> Dict[str, float]:
+    return {
+        'p50': round(float(np.percentile(values, 50)) * 1e6, 1),
+        'p95': round(float(np.percentile(values, 95)) * 1e6, 1),
+        'avg': round(float(np.mean(values)) * 1e6, 1),
+    }
+
+
+def run_pipeline(steps: List[str], pages: Dict[str, str], queries: List[Dict], scale: int, repeat: int) -> Dict:
+    analyzer = Analyzer(steps)
+    doc_pages = [page_id for _ in range(scale) for page_id in pages]
+
+    started = time.perf_counter()
+    bm25 = StreamingBM25()
+    terms_total = 0
+    for page_id in doc_pages:
+        tokens = analyzer.analyze(pages[page_id])
+        terms_total += len(tokens)
+        bm25.add_document(tokens)
+    bm25.finalize()
+    build_seconds = time.perf_counter() - started
+    analyzer.hits = analyzer.misses = 0
+
+    timings = {'cold': [], 'warm': []}  # cold — первый прогон (кэш анализа пуст)
+    scanned, query_terms = [], []
+    recall = {k: 0.0 for k in K_VALUES}
+    mrr, zero = 0.0, 0
+    for run in range(repeat):
+        for item in queries:
+            begin = time.perf_counter()
+            terms = analyzer.analyze(item['query'])
+            scores = bm25.get_scores(terms)
+            timings['warm' if run else 'cold'].append(time.perf_counter() - begin)
+            if run > 0:
+                continue
+
+            query_terms.append(len(terms))
+            scanned.append(sum(bm25.document_frequency(term) for term in set(terms)))
+            ranked = []
+            for index in np.argsort(-scores, kind='stable'):
+                if scores[index] <= 0:
+                    break
+                if doc_pages[index] not in ranked:
+                    ranked.append(doc_pages[index])
+            if not ranked:
+                zero += 1
+            relevant = set(item['relevant'])
+            for k in K_VALUES:
+                recall[k] += len(relevant & set(ranked[:k])) / len(relevant)
+            rank = next((i for i, page_id in enumerate(ranked, 1) if page_id in relevant), None)
+            mrr += 1.0 / rank if rank else 0.0
+
+    n = len(queries)
+    lookups = analyzer.hits + analyzer.misses
+    return {
+        'steps': steps,
+        'index': {
+            'documents': bm25.corpus_size,
+            'terms': terms_total,
+            'vocabulary': bm25.vocabulary_size,
+            'postings': bm25.postings_count,
+            'build_seconds': round(build_seconds, 3),
+        },
+        'query': {
+            'terms_avg': round(float(np.mean(query_terms)), 2),
+            'postings_scanned_avg': round(float(np.mean(scanned)), 1),
+            'latency_us': {mode: percentiles_us(values) for mode, values in timings.items() if values},
+            'memo_hit_rate': round(analyzer.hits / lookups, 4) if lookups else None,
+        },
+        'quality': {
+            **{f'recall@{k}': round(recall[k] / n, 4) for k in K_VALUES},
+            'mrr': round(mrr / n, 4),
+            'zero_hit_queries': zero,
+        },
+    }
+
+
+def print_report(results: Dict[str, Dict]):
+    documents = next(iter(results.values()))['index']['documents']
+    print(f"\n=== Анализатор BM25: {documents} документов (латентность — мкс на запрос: анализ + оценки) ===")
+    print(f"  {'конвейер':<10} {'словарь':>8} {'постинги':>9} {'терм/запр':>9} {'скан':>8} "
+          f"{'p50 cold':>9} {'p50 warm':>9} {'p95 warm':>9} {'R@1':>6} {'R@5':>6} {'MRR':>6} {'0 hit':>5}")
+    for name, report in results.items():
+        index, query, quality = report['index'], report['query'], report['quality']
+        latency = query['latency_us']
+        warm = latency.get('warm', latency['cold'])
+        print(f"  {name:<10} {index['vocabulary']:>8} {index['postings']:>9} {query['terms_avg']:>9.2f} "
+              f"{query['postings_scanned_avg']:>8.1f} {latency['cold']['p50']:>9.1f} {warm['p50']:>9.1f} "
+              f"{warm['p95']:>9.1f} {quality['recall@1']:>6.3f} {quality['recall@5']:>6.3f} "
+              f"{quality['mrr']:>6.3f} {quality['zero_hit_queries']:>5}")
+    base_name, base = next(iter(results.items()))
+    for name, report in list(results.items())[1:]:
+        ratio = report['index']['postings'] / base['index']['postings'] if base['index']['postings'] else 0.0
+        print(f"  {name}: постингов {ratio:.1%} от {base_name}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    pipelines = {}
+    for spec in args.pipeline or DEFAULT_PIPELINES:
+        name, _, steps = spec.partition('=')
+        pipelines[name] = [s.strip() for s in steps.split(',') if s.strip()]
+
+    pages = load_corpus(args.corpus)
+    with open(args.queries, encoding='utf-8') as f:
+        queries = json.load(f)
+    logger.info(f"📚 Корпус {os.path.basename(os.path.normpath(args.corpus))}: {len(pages)} страниц × {args.scale}, "
+                f"{len(queries)} запросов")
+
+    results = {name: run_pipeline(steps, pages, queries, args.scale, args.repeat)
+               for name, steps in pipelines.items()}
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'scale': args.scale, 'queries': len(queries), 'results': results},
+                      f, ensure_ascii=False, indent=2)
+        logger.info(f"💾 Отчёт сохранён: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
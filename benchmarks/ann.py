@@ -0,0 +1,186 @@
+# benchmarks/ann.py
+"""
+Свип параметров векторного поиска: HNSW (M × ef_search) и int8-слой (× oversample).
+
+На синтетических кластеризованных векторах (размерность как у MPNet) сравнивает
+Database.search с точным полным перебором: recall@k, латентность p50/p95 и пиковый RSS.
+Каждое M (и int8-слой) — в отдельном процессе, чтобы RSS не смешивался.
+
+    python -m benchmarks.ann
+    python -m benchmarks.ann --vectors 100000 --m 8 16 32 --ef 20 50 100 200 --output ann.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from hybrid_search.utils import logger, Config
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Свип HNSW M/ef и int8-слоя: recall@k vs латентность vs RSS")
+    parser.add_argument('--vectors', type=int, default=20000, help="Размер коллекции")
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10, help="recall@k")
+    parser.add_argument('--m', type=int, nargs='+', default=[8, 16, 32], help="Значения HNSW M")
+    parser.add_argument('--ef', type=int, nargs='+', default=[10, 25, 50, 100, 200], help="Значения ef_search")
+    parser.add_argument('--construction-ef', type=int, default=Config.HNSW_CONSTRUCTION_EF)
+    parser.add_argument('--oversample', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="QUANTIZED_OVERSAMPLE для int8-слоя")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Куда сохранить JSON-отчёт")
+    return parser.parse_args(argv)
+
+
+def make_dataset(n: int, dim: int, n_queries: int, seed: int):
+    """Кластеризованные нормализованные векторы (как эмбеддинги близких по теме чанков) + запросы рядом с ними"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 50), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.integers(0, n, n_queries)] + 0.4 * rng.standard_normal((n_queries, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return vectors, queries
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int):
+    """Точный полный перебор (эталон) + его латентность на запрос"""
+    timings, truth = [], []
+    for query in queries:
+        started = time.perf_counter()
+        scores = vectors @ query
+        top = np.argpartition(-scores, k - 1)[:k]
+        truth.append(top[np.argsort(-scores[top])])
+        timings.append((time.perf_counter() - started) * 1000)
+    return np.array(truth), timings
+
+
+def latency_summary(timings: List[float]) -> Dict[str, float]:
+    return {
+        'p50_ms': round(float(np.percentile(timings, 50)), 3),
+        'p95_ms': round(float(np.percentile(timings, 95)), 3),
+    }
+
+
+def run_queries(db, queries: np.ndarray, truth: np.ndarray, k: int) -> Dict[str, float]:
+    """recall@k и латентность Database.search"""
+    no_sparse = {'indices': [0], 'values': [1e-9]}
+    db.search(queries[0].tolist(), no_sparse, n_results=k)  # прогрев
+    timings, recall = [], []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        found = db.search(query.tolist(), no_sparse, n_results=k)
+        timings.append((time.perf_counter() - started) * 1000)
+        ids = {int(chunk['id']) for chunk in found[:k]}
+        recall.append(len(ids & set(expected.tolist())) / k)
+    return {'recall': round(float(np.mean(recall)), 4), **latency_summary(timings)}
+
+
+def _child(mode: str, path: str, data_path: str, params: Dict, results):
+    """Отдельный процесс: своя ChromaDB-коллекция, свой пиковый RSS"""
+    Config.CHROMA_DB_PATH = path
+    Config.HNSW_M = params['m']
+    Config.HNSW_CONSTRUCTION_EF = params['construction_ef']
+    Config.HNSW_SEARCH_EF = params['ef'][0]
+    Config.VECTOR_TIER = 'int8' if mode == 'int8' else 'hnsw'
+
+    from hybrid_search.database import Database
+    from hybrid_search.metrics import peak_rss_mb
+
+    data = np.load(data_path)
+    vectors, queries, truth = data['vectors'], data['queries'], data['truth']
+    db = Database()
+    rows = []
+
+    if db.count() == 0:
+        started = time.perf_counter()
+        for start in range(0, len(vectors), 2000):
+            end = min(start + 2000, len(vectors))
+            db.collection.add(ids=[str(i) for i in range(start, end)], embeddings=vectors[start:end],
+                              metadatas=[{'chunk_index': 0}] * (end - start))
+        build_seconds = time.perf_counter() - started
+    else:
+        build_seconds = None
+
+    if mode == 'hnsw':
+        for ef in params['ef']:
+            db.set_search_ef(ef)
+            rows.append({'tier': 'hnsw', 'm': params['m'], 'ef': ef, **run_queries(db, queries, truth, params['k'])})
+    else:
+        for oversample in params['oversample']:
+            Config.QUANTIZED_OVERSAMPLE = oversample
+            rows.append({'tier': 'int8', 'oversample': oversample, **run_queries(db, queries, truth, params['k'])})
+        rows[-1]['codes_mb'] = round(db.vectors.memory_bytes() / 2 ** 20, 1)
+
+    peak = round(peak_rss_mb(), 1)
+    for row in rows:
+        row['peak_rss_mb'] = peak
+        row['build_seconds'] = round(build_seconds, 2) if build_seconds is not None else None
+    results.put(rows)
+
+
+def run_child(mode: str, path: str, data_path: str, params: Dict) -> List[Dict]:
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    process = ctx.Process(target=_child, args=(mode, path, data_path, params, results))
+    process.start()
+    rows = results.get()
+    process.join()
+    return rows
+
+
+def print_report(report: Dict):
+    print(f"\n=== {report['vectors']} векторов × {report['dim']}, {report['queries']} запросов, recall@{report['k']} ===")
+    exact = report['exact']
+    print(f"  {'конфигурация':<26} {'recall':>7} {'p50 мс':>8} {'p95 мс':>8} {'RSS МБ':>8}")
+    print(f"  {'exact (numpy float32)':<26} {1.0:>7.3f} {exact['p50_ms']:>8.2f} {exact['p95_ms']:>8.2f} "
+          f"{exact['matrix_mb']:>8.1f}*")
+    for row in report['results']:
+        name = (f"hnsw M={row['m']} ef={row['ef']}" if row['tier'] == 'hnsw'
+                else f"int8 oversample={row['oversample']}")
+        print(f"  {name:<26} {row['recall']:>7.3f} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['peak_rss_mb']:>8.1f}")
+    print("  * для exact — размер float32-матрицы, для остальных — пиковый RSS процесса")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    vectors, queries = make_dataset(args.vectors, args.dim, args.queries, args.seed)
+    truth, exact_timings = exact_top_k(vectors, queries, args.k)
+
+    workdir = tempfile.mkdtemp(prefix='rag_ann_')
+    data_path = os.path.join(workdir, 'dataset.npz')
+    np.savez(data_path, vectors=vectors, queries=queries, truth=truth)
+    params = {'k': args.k, 'ef': args.ef, 'construction_ef': args.construction_ef, 'oversample': args.oversample}
+
+    results = []
+    for m in args.m:
+        logger.info(f"🔧 HNSW M={m}: построение и свип ef {args.ef}")
+        results += run_child('hnsw', os.path.join(workdir, f'm{m}'), data_path, {**params, 'm': m})
+    # int8-слой поверх уже построенной коллекции (HNSW не запрашивается)
+    logger.info(f"🔧 int8-слой: свип oversample {args.oversample}")
+    results += run_child('int8', os.path.join(workdir, f'm{args.m[0]}'), data_path, {**params, 'm': args.m[0]})
+
+    report = {
+        'vectors': args.vectors, 'dim': args.dim, 'queries': args.queries, 'k': args.k,
+        'construction_ef': args.construction_ef,
+        'exact': {**latency_summary(exact_timings), 'matrix_mb': round(vectors.nbytes / 2 ** 20, 1)},
+        'results': results,
+    }
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"💾 Отчёт сохранён: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
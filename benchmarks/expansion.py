@@ -0,0 +1,81 @@
+# benchmarks/expansion.py
+"""
+Расширение запроса против поиска по одному вектору: recall@k / MRR и латентность.
+
+На одном индексе из HTML-фикстур прогоняет размеченные запросы с QUERY_EXPANSION=off и каждым
+режимом (multi, hyde, both). По умолчанию варианты строятся правилами (без Ollama);
+--llm — через локальную LLM (нужен доступный OLLAMA_HOST и настоящие модели).
+
+    python -m benchmarks.expansion
+    python -m benchmarks.expansion --modes off multi --budget-ms 800 --output expansion.json
+    python -m benchmarks.expansion --llm --real-models
+"""
+import argparse
+import json
+import sys
+from typing import Dict
+
+from benchmarks.retrieval import build_index, evaluate
+from benchmarks.stubs import CORPUS_DIR, QUERIES_PATH
+from hybrid_search.utils import logger, Config
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-query / HyDE против поиска по одному вектору")
+    parser.add_argument('--corpus', default=CORPUS_DIR)
+    parser.add_argument('--queries', default=QUERIES_PATH)
+    parser.add_argument('--modes', nargs='+', default=['off', 'multi', 'hyde', 'both'],
+                        choices=['off', 'multi', 'hyde', 'both'])
+    parser.add_argument('--count', type=int, default=Config.QUERY_EXPANSION_COUNT, help="Перефразировок")
+    parser.add_argument('--budget-ms', type=float, default=Config.QUERY_EXPANSION_BUDGET_MS)
+    parser.add_argument('--llm', action='store_true', help="Варианты через Ollama (иначе правила)")
+    parser.add_argument('--real-models', action='store_true')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="Куда сохранить JSON-отчёт")
+    return parser.parse_args(argv)
+
+
+def run_mode(mode: str, queries, repeat: int) -> Dict:
+    from hybrid_search.metrics import Tracer
+    Config.QUERY_EXPANSION = mode
+    report = evaluate(queries, repeat)
+    counters = Tracer().counters()
+    report['expansion'] = {key: value for key, value in counters.items() if key.startswith('expansion_')}
+    return report
+
+
+def print_report(results: Dict[str, Dict]):
+    print(f"\n=== Расширение запроса против одного вектора ===")
+    print(f"  {'режим':<7} {'recall@1':>9} {'recall@5':>9} {'MRR':>7} {'p50 мс':>8} {'p95 мс':>8}  варианты")
+    for mode, report in results.items():
+        quality, total = report['quality'], report['latency_ms'].get('search_total', {})
+        sources = ', '.join(f"{k[len('expansion_'):]}={v:g}" for k, v in sorted(report['expansion'].items())) or '—'
+        print(f"  {mode:<7} {quality['recall@1']:>9.4f} {quality['recall@5']:>9.4f} {quality['mrr']:>7.4f} "
+              f"{total.get('p50', 0):>8.2f} {total.get('p95', 0):>8.2f}  {sources}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    Config.QUERY_EXPANSION_LLM = args.llm
+    Config.QUERY_EXPANSION_COUNT = args.count
+    Config.QUERY_EXPANSION_BUDGET_MS = args.budget_ms
+    Config.WARMUP_ENABLED = False  # кэш результатов прогрева исказил бы сравнение
+
+    with open(args.queries, encoding='utf-8') as f:
+        queries = json.load(f)
+    build_index(args.corpus, args.real_models)
+
+    results = {mode: run_mode(mode, queries, args.repeat) for mode in args.modes}
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': {'llm': args.llm, 'count': args.count, 'budget_ms': args.budget_ms,
+                                  'real_models': args.real_models, 'queries': len(queries)},
+                       'results': results}, f, ensure_ascii=False, indent=2)
+        logger.info(f"💾 Отчёт сохранён: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+# benchmarks/load_bot.py
+"""
+Нагрузочный тест полного пути Telegram-бота без сети.
+
+Вызывает TelegramBot.handle_message напрямую синтетическими Update с пуассоновским
+потоком запросов. Ollama заменён in-process заглушкой с настраиваемой латентностью токена,
+Redis — fakeredis, Confluence — HTML-фикстуры. Отчёт: пропускная способность,
+p50/p95/p99 латентности ответа, глубина очереди executor и слоты планировщика бота.
+
+    python -m benchmarks.load_bot --rate 5 --duration 30 --users 20
+    python -m benchmarks.load_bot --rate 20 --workers 8 --token-latency-ms 10
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Dict, List
+
+from benchmarks.stubs import install_stand_ins, FakeOllamaClient, CORPUS_DIR, QUERIES_PATH
+from hybrid_search.utils import logger
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест TelegramBot.handle_message")
+    parser.add_argument('--rate', type=float, default=5.0, help="Средняя интенсивность запросов (в секунду)")
+    parser.add_argument('--duration', type=float, default=30.0, help="Длительность генерации нагрузки (сек)")
+    parser.add_argument('--users', type=int, default=20, help="Число синтетических пользователей")
+    parser.add_argument('--workers', type=int, default=None, help="max_workers executor (по умолчанию как asyncio)")
+    parser.add_argument('--token-latency-ms', type=float, default=20.0, help="Латентность генерации одного токена")
+    parser.add_argument('--prompt-eval-ms-per-1k', type=float, default=300.0, help="Prompt eval на 1000 токенов")
+    parser.add_argument('--answer-tokens', type=int, default=120)
+    parser.add_argument('--real-models', action='store_true', help="Настоящие MPNet / cross-encoder")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Куда сохранить JSON-отчёт")
+    return parser.parse_args(argv)
+
+
+class FakeMessage:
+    """Минимальный telegram.Message: фиксирует время ответов"""
+
+    def __init__(self, text: str, chat_id: int):
+        self.text = text
+        self.chat = SimpleNamespace(id=chat_id, send_action=self._send_action)
+        self.replies: List[float] = []
+
+    async def _send_action(self, action: str = None):
+        return True
+
+    async def reply_text(self, text: str, **kwargs):
+        self.replies.append(time.perf_counter())
+        return True
+
+
+def make_update(text: str, user_id: int) -> SimpleNamespace:
+    """Синтетический Update с полями, которые читает TelegramBot.handle_message"""
+    message = FakeMessage(text, chat_id=user_id)
+    return SimpleNamespace(
+        message=message,
+        effective_chat=SimpleNamespace(id=user_id),
+        effective_user=SimpleNamespace(id=user_id),
+    )
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def build_bot(args):
+    """Индексирует фикстуры и собирает TelegramBot с заглушкой Ollama"""
+    install_stand_ins(tempfile.mkdtemp(prefix='rag_load_'), CORPUS_DIR, real_models=args.real_models)
+
+    from hybrid_search.update import UpdateDatabase
+    from rag_llm.model import Model
+    from telegram_bot.bot import TelegramBot
+
+    UpdateDatabase().load_all()
+    Model().client = FakeOllamaClient(
+        token_latency=args.token_latency_ms / 1000,
+        prompt_eval_per_1k=args.prompt_eval_ms_per_1k / 1000,
+        answer_tokens=args.answer_tokens,
+    )
+    bot = TelegramBot()
+    bot._init_rag_components()
+    return bot
+
+
+async def run_load(bot, queries: List[str], args) -> Dict:
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+    loop.set_default_executor(executor)
+
+    rng = random.Random(args.seed)
+    latencies: List[float] = []
+    queue_depth: List[int] = []
+    limiter_queue: List[int] = []
+    errors = 0
+    coalesced = 0
+    stop_sampling = asyncio.Event()
+
+    async def sample_queue():
+        while not stop_sampling.is_set():
+            queue_depth.append(executor._work_queue.qsize())
+            limiter_queue.append(bot.search_limiter.queued + bot.llm_limiter.queued)
+            await asyncio.sleep(0.1)
+
+    async def one_request(text: str, user_id: int):
+        nonlocal errors, coalesced
+        update = make_update(text, user_id)
+        started = time.perf_counter()
+        try:
+            await bot.handle_message(update, None)
+        except Exception as e:
+            errors += 1
+            logger.error(f"❌ Ошибка в нагрузочном запросе: {e}")
+            return
+        if update.message.replies:
+            latencies.append(update.message.replies[-1] - started)
+        else:
+            # Сообщение склеено планировщиком сессии с соседним — отдельного ответа нет
+            coalesced += 1
+
+    sampler = asyncio.create_task(sample_queue())
+    tasks = []
+    started = time.perf_counter()
+    while time.perf_counter() - started < args.duration:
+        user_id = 1000 + rng.randrange(args.users)
+        tasks.append(asyncio.create_task(one_request(rng.choice(queries), user_id)))
+        await asyncio.sleep(rng.expovariate(args.rate))
+    sent_for = time.perf_counter() - started
+
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    stop_sampling.set()
+    await sampler
+    executor.shutdown(wait=False)
+
+    return {
+        'sent': len(tasks),
+        'completed': len(latencies),
+        'errors': errors,
+        'coalesced': coalesced,
+        'offered_rate': round(len(tasks) / sent_for, 3),
+        'throughput': round(len(latencies) / elapsed, 3),
+        'elapsed_seconds': round(elapsed, 3),
+        'latency_seconds': {
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(max(latencies), 3) if latencies else 0.0,
+        },
+        'executor_queue_depth': {
+            'avg': round(sum(queue_depth) / len(queue_depth), 2) if queue_depth else 0.0,
+            'max': max(queue_depth) if queue_depth else 0,
+        },
+        'scheduler_queue_depth': {
+            'avg': round(sum(limiter_queue) / len(limiter_queue), 2) if limiter_queue else 0.0,
+            'max': max(limiter_queue) if limiter_queue else 0,
+        },
+    }
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    with open(QUERIES_PATH, encoding='utf-8') as f:
+        queries = [item['query'] for item in json.load(f)]
+
+    bot = build_bot(args)
+
+    from hybrid_search.metrics import Tracer
+    Tracer().reset()
+    report = asyncio.run(run_load(bot, queries, args))
+    report['stages_ms'] = {
+        stage: {k: round(v * 1000, 2) if k != 'count' else v for k, v in stats.items()}
+        for stage, stats in Tracer().stats().items()
+    }
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# benchmarks/mmr.py
+"""
+Отбор контекста по MMR против top-K по оценке: размер промпта, качество и избыточность.
+
+На одном индексе из HTML-фикстур прогоняет размеченные запросы без MMR и с MMR для каждого --lambdas.
+Отчёт: чанков и токенов в промпте (RAG.create_prompt, символы / 4) и сокращение относительно top-K,
+избыточность (среднее максимальное косинусное сходство чанка с другими чанками контекста),
+доля контекста со страниц, размеченных как релевантные, recall@k / MRR и латентность mmr_select.
+
+    python -m benchmarks.mmr
+    python -m benchmarks.mmr --lambdas 0.5 0.7 --duplicate 0.85 --output mmr.json
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.retrieval import build_index, evaluate
+from benchmarks.stubs import CORPUS_DIR, QUERIES_PATH
+from hybrid_search.pagestore import page_id_of
+from hybrid_search.utils import logger, Config
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="MMR-отбор контекста против top-K")
+    parser.add_argument('--corpus', default=CORPUS_DIR)
+    parser.add_argument('--queries', default=QUERIES_PATH)
+    parser.add_argument('--lambdas', nargs='+', type=float, default=[0.5, Config.MMR_LAMBDA],
+                        help="MMR_LAMBDA для сравнения")
+    parser.add_argument('--duplicate', type=float, default=Config.MMR_DUPLICATE_THRESHOLD,
+                        help="MMR_DUPLICATE_THRESHOLD")
+    # Страницы фикстур короче CHUNK_SIZE: мелкие перекрывающиеся чанки, как у длинных страниц в проде,
+    # бюджет и порог rerank — в том же масштабе (до 10 кандидатов по 40 токенов)
+    parser.add_argument('--chunk-size', type=int, default=160)
+    parser.add_argument('--chunk-overlap', type=int, default=40)
+    parser.add_argument('--budget', type=int, default=200, help="MMR_TOKEN_BUDGET")
+    parser.add_argument('--min-score', type=float, default=0.1, help="RERANK_MIN_SCORE")
+    parser.add_argument('--parent-window', type=int, default=1, help="PARENT_WINDOW (соседи в кандидатах)")
+    parser.add_argument('--real-models', action='store_true')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="Куда сохранить JSON-отчёт")
+    return parser.parse_args(argv)
+
+
+def redundancy(vectors: np.ndarray) -> float:
+    """Среднее по чанкам максимальное косинусное сходство с другими чанками того же контекста"""
+    if len(vectors) < 2:
+        return 0.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.where(norms > 0, norms, 1.0)
+    similarity = unit @ unit.T
+    np.fill_diagonal(similarity, -1.0)
+    return float(similarity.max(axis=1).mean())
+
+
+def context_pass(queries: List[Dict]) -> Dict:
+    """Один проход: что получила бы LLM"""
+    from hybrid_search.database import Database
+    from hybrid_search.search import SemanticSearch
+    from rag_llm.rag import RAG
+
+    semantic, rag, db = SemanticSearch(), RAG(), Database()
+    chunks, chunk_tokens, prompt_tokens, overlap, relevant_share = [], [], [], [], []
+    for item in queries:
+        result = semantic.search(item['query'], warmup=False)
+        matches = result.get('matches', [])
+        prompt = rag.create_prompt(item['query'], rag.get_documents(result))
+
+        sizes = [len(match.get('text') or '') // 4 for match in matches]
+        relevant = set(item['relevant'])
+        on_topic = sum(size for match, size in zip(matches, sizes) if page_id_of(match['id']) in relevant)
+        chunks.append(len(matches))
+        chunk_tokens.append(sum(sizes))
+        prompt_tokens.append(len(prompt) // 4)
+        overlap.append(redundancy(db.get_embeddings([match['id'] for match in matches])))
+        relevant_share.append(on_topic / sum(sizes) if sum(sizes) else 0.0)
+    return {
+        'chunks_avg': round(float(np.mean(chunks)), 2),
+        'chunk_tokens_avg': round(float(np.mean(chunk_tokens)), 1),
+        'prompt_tokens_avg': round(float(np.mean(prompt_tokens)), 1),
+        'redundancy': round(float(np.mean(overlap)), 4),
+        'relevant_share': round(float(np.mean(relevant_share)), 4),
+    }
+
+
+def run_mode(lambda_, queries: List[Dict], repeat: int) -> Dict:
+    Config.MMR_ENABLED = lambda_ is not None
+    if lambda_ is not None:
+        Config.MMR_LAMBDA = lambda_
+    report = evaluate(queries, repeat)
+    report['context'] = context_pass(queries)
+    return report
+
+
+def print_report(results: Dict[str, Dict]):
+    base = results['top-k']['context']['prompt_tokens_avg']
+    print("\n=== Отбор контекста: MMR против top-K ===")
+    print(f"  {'режим':<10} {'чанков':>7} {'токенов чанков':>15} {'промпт':>8} {'сокращение':>11} "
+          f"{'избыточн.':>10} {'релев.':>7} {'recall@5':>9} {'MRR':>7} {'mmr p50 мс':>11}")
+    for name, report in results.items():
+        context, quality = report['context'], report['quality']
+        reduction = 1 - context['prompt_tokens_avg'] / base if base else 0.0
+        mmr = report['latency_ms'].get('mmr_select', {})
+        print(f"  {name:<10} {context['chunks_avg']:>7.2f} {context['chunk_tokens_avg']:>15.1f} "
+              f"{context['prompt_tokens_avg']:>8.1f} {reduction:>11.1%} {context['redundancy']:>10.3f} "
+              f"{context['relevant_share']:>7.1%} {quality['recall@5']:>9.4f} {quality['mrr']:>7.4f} "
+              f"{mmr.get('p50', 0):>11.3f}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    Config.WARMUP_ENABLED = False  # кэш результатов прогрева исказил бы сравнение
+    Config.CHUNK_SIZE = args.chunk_size
+    Config.CHUNK_OVERLAP = args.chunk_overlap
+    Config.PARENT_WINDOW = args.parent_window
+    Config.MMR_DUPLICATE_THRESHOLD = args.duplicate
+    Config.MMR_TOKEN_BUDGET = args.budget
+    Config.RERANK_MIN_SCORE = args.min_score
+
+    with open(args.queries, encoding='utf-8') as f:
+        queries = json.load(f)
+    build_index(args.corpus, args.real_models)
+
+    results = {'top-k': run_mode(None, queries, args.repeat)}
+    for lambda_ in args.lambdas:
+        results[f'mmr λ={lambda_:g}'] = run_mode(lambda_, queries, args.repeat)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': {'duplicate': args.duplicate, 'budget': args.budget, 'min_score': args.min_score,
+                                  'chunk_size': args.chunk_size, 'chunk_overlap': args.chunk_overlap,
+                                  'parent_window': args.parent_window, 'real_models': args.real_models,
+                                  'queries': len(queries)},
+                       'results': results}, f, ensure_ascii=False, indent=2)
+        logger.info(f"💾 Отчёт сохранён: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+# benchmarks/parent.py
+"""
+Родительские фрагменты (PARENT_WINDOW) против окна соседей, подбираемого при поиске.
+
+Индекс из HTML-фикстур строится один раз с PARENT_WINDOW=--window (фрагменты записываются в PageStore),
+затем размеченные запросы прогоняются в двух режимах: smart (PARENT_WINDOW=0 при поиске — окно 1–3
+по оценкам rerank) и parent (фрагменты из индекса). Отчёт: обращения к ChromaDB на запрос
+(всего и на расширение контекста), recall@k / MRR, латентность, размер контекста (токены ≈ символы / 4)
+и доля контекста со страниц, размеченных как релевантные.
+
+    python -m benchmarks.parent
+    python -m benchmarks.parent --window 2 --output parent.json
+    python -m benchmarks.parent --chunk-size 850 --real-models    # как в проде (нужны модели в кэше HF)
+"""
+import argparse
+import json
+import sys
+from collections import Counter
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.retrieval import build_index, evaluate
+from benchmarks.stubs import CORPUS_DIR, QUERIES_PATH
+from hybrid_search.pagestore import page_id_of
+from hybrid_search.utils import logger, Config
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Родительские фрагменты против соседей, подбираемых при поиске")
+    parser.add_argument('--corpus', default=CORPUS_DIR)
+    parser.add_argument('--queries', default=QUERIES_PATH)
+    parser.add_argument('--window', type=int, default=Config.PARENT_WINDOW or 1,
+                        help="PARENT_WINDOW при индексации (чанков с каждой стороны)")
+    # Страницы фикстур короче CHUNK_SIZE: по умолчанию чанки мельче, чтобы у чанков были соседи
+    parser.add_argument('--chunk-size', type=int, default=160)
+    parser.add_argument('--chunk-overlap', type=int, default=20)
+    parser.add_argument('--real-models', action='store_true')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="Куда сохранить JSON-отчёт")
+    return parser.parse_args(argv)
+
+
+class CountingCollection:
+    """Обёртка коллекции ChromaDB: считает query / get по стадиям поиска"""
+
+    def __init__(self, collection):
+        self._collection = collection
+        self.stage = 'search'
+        self.calls = Counter()
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in ('query', 'get'):
+            return attr
+
+        def counted(*args, **kwargs):
+            self.calls[self.stage] += 1
+            return attr(*args, **kwargs)
+        return counted
+
+
+def instrument(semantic) -> CountingCollection:
+    """Подменяет коллекцию счётчиком; вызовы внутри расширения контекста считаются отдельно"""
+    counter = CountingCollection(semantic.db.collection)
+    semantic.db.collection = counter
+    expand = semantic._expand_with_smart_neighbors
+
+    def counted_expand(*args, **kwargs):
+        counter.stage = 'expansion'
+        try:
+            return expand(*args, **kwargs)
+        finally:
+            counter.stage = 'search'
+
+    semantic._expand_with_smart_neighbors = counted_expand
+    return counter
+
+
+def context_pass(semantic, counter: CountingCollection, queries: List[Dict]) -> Dict:
+    """Один проход: обращения к ChromaDB и контекст, который получила бы LLM"""
+    calls, expansion_calls, tokens, relevant_share, neighbors = [], [], [], [], []
+    for item in queries:
+        counter.calls.clear()
+        matches = semantic.search(item['query'], warmup=False).get('matches', [])
+        calls.append(sum(counter.calls.values()))
+        expansion_calls.append(counter.calls['expansion'])
+
+        relevant = set(item['relevant'])
+        sizes = [len(match.get('text') or '') // 4 for match in matches]
+        on_topic = sum(size for match, size in zip(matches, sizes) if page_id_of(match['id']) in relevant)
+        tokens.append(sum(sizes))
+        relevant_share.append(on_topic / sum(sizes) if sum(sizes) else 0.0)
+        neighbors.append(sum(1 for match in matches if match.get('is_neighbor')))
+    return {
+        'chroma_calls_avg': round(float(np.mean(calls)), 2),
+        'expansion_calls_avg': round(float(np.mean(expansion_calls)), 2),
+        'expansion_calls_max': int(max(expansion_calls)),
+        'context_tokens_avg': round(float(np.mean(tokens)), 1),
+        'relevant_share': round(float(np.mean(relevant_share)), 4),
+        'neighbors_avg': round(float(np.mean(neighbors)), 2),
+    }
+
+
+def run_mode(mode: str, window: int, queries: List[Dict], repeat: int) -> Dict:
+    from hybrid_search.search import SemanticSearch
+    Config.PARENT_WINDOW = window if mode == 'parent' else 0
+    report = evaluate(queries, repeat)
+    semantic = SemanticSearch()
+    counter = instrument(semantic)
+    try:
+        report['context'] = context_pass(semantic, counter, queries)
+    finally:
+        semantic.db.collection = counter._collection
+        del semantic._expand_with_smart_neighbors
+    return report
+
+
+def print_report(results: Dict[str, Dict], window: int):
+    print(f"\n=== Расширение контекста: окно при поиске против родительских фрагментов ±{window} ===")
+    print(f"  {'режим':<7} {'Chroma/запр':>11} {'на расшир.':>10} {'макс':>5} {'токенов':>8} {'релев.':>7} "
+          f"{'соседей':>8} {'recall@5':>9} {'MRR':>7} {'расшир. p50 мс':>15} {'p95 мс':>8}")
+    for mode, report in results.items():
+        context, quality, latency = report['context'], report['quality'], report['latency_ms']
+        expansion, total = latency.get('neighbor_expansion', {}), latency.get('search_total', {})
+        print(f"  {mode:<7} {context['chroma_calls_avg']:>11.2f} {context['expansion_calls_avg']:>10.2f} "
+              f"{context['expansion_calls_max']:>5} {context['context_tokens_avg']:>8.1f} "
+              f"{context['relevant_share']:>7.1%} {context['neighbors_avg']:>8.2f} {quality['recall@5']:>9.4f} "
+              f"{quality['mrr']:>7.4f} {expansion.get('p50', 0):>15.2f} {total.get('p95', 0):>8.2f}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    Config.WARMUP_ENABLED = False  # кэш результатов прогрева исказил бы сравнение
+    Config.PARENT_WINDOW = args.window  # фрагменты записываются при индексации
+    Config.CHUNK_SIZE = args.chunk_size
+    Config.CHUNK_OVERLAP = args.chunk_overlap
+
+    with open(args.queries, encoding='utf-8') as f:
+        queries = json.load(f)
+    build_index(args.corpus, args.real_models)
+
+    results = {mode: run_mode(mode, args.window, queries, args.repeat) for mode in ('smart', 'parent')}
+    print_report(results, args.window)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': {'window': args.window, 'chunk_size': args.chunk_size,
+                                  'chunk_overlap': args.chunk_overlap, 'real_models': args.real_models,
+                                  'queries': len(queries)},
+                       'results': results}, f, ensure_ascii=False, indent=2)
+        logger.info(f"💾 Отчёт сохранён: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+# benchmarks/replay.py
+"""
+Повтор журнала запросов (QUERY_LOG_PATH) против текущей сборки.
+
+Запросы из журнала отправляются с записанными интервалами (--speed 1), ускоренно (--speed 10)
+или подряд (--speed 0) в --concurrency потоков. Повтор пишет свой журнал в том же формате;
+отчёт сравнивает распределения латентности (итог и стадии) и top-k результатов с записанными.
+
+    python -m benchmarks.replay /app/logs/queries.jsonl
+    python -m benchmarks.replay /app/logs/queries.jsonl --speed 5 --limit 500 --output replay.json
+    python -m benchmarks.replay queries.jsonl --llm            # + генерация (нужен Ollama)
+    python -m benchmarks.replay queries.jsonl --offline        # индекс из фикстур (журнал снят на них)
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from hybrid_search.querylog import KIND_SEARCH, KIND_GENERATE, read_log, filters_from_dict
+from hybrid_search.utils import logger, Config
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Повтор журнала запросов: латентность и top-k против записи")
+    parser.add_argument('log', help="Журнал запросов (QUERY_LOG_PATH; ротированные .N.gz читаются тоже)")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="Темп: 1 — как записано, N — в N раз быстрее, 0 — без пауз")
+    parser.add_argument('--concurrency', type=int, default=4, help="Параллельных запросов")
+    parser.add_argument('--limit', type=int, default=None, help="Первые N поисковых запросов журнала")
+    parser.add_argument('--k', type=int, default=10, help="Глубина сравнения top-k")
+    parser.add_argument('--llm', action='store_true', help="Повторять и генерацию (записи 'g')")
+    parser.add_argument('--no-warmup', action='store_true', help="Без кэша прогрева (полный пайплайн)")
+    parser.add_argument('--offline', action='store_true',
+                        help="Индекс из HTML-фикстур с заглушками (benchmarks/stubs.py)")
+    parser.add_argument('--capture', help="Куда писать журнал повтора (по умолчанию временный файл)")
+    parser.add_argument('--output', help="Куда сохранить JSON-отчёт")
+    parser.add_argument('--max-latency-regression', type=float, default=None,
+                        help="Допустимый рост p95 поиска (доля) — иначе exit 1")
+    parser.add_argument('--min-overlap', type=float, default=None,
+                        help="Минимальное среднее пересечение top-k — иначе exit 1")
+    return parser.parse_args(argv)
+
+
+def load_records(path: str, limit: Optional[int]) -> List[Dict]:
+    """Поисковые записи журнала по времени; gen — следовавшая за поиском генерация того же запроса"""
+    searches: List[Dict] = []
+    pending: Dict[str, Dict] = {}
+    for record in read_log(path):
+        if record.get('k') == KIND_SEARCH:
+            if limit is not None and len(searches) >= limit:
+                break
+            searches.append(record)
+            pending[record['q']] = record
+        elif record.get('k') == KIND_GENERATE and record.get('q') in pending:
+            pending.pop(record['q'])['gen'] = record
+    searches.sort(key=lambda r: r['ts'])
+    return searches
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {'count': 0, 'avg': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+    return {
+        'count': len(values),
+        'avg': round(float(np.mean(values)), 2),
+        'p50': round(float(np.percentile(values, 50)), 2),
+        'p95': round(float(np.percentile(values, 95)), 2),
+        'p99': round(float(np.percentile(values, 99)), 2),
+    }
+
+
+def summarize(records: List[Dict]) -> Dict[str, Dict]:
+    """Распределения латентности (мс): search_total / generate_total и стадии"""
+    values: Dict[str, List[float]] = {}
+    for record in records:
+        total = 'search_total' if record.get('k') == KIND_SEARCH else 'generate_total'
+        values.setdefault(total, []).append(record['ms'])
+        for stage, ms in record.get('st', {}).items():
+            values.setdefault(stage, []).append(ms)
+    return {stage: percentiles(v) for stage, v in values.items()}
+
+
+def token_summary(records: List[Dict]) -> Dict[str, float]:
+    generated = [r for r in records if r.get('k') == KIND_GENERATE]
+    if not generated:
+        return {}
+    return {
+        'count': len(generated),
+        'prompt_avg': round(float(np.mean([r.get('tok', {}).get('in', 0) for r in generated])), 1),
+        'generated_avg': round(float(np.mean([r.get('tok', {}).get('out', 0) for r in generated])), 1),
+    }
+
+
+def topk_diff(pairs: List[tuple], k: int) -> Dict:
+    """Пересечение top-k записанного и повторного результата, совпадение первого места"""
+    overlaps, top1, changed = [], 0, []
+    for query, recorded, replayed in pairs:
+        expected, actual = recorded[:k], replayed[:k]
+        overlap = len(set(expected) & set(actual)) / len(expected) if expected else float(not actual)
+        overlaps.append(overlap)
+        if expected[:1] == actual[:1]:
+            top1 += 1
+        if overlap < 1.0 or expected[:1] != actual[:1]:
+            changed.append({'query': query, 'overlap': round(overlap, 3),
+                            'recorded': expected[:3], 'replayed': actual[:3]})
+    changed.sort(key=lambda item: item['overlap'])
+    return {
+        'queries': len(pairs),
+        f'mean_overlap@{k}': round(float(np.mean(overlaps)), 4) if overlaps else 1.0,
+        'top1_agreement': round(top1 / len(pairs), 4) if pairs else 1.0,
+        'changed': len(changed),
+        'worst': changed[:10],
+    }
+
+
+def replay(records: List[Dict], args) -> Dict:
+    from hybrid_search.search import SemanticSearch
+
+    semantic = SemanticSearch()
+    response = None
+    if args.llm:
+        from rag_llm.response import Response
+        response = Response()
+
+    results: List[Optional[tuple]] = [None] * len(records)
+    lags: List[float] = []
+
+    def run_one(index: int, record: Dict):
+        result = semantic.search(record['q'], n_results=record.get('n'),
+                                 filters=filters_from_dict(record.get('f')), warmup=not args.no_warmup)
+        if response is not None and record.get('gen') and result.get('matches'):
+            session_id = f"replay-{index}"
+            response.query_model(session_id, record['q'], result)
+            response.terminate(session_id)
+        results[index] = (record['q'], record.get('ids', []), [m['id'] for m in result.get('matches', [])])
+
+    first_ts = records[0]['ts']
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="replay") as pool:
+        futures = []
+        for index, record in enumerate(records):
+            if args.speed > 0:
+                due = (record['ts'] - first_ts) / args.speed
+                delay = due - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+                lags.append(max(0.0, -delay) * 1000)
+            futures.append(pool.submit(run_one, index, record))
+        for future in futures:
+            future.result()
+    wall = time.perf_counter() - started
+
+    return {
+        'wall_seconds': round(wall, 2),
+        'recorded_seconds': round(records[-1]['ts'] - first_ts, 2),
+        'throughput_qps': round(len(records) / wall, 2) if wall else 0.0,
+        'dispatch_lag_ms': percentiles(lags) if lags else None,
+        'pairs': [r for r in results if r is not None],
+    }
+
+
+def diff_latency(recorded: Dict[str, Dict], replayed: Dict[str, Dict]) -> Dict[str, Dict]:
+    diff = {}
+    for stage in sorted(set(recorded) | set(replayed)):
+        before, after = recorded.get(stage), replayed.get(stage)
+        row = {'recorded': before, 'replayed': after}
+        if before and after and before['p95']:
+            row['p50_ratio'] = round(after['p50'] / before['p50'], 3) if before['p50'] else None
+            row['p95_ratio'] = round(after['p95'] / before['p95'], 3)
+        diff[stage] = row
+    return diff
+
+
+def print_report(report: Dict):
+    run = report['run']
+    print(f"\n=== Повтор: {report['topk']['queries']} запросов, темп ×{report['speed'] or '∞'}, "
+          f"{run['wall_seconds']} сек (в записи {run['recorded_seconds']} сек), {run['throughput_qps']} qps ===")
+    print(f"  {'стадия':<20} {'n':>6} {'p50 зап.':>9} {'p50 повт.':>10} {'p95 зап.':>9} {'p95 повт.':>10} {'×p95':>7}")
+    for stage, row in report['latency_ms'].items():
+        before = row['recorded'] or {'count': 0, 'p50': 0.0, 'p95': 0.0}
+        after = row['replayed'] or {'count': 0, 'p50': 0.0, 'p95': 0.0}
+        ratio = f"{row['p95_ratio']:.2f}" if row.get('p95_ratio') else '—'
+        print(f"  {stage:<20} {after['count']:>6} {before['p50']:>9.1f} {after['p50']:>10.1f} "
+              f"{before['p95']:>9.1f} {after['p95']:>10.1f} {ratio:>7}")
+    topk = report['topk']
+    k = report['k']
+    print(f"\n=== top-{k} ===")
+    print(f"  пересечение (среднее) {topk[f'mean_overlap@{k}']:.3f}, первое место совпало "
+          f"{topk['top1_agreement']:.1%}, изменилось {topk['changed']}")
+    for item in topk['worst']:
+        print(f"  • {item['overlap']:.2f}  {item['query'][:70]}")
+    if report.get('tokens'):
+        print("\n=== Токены (среднее на ответ) ===")
+        for name, tokens in report['tokens'].items():
+            if tokens:
+                print(f"  {name:<10} ответов {tokens['count']:>5}, промпт {tokens['prompt_avg']:>8.1f}, "
+                      f"генерация {tokens['generated_avg']:>6.1f}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    records = load_records(args.log, args.limit)
+    if not records:
+        logger.error(f"❌ В журнале {args.log} нет поисковых запросов")
+        return 1
+
+    capture = args.capture or os.path.join(tempfile.mkdtemp(prefix='rag_replay_'), 'replay.jsonl')
+    if os.path.exists(capture):
+        os.remove(capture)
+    # Повтор пишет свой журнал (до создания SemanticSearch), исходный не трогается
+    Config.QUERY_LOG_PATH = capture
+    if args.offline:
+        from benchmarks.stubs import FakeOllamaClient
+        from benchmarks.retrieval import build_index
+        build_index(os.path.join(os.path.dirname(__file__), 'fixtures', 'corpus'), real_models=False)
+        if args.llm:
+            from rag_llm.model import Model
+            Model().client = FakeOllamaClient()
+
+    logger.info(f"▶️  Повтор {len(records)} запросов из {args.log} (темп ×{args.speed or '∞'}, "
+                f"{args.concurrency} потоков)")
+    run = replay(records, args)
+
+    recorded = records + [r['gen'] for r in records if r.get('gen')] if args.llm else records
+    replayed = list(read_log(capture))
+    report = {
+        'log': args.log,
+        'capture': capture,
+        'speed': args.speed,
+        'concurrency': args.concurrency,
+        'k': args.k,
+        'run': {key: value for key, value in run.items() if key != 'pairs'},
+        'latency_ms': diff_latency(summarize(recorded), summarize(replayed)),
+        'topk': topk_diff(run['pairs'], args.k),
+    }
+    if args.llm:
+        report['tokens'] = {'recorded': token_summary(recorded), 'replayed': token_summary(replayed)}
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"💾 Отчёт сохранён: {args.output}")
+
+    problems = []
+    search_row = report['latency_ms'].get('search_total', {})
+    if args.max_latency_regression is not None and search_row.get('p95_ratio') \
+            and search_row['p95_ratio'] > 1 + args.max_latency_regression:
+        problems.append(f"search_total p95 ×{search_row['p95_ratio']:.2f}")
+    overlap = report['topk'][f'mean_overlap@{args.k}']
+    if args.min_overlap is not None and overlap < args.min_overlap:
+        problems.append(f"пересечение top-{args.k} {overlap:.3f} < {args.min_overlap}")
+    if problems:
+        print("\n❌ Регрессия относительно записи:")
+        for problem in problems:
+            print(f"  • {problem}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
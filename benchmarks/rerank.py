@@ -0,0 +1,186 @@
+# benchmarks/rerank.py
+"""
+Сравнение адаптивного rerank (пакеты + ранний выход + кэш) с полным rerank всех кандидатов.
+
+На одних и тех же кандидатах первого этапа (Database.search) для каждого запроса считает
+время rerank, число оценённых пар и совпадение результата с полным rerank:
+overlap@K (доля общих чанков в топ-K), совпадение top-1 и точное совпадение порядка.
+
+    python -m benchmarks.rerank
+    python -m benchmarks.rerank --pair-latency-ms 2 --batch-size 4 --output rerank.json
+    python -m benchmarks.rerank --chunk-size 160 --top-k 30    # 50+ кандидатов: ранний выход срабатывает
+    python -m benchmarks.rerank --real-models            # настоящий cross-encoder
+"""
+import argparse
+import copy
+import json
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.retrieval import build_index
+from benchmarks.stubs import CORPUS_DIR, QUERIES_PATH
+from hybrid_search.utils import logger, Config
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Адаптивный rerank против полного")
+    parser.add_argument('--corpus', default=CORPUS_DIR, help="Каталог с HTML-фикстурами и index.json")
+    parser.add_argument('--queries', default=QUERIES_PATH, help="JSON с размеченными запросами")
+    parser.add_argument('--top-k', type=int, default=Config.RETRIEVAL_TOP_K, help="RETRIEVAL_TOP_K")
+    parser.add_argument('--rerank-top-k', type=int, default=Config.RERANK_TOP_K)
+    parser.add_argument('--min-score', type=float, default=Config.RERANK_MIN_SCORE)
+    parser.add_argument('--batch-size', type=int, default=Config.RERANK_BATCH_SIZE)
+    parser.add_argument('--patience', type=int, default=Config.RERANK_PATIENCE)
+    parser.add_argument('--margin', type=float, default=Config.RERANK_EARLY_EXIT_MARGIN)
+    # Страницы фикстур короче CHUNK_SIZE: мелкие чанки дают больше кандидатов на запрос
+    parser.add_argument('--chunk-size', type=int, default=Config.CHUNK_SIZE)
+    parser.add_argument('--chunk-overlap', type=int, default=Config.CHUNK_OVERLAP)
+    parser.add_argument('--pair-latency-ms', type=float, default=1.0,
+                        help="Имитация стоимости cross-encoder на пару (только для заглушки)")
+    parser.add_argument('--real-models', action='store_true',
+                        help="Использовать настоящие MPNet/cross-encoder (нужны в локальном кэше HF)")
+    parser.add_argument('--output', help="Куда сохранить JSON-отчёт")
+    return parser.parse_args(argv)
+
+
+def apply_config(args):
+    Config.RETRIEVAL_TOP_K = args.top_k
+    Config.RERANK_TOP_K = args.rerank_top_k
+    Config.RERANK_MIN_SCORE = args.min_score
+    Config.RERANK_BATCH_SIZE = args.batch_size
+    Config.RERANK_PATIENCE = args.patience
+    Config.RERANK_EARLY_EXIT_MARGIN = args.margin
+    Config.CHUNK_SIZE = args.chunk_size
+    Config.CHUNK_OVERLAP = args.chunk_overlap
+
+
+def timed_rerank(embedder, query: str, candidates: List[Dict], adaptive: bool) -> Dict:
+    """Rerank копии кандидатов: результат, время (мс) и число вызовов cross-encoder по парам"""
+    reranker = embedder.adaptive_reranker
+    predict = reranker.predict
+    pairs = []
+
+    def counting_predict(batch):
+        pairs.append(len(batch))
+        return predict(batch)
+
+    reranker.predict = counting_predict
+    try:
+        started = time.perf_counter()
+        result = reranker.rerank(query, copy.deepcopy(candidates), adaptive=adaptive)
+        elapsed = (time.perf_counter() - started) * 1000
+    finally:
+        reranker.predict = predict
+    return {'ids': [c['id'] for c in result], 'ms': elapsed, 'pairs': sum(pairs)}
+
+
+def agreement(reference: List[str], result: List[str]) -> Dict[str, float]:
+    k = max(len(reference), 1)
+    return {
+        'overlap': len(set(reference) & set(result)) / k if reference else float(not result),
+        'top1': float(reference[:1] == result[:1]),
+        'exact': float(reference == result),
+    }
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        'avg': round(float(np.mean(values)), 3),
+        'p50': round(float(np.percentile(values, 50)), 3),
+        'p95': round(float(np.percentile(values, 95)), 3),
+    }
+
+
+def evaluate(queries: List[Dict]) -> Dict:
+    from hybrid_search.embed import Embed
+    from hybrid_search.database import Database
+
+    embedder = Embed()
+    db = Database()
+    embedder.adaptive_reranker.cache.clear()
+
+    rows = {'exhaustive': [], 'adaptive_cold': [], 'adaptive_warm': []}
+    agree = {'adaptive_cold': [], 'adaptive_warm': []}
+    candidates_total = 0
+
+    for item in queries:
+        query = item['query']
+        candidates = db.search(embedder.embed_text(query, db.embedding_model()), embedder.embed_sparse(query),
+                               n_results=Config.RETRIEVAL_TOP_K * 2)
+        candidates_total += len(candidates)
+
+        exhaustive = timed_rerank(embedder, query, candidates, adaptive=False)
+        cold = timed_rerank(embedder, query, candidates, adaptive=True)
+        warm = timed_rerank(embedder, query, candidates, adaptive=True)  # повтор запроса: оценки из кэша
+
+        rows['exhaustive'].append(exhaustive)
+        rows['adaptive_cold'].append(cold)
+        rows['adaptive_warm'].append(warm)
+        agree['adaptive_cold'].append(agreement(exhaustive['ids'], cold['ids']))
+        agree['adaptive_warm'].append(agreement(exhaustive['ids'], warm['ids']))
+
+    report = {'queries': len(queries), 'avg_candidates': round(candidates_total / max(len(queries), 1), 1)}
+    for mode, results in rows.items():
+        report[mode] = {
+            'rerank_ms': summarize([r['ms'] for r in results]),
+            'pairs_per_query': round(float(np.mean([r['pairs'] for r in results])), 2),
+        }
+        if mode in agree:
+            report[mode]['agreement'] = {
+                metric: round(float(np.mean([a[metric] for a in agree[mode]])), 4)
+                for metric in ('overlap', 'top1', 'exact')
+            }
+    return report
+
+
+def print_report(report: Dict):
+    print(f"\n=== Rerank: {report['queries']} запросов, ~{report['avg_candidates']} кандидатов ===")
+    print(f"  {'режим':<15} {'пар/запрос':>10} {'avg мс':>9} {'p50 мс':>9} {'p95 мс':>9} "
+          f"{'overlap@K':>10} {'top-1':>7} {'exact':>7}")
+    for mode in ('exhaustive', 'adaptive_cold', 'adaptive_warm'):
+        row = report[mode]
+        agree = row.get('agreement', {'overlap': 1.0, 'top1': 1.0, 'exact': 1.0})
+        print(f"  {mode:<15} {row['pairs_per_query']:>10.2f} {row['rerank_ms']['avg']:>9.2f} "
+              f"{row['rerank_ms']['p50']:>9.2f} {row['rerank_ms']['p95']:>9.2f} "
+              f"{agree['overlap']:>10.3f} {agree['top1']:>7.3f} {agree['exact']:>7.3f}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    apply_config(args)
+
+    with open(args.queries, encoding='utf-8') as f:
+        queries = json.load(f)
+
+    build_index(args.corpus, args.real_models)
+    if not args.real_models:
+        from hybrid_search.embed import Embed
+        Embed().pair_latency = args.pair_latency_ms / 1000
+
+    report = evaluate(queries)
+    report['config'] = {
+        'retrieval_top_k': Config.RETRIEVAL_TOP_K,
+        'rerank_top_k': Config.RERANK_TOP_K,
+        'rerank_min_score': Config.RERANK_MIN_SCORE,
+        'batch_size': Config.RERANK_BATCH_SIZE,
+        'patience': Config.RERANK_PATIENCE,
+        'margin': Config.RERANK_EARLY_EXIT_MARGIN,
+        'chunk_size': Config.CHUNK_SIZE,
+        'chunk_overlap': Config.CHUNK_OVERLAP,
+        'real_models': args.real_models,
+        'pair_latency_ms': None if args.real_models else args.pair_latency_ms,
+    }
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"💾 Отчёт сохранён: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+# benchmarks/retrieval.py
+"""
+Офлайн-бенчмарк качества и скорости SemanticSearch.
+
+Строит индекс ChromaDB из HTML-фикстур через UpdateDatabase.load_all (Confluence и Redis
+заменены локальными заглушками), прогоняет размеченные запросы и считает recall@k, MRR
+и перцентили латентности по стадиям (из Tracer).
+
+    python -m benchmarks.retrieval
+    python -m benchmarks.retrieval --chunk-size 600 --top-k 20 --output bench.json
+    python -m benchmarks.retrieval --baseline bench.json   # exit 1 при регрессии
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.stubs import install_stand_ins, CORPUS_DIR, QUERIES_PATH
+from hybrid_search.metrics import peak_rss_mb
+from hybrid_search.utils import logger, Config
+
+K_VALUES = (1, 3, 5, 10)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк SemanticSearch")
+    parser.add_argument('--corpus', default=CORPUS_DIR, help="Каталог с HTML-фикстурами и index.json")
+    parser.add_argument('--queries', default=QUERIES_PATH, help="JSON с размеченными запросами")
+    parser.add_argument('--chunk-size', type=int, default=Config.CHUNK_SIZE)
+    parser.add_argument('--chunk-overlap', type=int, default=Config.CHUNK_OVERLAP)
+    parser.add_argument('--top-k', type=int, default=Config.RETRIEVAL_TOP_K, help="RETRIEVAL_TOP_K")
+    parser.add_argument('--rerank-top-k', type=int, default=Config.RERANK_TOP_K)
+    parser.add_argument('--min-score', type=float, default=Config.RERANK_MIN_SCORE, help="RERANK_MIN_SCORE")
+    parser.add_argument('--max-chunks-per-doc', type=int, default=Config.MAX_CHUNKS_PER_DOC)
+    parser.add_argument('--streaming', action='store_true', help="Потоковая загрузка (STREAMING_INGEST)")
+    parser.add_argument('--repeat', type=int, default=3, help="Сколько раз прогнать набор запросов")
+    parser.add_argument('--real-models', action='store_true',
+                        help="Использовать настоящие MPNet/cross-encoder (нужны в локальном кэше HF)")
+    parser.add_argument('--output', help="Куда сохранить JSON-отчёт")
+    parser.add_argument('--baseline', help="JSON-отчёт для сравнения (регрессия → exit 1)")
+    parser.add_argument('--max-quality-drop', type=float, default=0.02,
+                        help="Допустимое падение recall@k / MRR (абсолютное)")
+    parser.add_argument('--max-latency-regression', type=float, default=0.25,
+                        help="Допустимый рост p95 search_total (доля)")
+    return parser.parse_args(argv)
+
+
+def apply_config(args):
+    """Переопределяет параметры пайплайна до создания компонентов"""
+    Config.CHUNK_SIZE = args.chunk_size
+    Config.CHUNK_OVERLAP = args.chunk_overlap
+    Config.RETRIEVAL_TOP_K = args.top_k
+    Config.RERANK_TOP_K = args.rerank_top_k
+    Config.RERANK_MIN_SCORE = args.min_score
+    Config.MAX_CHUNKS_PER_DOC = args.max_chunks_per_doc
+    Config.STREAMING_INGEST = args.streaming
+
+
+def build_index(corpus_dir: str, real_models: bool) -> float:
+    """Индексирует фикстуры во временную ChromaDB, возвращает время индексации"""
+    chroma_path = tempfile.mkdtemp(prefix='rag_bench_')
+    install_stand_ins(chroma_path, corpus_dir, real_models=real_models)
+
+    from hybrid_search.update import UpdateDatabase
+    started = time.perf_counter()
+    UpdateDatabase().load_all()
+    return time.perf_counter() - started
+
+
+def ranked_pages(matches: List[Dict]) -> List[str]:
+    """Порядок страниц (page_id) в выдаче без повторов"""
+    pages = []
+    for match in matches:
+        page_id = match['id'].rsplit('-', 1)[0]
+        if page_id not in pages:
+            pages.append(page_id)
+    return pages
+
+
+def evaluate(queries: List[Dict], repeat: int) -> Dict:
+    from hybrid_search.metrics import Tracer
+    from hybrid_search.search import SemanticSearch
+
+    semantic = SemanticSearch()
+    tracer = Tracer()
+    tracer.reset()
+
+    recall = {k: 0.0 for k in K_VALUES}
+    mrr = 0.0
+    misses = []
+
+    for run in range(repeat):
+        for item in queries:
+            result = semantic.search(item['query'])
+            if run > 0:
+                continue  # качество считаем по первому прогону, остальные — для латентности
+
+            pages = ranked_pages(result.get('matches', []))
+            relevant = set(item['relevant'])
+            for k in K_VALUES:
+                recall[k] += len(relevant & set(pages[:k])) / len(relevant)
+            rank = next((i for i, p in enumerate(pages, 1) if p in relevant), None)
+            mrr += 1.0 / rank if rank else 0.0
+            if rank is None:
+                misses.append(item['query'])
+
+    n = len(queries)
+    latency = {
+        stage: {key: round(value * 1000, 3) if key != 'count' else value for key, value in stats.items()}
+        for stage, stats in tracer.stats().items()
+    }
+    return {
+        'quality': {**{f'recall@{k}': round(v / n, 4) for k, v in recall.items()}, 'mrr': round(mrr / n, 4)},
+        'latency_ms': latency,
+        'misses': misses,
+    }
+
+
+def compare(report: Dict, baseline: Dict, max_quality_drop: float, max_latency_regression: float) -> List[str]:
+    """Возвращает список регрессий относительно baseline"""
+    problems = []
+    for metric, value in baseline.get('quality', {}).items():
+        current = report['quality'].get(metric, 0.0)
+        if value - current > max_quality_drop:
+            problems.append(f"{metric}: {value:.4f} → {current:.4f}")
+
+    base_p95 = baseline.get('latency_ms', {}).get('search_total', {}).get('p95')
+    cur_p95 = report['latency_ms'].get('search_total', {}).get('p95')
+    if base_p95 and cur_p95 and cur_p95 > base_p95 * (1 + max_latency_regression):
+        problems.append(f"search_total p95: {base_p95:.1f}ms → {cur_p95:.1f}ms")
+    return problems
+
+
+def print_report(report: Dict):
+    print("\n=== Качество ===")
+    for metric, value in report['quality'].items():
+        print(f"  {metric:<10} {value:.4f}")
+    print("\n=== Латентность по стадиям (мс) ===")
+    print(f"  {'стадия':<20} {'n':>5} {'avg':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for stage, s in sorted(report['latency_ms'].items()):
+        print(f"  {stage:<20} {s['count']:>5} {s['avg']:>9.2f} {s['p50']:>9.2f} {s['p95']:>9.2f} {s['p99']:>9.2f}")
+    if report['misses']:
+        print("\n=== Запросы без релевантных страниц ===")
+        for query in report['misses']:
+            print(f"  • {query}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    apply_config(args)
+
+    with open(args.queries, encoding='utf-8') as f:
+        queries = json.load(f)
+
+    index_seconds = build_index(args.corpus, args.real_models)
+    report = evaluate(queries, args.repeat)
+    report['config'] = {
+        'chunk_size': Config.CHUNK_SIZE,
+        'chunk_overlap': Config.CHUNK_OVERLAP,
+        'retrieval_top_k': Config.RETRIEVAL_TOP_K,
+        'rerank_top_k': Config.RERANK_TOP_K,
+        'rerank_min_score': Config.RERANK_MIN_SCORE,
+        'max_chunks_per_doc': Config.MAX_CHUNKS_PER_DOC,
+        'real_models': args.real_models,
+        'streaming_ingest': args.streaming,
+        'queries': len(queries),
+    }
+    report['index_seconds'] = round(index_seconds, 3)
+    report['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"💾 Отчёт сохранён: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        problems = compare(report, baseline, args.max_quality_drop, args.max_latency_regression)
+        if problems:
+            print("\n❌ Регрессия относительно baseline:")
+            for problem in problems:
+                print(f"  • {problem}")
+            return 1
+        print("\n✅ Регрессий относительно baseline нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+# benchmarks/stubs.py
+"""
+Локальные заменители внешних сервисов для офлайн-бенчмарков:
+Confluence (HTML-фикстуры), Redis (fakeredis) и, опционально, модели (хеширующий эмбеддер).
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from typing import Dict, List
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+from hybrid_search.analyzer import Analyzer
+from hybrid_search import bm25 as bm25_store
+from hybrid_search.bm25 import StreamingBM25
+from hybrid_search.database import LEGACY_DENSE_MODEL
+from hybrid_search.rerank import AdaptiveReranker
+from hybrid_search.utils import logger, Config, extract_metadata_from_confluence
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+CORPUS_DIR = os.path.join(FIXTURES_DIR, 'corpus')
+QUERIES_PATH = os.path.join(FIXTURES_DIR, 'queries.json')
+
+
+class StubConfluenceAPI:
+    """ConfluenceAPI поверх каталога HTML-фикстур (<page_id>.html + index.json)"""
+
+    def __init__(self, corpus_dir: str = CORPUS_DIR, space_name: str = 'BENCH'):
+        self.corpus_dir = corpus_dir
+        self.space_name = space_name
+        self.space_keys = [space_name]
+        self.api_url = 'https://confluence.local'
+        with open(os.path.join(corpus_dir, 'index.json'), encoding='utf-8') as f:
+            self.index: Dict[str, dict] = json.load(f)
+
+    def get_space_id(self, space_key: str = None) -> str:
+        return space_key or self.space_name
+
+    def get_all_page_ids(self) -> dict:
+        return self.get_page_ids(self.space_name)
+
+    def get_page_ids(self, space_id: str, space_key: str = None) -> dict:
+        # В фикстурах все страницы в одном пространстве, если в index.json не указано 'space'
+        return {
+            page_id: {
+                'title': info['title'],
+                'version': info.get('version', 1),
+                'space_key': info.get('space', self.space_name),
+                'space_name': info.get('space', self.space_name),
+                'url': self.get_page_url(page_id)
+            }
+            for page_id, info in self.index.items()
+            if space_key is None or info.get('space', self.space_name) == space_key
+        }
+
+    def _raw_page(self, page_id: str) -> dict:
+        info = self.index[page_id]
+        with open(os.path.join(self.corpus_dir, f'{page_id}.html'), encoding='utf-8') as f:
+            html = f.read()
+        return {
+            'id': page_id,
+            'title': info['title'],
+            'version': {'number': info.get('version', 1), 'when': info.get('when', '')},
+            'space': {'key': info.get('space', self.space_name), 'name': info.get('space', self.space_name)},
+            'labels': {'results': [{'name': label} for label in info.get('labels', [])]},
+            'body': {'view': {'value': html}}
+        }
+
+    def get_page_full(self, page_id: str) -> dict:
+        data = self._raw_page(page_id)
+        return {
+            'content': data['body']['view']['value'],
+            'metadata': extract_metadata_from_confluence(data, page_id, self.api_url)
+        }
+
+    def get_content(self, page_id: str) -> str:
+        return self.get_page_full(page_id)['content']
+
+    def get_time(self, page_id: str) -> str:
+        return self.index[page_id].get('when', '')
+
+    def get_page_url(self, page_id: str) -> str:
+        return f"{self.api_url}/pages/viewpage.action?pageId={page_id}"
+
+
+class HashingEmbed:
+    """
+    Заменитель Embed без torch: dense-вектор — хеширование слов и символьных триграмм,
+    rerank — доля слов запроса, найденных в чанке. Интерфейс совпадает с Embed.
+    """
+
+    def __init__(self, dim: int = 384, pair_latency: float = 0.0):
+        self.dim = dim
+        self.device = 'cpu'
+        self.dense_model_name = Config.DENSE_MODEL
+        # BM25 — через тот же анализатор, что Embed; dense и rerank заменителя — по словам регулярного выражения
+        self.analyzer = Analyzer()
+        self.bm25 = None
+        self.corpus_tokens = []
+        self._bm25_initialized = False
+        self.bm25_collection = None
+        self._bm25_mtime = None
+        # Имитация стоимости cross-encoder на одну пару (сек) — для сравнения стратегий rerank
+        self.pair_latency = pair_latency
+        self.adaptive_reranker = AdaptiveReranker(self._predict_rerank_scores)
+
+    def _tokenize(self, text: str) -> list[str]:
+        return re.findall(r'\b[a-zа-яё0-9]{2,}\b', text.lower())
+
+    def _features(self, text: str) -> List[str]:
+        tokens = self._tokenize(text)
+        grams = [t[i:i + 3] for t in tokens for i in range(max(1, len(t) - 2))]
+        return tokens + grams
+
+    def _vector(self, text: str, model: str = None) -> np.ndarray:
+        # Другая модель — другое пространство: хеш с солью из имени модели
+        salt = '' if (model or self.dense_model_name) == LEGACY_DENSE_MODEL else (model or self.dense_model_name)
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            h = int.from_bytes(hashlib.md5((salt + feature).encode('utf-8')).digest()[:8], 'little')
+            vec[h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def embed_text(self, text: str, model: str = None) -> list[float]:
+        return self._vector(text, model).tolist()
+
+    def embed_texts_batch(self, texts: list[str], model: str = None) -> list[list[float]]:
+        return [self._vector(t, model).tolist() for t in texts]
+
+    def embed_queries_batch(self, texts: list[str], model: str = None) -> list[list[float]]:
+        return self.embed_texts_batch(texts, model)
+
+    def embed_sparse(self, text: str) -> dict:
+        tokens = self.analyzer.analyze(text)
+        if self._bm25_initialized and self.bm25 and tokens:
+            scores = self.bm25.get_scores(tokens)
+            indices = [i for i, s in enumerate(scores) if s > 1e-6]
+            values = [float(scores[i]) for i in indices]
+        else:
+            indices, values = [0], [1e-9]
+        return {"indices": indices, "values": values}
+
+    def embed_sparse_batch(self, texts: list[str]) -> list[dict]:
+        return [self.embed_sparse(t) for t in texts]
+
+    def fit_bm25(self, documents: list[str]):
+        corpus_tokens = [t for t in (self.analyzer.analyze(d) for d in documents if d and d.strip()) if t]
+        if corpus_tokens:
+            self.bm25 = BM25Okapi(corpus_tokens)
+            self.corpus_tokens = corpus_tokens
+            self._bm25_initialized = True
+
+    def fit_bm25_streaming(self, documents):
+        bm25 = StreamingBM25()
+        for doc in documents:
+            tokens = self.analyzer.analyze(doc) if doc and doc.strip() else []
+            if tokens:
+                bm25.add_document(tokens)
+        if bm25.corpus_size:
+            self.bm25 = bm25.finalize()
+            self._bm25_initialized = True
+
+    def save_bm25(self, collection: str):
+        if self._bm25_initialized:
+            bm25_store.save_model(self.bm25, collection, self.analyzer.describe())
+            self.bm25_collection = collection
+            self._bm25_mtime = bm25_store.model_mtime(collection)
+
+    def use_bm25(self, collection: str):
+        if collection == self.bm25_collection and (
+                self._bm25_initialized or bm25_store.model_mtime(collection) == self._bm25_mtime):
+            return
+        self._bm25_mtime = bm25_store.model_mtime(collection)
+        model = bm25_store.load_model(collection, self.analyzer.describe())
+        if model is not None or self.bm25_collection is not None:
+            self.bm25, self._bm25_initialized = model, model is not None
+        self.bm25_collection = collection
+
+    def _predict_rerank_scores(self, pairs: list[list[str]]) -> np.ndarray:
+        scores = []
+        for query, text in pairs:
+            query_tokens = set(self._tokenize(query))
+            text = text.lower()
+            hits = sum(1 for t in query_tokens if t[:5] in text)
+            overlap = hits / len(query_tokens) if query_tokens else 0.0
+            # Сигмоида вокруг 50% совпадения — шкала сопоставима с expit(cross-encoder)
+            scores.append(1.0 / (1.0 + math.exp(-8 * (overlap - 0.5))))
+        if self.pair_latency:
+            time.sleep(self.pair_latency * len(pairs))
+        return np.array(scores)
+
+    def rerank(self, query: str, chunks: list[dict], adaptive: bool = None) -> list[dict]:
+        if not chunks:
+            return []
+        return self.adaptive_reranker.rerank(query, chunks, adaptive=adaptive)
+
+
+class FakeOllamaClient:
+    """
+    Заменитель ollama.Client: имитирует prompt eval и генерацию через sleep
+    и возвращает ответ с теми же полями таймингов, что настоящий Ollama.
+    """
+
+    def __init__(self, token_latency: float = 0.02, prompt_eval_per_1k: float = 0.3,
+                 answer_tokens: int = 120, model_name: str = 'llama3.1'):
+        self.token_latency = token_latency
+        self.prompt_eval_per_1k = prompt_eval_per_1k
+        self.answer_tokens = answer_tokens
+        self.model_name = model_name
+
+    def chat(self, model: str, messages: list, options: dict = None, **kwargs) -> dict:
+        prompt_tokens = sum(len(m.get('content', '')) for m in messages) // 4
+        prompt_eval = prompt_tokens / 1000 * self.prompt_eval_per_1k
+        generation = self.answer_tokens * self.token_latency
+        time.sleep(prompt_eval + generation)
+        return {
+            'model': model,
+            'message': {'role': 'assistant', 'content': 'Ответ по документации [100001]. ' * 4},
+            'prompt_eval_count': prompt_tokens,
+            'prompt_eval_duration': int(prompt_eval * 1e9),
+            'eval_count': self.answer_tokens,
+            'eval_duration': int(generation * 1e9),
+        }
+
+    def list(self) -> dict:
+        return {'models': [{'name': f'{self.model_name}:latest'}]}
+
+
+def make_fake_redis():
+    """In-process Redis (fakeredis) с тем же интерфейсом, что get_redis_client()"""
+    import fakeredis
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def install_stand_ins(chroma_path: str, corpus_dir: str = CORPUS_DIR, real_models: bool = False):
+    """
+    Подменяет внешние зависимости в модулях пайплайна.
+    Вызывать ДО первого создания SemanticSearch / UpdateDatabase / Response.
+    """
+    import hybrid_search.confluence
+    import hybrid_search.embed
+    import hybrid_search.update
+    import hybrid_search.warmup
+    import rag_llm.context
+
+    Config.CHROMA_DB_PATH = chroma_path
+
+    confluence_api = StubConfluenceAPI(corpus_dir)
+    hybrid_search.confluence.ConfluenceAPI = lambda: confluence_api
+
+    redis_client = make_fake_redis()
+    hybrid_search.update.get_redis_client = lambda: redis_client
+    hybrid_search.warmup.get_redis_client = lambda: redis_client
+    rag_llm.context.get_redis_client = lambda: redis_client
+
+    if not real_models:
+        embedder = HashingEmbed()
+        hybrid_search.embed.Embed = lambda: embedder
+        # Модули, импортировавшие Embed по имени
+        import hybrid_search.chunk
+        import hybrid_search.search
+        hybrid_search.chunk.Embed = hybrid_search.embed.Embed
+        hybrid_search.search.Embed = hybrid_search.embed.Embed
+
+    logger.info(f"🧪 Заменители установлены (chroma={chroma_path}, real_models={real_models})")
+    return {'confluence': confluence_api, 'redis': redis_client}
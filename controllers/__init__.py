@@ -1,6 +1,8 @@
 # controllers/__init__.py
 from controllers.app_controller import AppController
 from controllers.bot_controller import BotController
+from controllers.metrics_controller import MetricsController
 from controllers.sync_controller import SyncController
+from controllers.worker_controller import WorkerPoolController
 
-__all__ = ['AppController', 'BotController', 'SyncController']
\ No newline at end of file
+__all__ = ['AppController', 'BotController', 'MetricsController', 'SyncController', 'WorkerPoolController']
\ No newline at end of file
@@ -1,10 +1,18 @@
 # controllers/app_controller.py
+import os
+import threading
 import uuid
 
 from hybrid_search.database import Database
+from hybrid_search.filters import parse_filters
+from hybrid_search.manifest import IndexManifest, STATUS_IN_PROGRESS
+from hybrid_search.reindex import start_background_reindex
 from hybrid_search.search import SemanticSearch
+from hybrid_search.snapshot import restore_snapshot
+from hybrid_search.startup import StartupManager
 from hybrid_search.update import UpdateDatabase
 from hybrid_search.utils import logger, Config
+from hybrid_search.warmup import QueryWarmup
 from rag_llm.response import Response
 
 
@@ -16,12 +24,19 @@ class AppController:
         self._semantic = None
         self._response = None
         self._db_updater = None
+        self._worker_pool = None
+        self._reindex_process = None
 
     def initialize(self):
         """Ленивая инициализация компонентов"""
         Config.log()
         logger.info(f"🆔 Session ID: {self.session_id}")
 
+    def attach_worker_pool(self, pool):
+        """✅ Поиск и /sync через пул процессов (QUERY_WORKERS > 0)"""
+        self._worker_pool = pool
+        self._semantic = pool
+
     def _get_semantic(self):
         """✅ Ленивая инициализация SemanticSearch"""
         if self._semantic is None:
@@ -36,24 +51,48 @@ class AppController:
 
     def load_data(self):
         """Управление загрузкой данных"""
+        if Config.FAST_START:
+            # ⚡ Chroma, модели и проверка Ollama грузятся параллельно в фоне
+            StartupManager().start()
+
         first_run = self._check_first_run()
 
-        if Config.FORCE_RELOAD:
+        if Config.FORCE_RELOAD and Config.REINDEX_MODE == 'bluegreen' and Database().count():
+            # ✅ Новая коллекция строится в фоне, поиск до переключения идёт по текущей
+            logger.warning("⚠️  FORCE_RELOAD=true — переиндексация в новую коллекцию (blue/green)")
+            self._reindex_process = start_background_reindex()
+            first_run = False
+        elif Config.FORCE_RELOAD:
             logger.warning("⚠️  FORCE_RELOAD=true — выполняем полную перезагрузку")
             first_run = True
         elif Config.SKIP_LOAD:
             logger.info("⏭️  SKIP_LOAD=true — пропускаем загрузку")
             return
 
+        if first_run and not Config.FORCE_RELOAD and self._restore_snapshot():
+            first_run = False
+
         if first_run:
             logger.info("=" * 60)
             logger.info("🔄 ПЕРВИЧНАЯ ИНДЕКСАЦИЯ (40-60 минут)")
             logger.info("=" * 60)
             self._db_updater = UpdateDatabase()
-            self._db_updater.load_all()
+            self._db_updater.load_all(resume=not Config.FORCE_RELOAD)
             logger.info("✅ Первичная индексация завершена!")
         else:
             logger.info("✅ База уже проиндексирована")
+            db = Database()
+            if db.needs_filter_backfill():
+                db.backfill_filter_fields()
+            if Config.DENSE_MODEL_AUTO_MIGRATE and self._reindex_process is None \
+                    and db.embedding_model() != Config.DENSE_MODEL:
+                # ✅ Перекодирование в новую коллекцию в фоне, поиск до переключения — прежней моделью
+                logger.warning(f"⚠️  DENSE_MODEL={Config.DENSE_MODEL} ≠ {db.embedding_model()} — "
+                               f"перекодирование коллекции (blue/green)")
+                self._reindex_process = start_background_reindex(reembed_only=True)
+
+        if Config.FAST_START:
+            return  # Ollama проверяется фоновым StartupManager
 
         # Проверка Ollama
         from rag_llm.model import Model
@@ -61,9 +100,42 @@ class AppController:
         if not llm.check_model_available():
             logger.warning(f"⚠️  Модель {llm.model_name} не найдена в Ollama!")
 
+    def start_warmup(self, trigger: str = 'startup'):
+        """✅ Прогрев частых запросов в фоне (в пуле процессов — в каждом воркере поиска)"""
+        if not Config.WARMUP_ENABLED or self._worker_pool is not None:
+            return
+        threading.Thread(
+            target=lambda: QueryWarmup().run(self._get_semantic(), trigger),
+            name="warmup", daemon=True
+        ).start()
+
+    def _restore_snapshot(self) -> bool:
+        """✅ Пустая база + SNAPSHOT_RESTORE_PATH — восстановление из снимка вместо полной загрузки"""
+        path = Config.SNAPSHOT_RESTORE_PATH
+        if not path:
+            return False
+        if not os.path.exists(path):
+            logger.warning(f"⚠️  Снимок {path} не найден — выполняем полную загрузку")
+            return False
+        if Database().count():
+            return False  # прерванная загрузка поверх данных — продолжается обычным путём
+        try:
+            restore_snapshot(path)
+            return True
+        except Exception as e:
+            logger.error(f"❌ Восстановление из снимка не удалось: {e} — выполняем полную загрузку")
+            Database().clear_all()
+            IndexManifest().reset()
+            return False
+
     def _check_first_run(self) -> bool:
         """Проверяет, был ли уже выполнен первоначальный индекс"""
         try:
+            # ✅ Прерванная полная загрузка — база не пуста, но индекс недостроен
+            if IndexManifest().load_status() == STATUS_IN_PROGRESS:
+                logger.warning("⚠️  Полная загрузка была прервана — продолжаем с оставшихся страниц")
+                return True
+
             db = Database()
             doc_count = db.count()
             if doc_count == 0:
@@ -115,13 +187,23 @@ class AppController:
             return True
         elif cmd == '/help':
             logger.info("📖 Команды: /clear, /exit, /help, /sync")
+            logger.info("🔎 Фильтры в запросе: space:HR label:vpn,wifi since:30d after:2024-01-01 before:2024-06-01")
             return True
         return False
 
     def _process_query(self, query: str):
         """Обработка запроса"""
+        # Фильтры в тексте запроса: space:HR label:vpn since:30d after:2024-01-01
+        query, filters = parse_filters(query)
+        if not query:
+            logger.info("⚠️  Пустой запрос после фильтров")
+            return
+
+        if not filters:
+            QueryWarmup().record(query)
+
         logger.info("🔍 Поиск...")
-        matches = self._get_semantic().search(query)
+        matches = self._get_semantic().search(query, filters=filters)
 
         if not matches.get('matches'):
             logger.info("⚠️  Ничего не найдено")
@@ -143,10 +225,16 @@ class AppController:
     def _sync_now(self):
         """Принудительная синхронизация"""
         logger.info("🔄 Принудительная синхронизация...")
+        if self._worker_pool is not None:
+            stats = self._worker_pool.sync_now(max_pages=20)
+            logger.info(f"✅ Синхронизировано: {stats['updated']} страниц")
+            return
         if self._db_updater is None:
             self._db_updater = UpdateDatabase()
-        stats = self._db_updater.sync_changed_pages(max_pages=20)
+        stats = self._db_updater.sync_all_spaces(max_pages=20)
         logger.info(f"✅ Синхронизировано: {stats['updated']} страниц")
+        if stats['updated'] > 0:
+            self.start_warmup('sync')
 
     def cleanup(self):
         """Очистка ресурсов"""
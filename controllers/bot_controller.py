@@ -5,19 +5,46 @@ import asyncio
 
 
 class BotController:
-    """✅ Контроллер Telegram бота (с правильной инициализацией)"""
+    """✅ Контроллер Telegram бота (polling или webhook)"""
 
-    def __init__(self):
+    def __init__(self, search_backend=None):
+        self._search_backend = search_backend
         self._running = False
         self._thread = None
         self._loop = None
+        self._stop_event = None
+        self._server = None
+
+    @property
+    def webhook_mode(self) -> bool:
+        return bool(Config.TELEGRAM_WEBHOOK_URL)
 
     def start(self):
         """Запуск бота в отдельном потоке"""
         self._running = True
         self._thread = threading.Thread(target=self._run_bot, daemon=True)
         self._thread.start()
-        logger.info("✅ Telegram Bot запущен (Thread)")
+        logger.info(f"✅ Telegram Bot запущен (Thread, {'webhook' if self.webhook_mode else 'polling'})")
+
+    def _build_application(self, bot):
+        """Создаёт PTB Application и регистрирует обработчики"""
+        from telegram.ext import Application, CommandHandler, MessageHandler, filters
+
+        app = (
+            Application.builder()
+            .token(Config.TELEGRAM_BOT_TOKEN)
+            .concurrent_updates(Config.TELEGRAM_CONCURRENT_UPDATES)
+            .build()
+        )
+
+        # Регистрируем обработчики
+        app.add_handler(CommandHandler("start", bot.start))
+        app.add_handler(CommandHandler("help", bot.help_command))
+        app.add_handler(CommandHandler("status", bot.status_command))
+        app.add_handler(CommandHandler("clear", bot.clear_command))
+        app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bot.handle_message))
+        app.add_error_handler(bot.error_handler)
+        return app
 
     def _run_bot(self):
         """Точка входа бота (внутри потока)"""
@@ -25,27 +52,20 @@ class BotController:
             # ✅ Создаём новый event loop для потока
             self._loop = asyncio.new_event_loop()
             asyncio.set_event_loop(self._loop)
+            self._stop_event = asyncio.Event()
 
             # ✅ Импорты внутри потока
-            from telegram.ext import Application, CommandHandler, MessageHandler, filters
             from telegram_bot.bot import TelegramBot
 
-            bot = TelegramBot()
-
-            # ✅ Создаём приложение
-            app = Application.builder().token(Config.TELEGRAM_BOT_TOKEN).build()
+            bot = TelegramBot(search_backend=self._search_backend)
+            app = self._build_application(bot)
 
-            # Регистрируем обработчики
-            app.add_handler(CommandHandler("start", bot.start))
-            app.add_handler(CommandHandler("help", bot.help_command))
-            app.add_handler(CommandHandler("status", bot.status_command))
-            app.add_handler(CommandHandler("clear", bot.clear_command))
-            app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bot.handle_message))
-            app.add_error_handler(bot.error_handler)
-
-            # ✅ Запускаем polling в event loop
-            logger.info("🚀 Telegram Bot запущен (polling mode)")
-            self._loop.run_until_complete(self._start_app(app))
+            if self.webhook_mode:
+                logger.info(f"🚀 Telegram Bot запущен (webhook mode, :{Config.TELEGRAM_WEBHOOK_PORT})")
+                self._loop.run_until_complete(self._start_webhook(app, bot))
+            else:
+                logger.info("🚀 Telegram Bot запущен (polling mode)")
+                self._loop.run_until_complete(self._start_app(app))
 
         except Exception as e:
             logger.error(f"❌ Ошибка бота: {e}")
@@ -67,9 +87,8 @@ class BotController:
             # ✅ Запускаем приложение
             await app.start()
 
-            # ✅ Держим поток живым
-            while self._running:
-                await asyncio.sleep(1)
+            # ✅ Ждём сигнала остановки (без опроса в цикле)
+            await self._stop_event.wait()
 
         except Exception as e:
             logger.error(f"❌ Ошибка в _start_app: {e}")
@@ -80,9 +99,66 @@ class BotController:
             await app.updater.stop()
             await app.shutdown()
 
+    async def _start_webhook(self, app, bot):
+        """✅ Webhook: ASGI-сервер принимает Update, PTB обрабатывает их конкурентно"""
+        import uvicorn
+        from telegram_bot.webhook import WebhookApp
+
+        asgi_app = WebhookApp(
+            app,
+            bot,
+            path=Config.TELEGRAM_WEBHOOK_PATH,
+            secret_token=Config.TELEGRAM_WEBHOOK_SECRET
+        )
+        self._server = uvicorn.Server(uvicorn.Config(
+            asgi_app,
+            host="0.0.0.0",
+            port=Config.TELEGRAM_WEBHOOK_PORT,
+            log_level="warning",
+            lifespan="off"
+        ))
+
+        try:
+            await app.initialize()
+            await app.start()
+
+            # Сервер поднимаем сразу: /health отвечает, /ready — 503 до загрузки моделей
+            server_task = asyncio.create_task(self._server.serve())
+            await asyncio.get_running_loop().run_in_executor(None, bot._init_rag_components)
+
+            webhook_url = Config.TELEGRAM_WEBHOOK_URL.rstrip('/')
+            if not webhook_url.endswith(Config.TELEGRAM_WEBHOOK_PATH):
+                webhook_url += Config.TELEGRAM_WEBHOOK_PATH
+            # Регистрация идёт при старте каждой реплики (rolling restart, масштабирование):
+            # очередь Update бота общая, поэтому накопленные обновления не сбрасываем
+            await app.bot.set_webhook(
+                url=webhook_url,
+                secret_token=Config.TELEGRAM_WEBHOOK_SECRET or None,
+                max_connections=Config.TELEGRAM_CONCURRENT_UPDATES,
+                drop_pending_updates=False
+            )
+            logger.info(f"🔗 Webhook зарегистрирован: {webhook_url}")
+
+            await self._stop_event.wait()
+            self._server.should_exit = True
+            await server_task
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка в _start_webhook: {e}")
+            raise
+        finally:
+            # Webhook не удаляем: остальные реплики за балансировщиком продолжают работу
+            await app.stop()
+            await app.shutdown()
+
     def stop(self):
         """Остановка бота"""
         self._running = False
+        if self._loop and self._stop_event:
+            try:
+                self._loop.call_soon_threadsafe(self._stop_event.set)
+            except RuntimeError:
+                pass  # event loop уже закрыт
         if self._thread and self._thread.is_alive():
             self._thread.join(timeout=5)
         logger.info("🛑 Telegram Bot остановлен")
@@ -0,0 +1,63 @@
+# controllers/metrics_controller.py
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from hybrid_search.metrics import Tracer
+from hybrid_search.startup import StartupManager
+from hybrid_search.utils import logger, Config
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """HTTP-обработчик /metrics (Prometheus text format), /health и /ready"""
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == '/metrics':
+            self._reply(200, Tracer().render_prometheus(), CONTENT_TYPE_LATEST)
+        elif path == '/health':
+            self._reply(200, 'ok')
+        elif path == '/ready':
+            status = StartupManager().status()
+            self._reply(200 if status['ready'] else 503, json.dumps(status), 'application/json')
+        else:
+            self._reply(404, 'not found')
+
+    def _reply(self, code: int, text: str, content_type: str = 'text/plain; charset=utf-8'):
+        body = text.encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Не засоряем лог каждым скрейпом Prometheus
+        logger.debug(f"metrics: {format % args}")
+
+
+class MetricsController:
+    """✅ Контроллер HTTP-эндпоинта метрик"""
+
+    def __init__(self):
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """Запуск HTTP-сервера метрик в отдельном потоке"""
+        self._server = ThreadingHTTPServer(('0.0.0.0', Config.METRICS_PORT), _MetricsHandler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"✅ Метрики доступны на :{Config.METRICS_PORT}/metrics")
+
+    def stop(self):
+        """Остановка HTTP-сервера метрик"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        logger.info("🛑 Сервер метрик остановлен")
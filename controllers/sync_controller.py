@@ -4,6 +4,7 @@ import time
 
 from hybrid_search.update import UpdateDatabase
 from hybrid_search.utils import logger
+from hybrid_search.warmup import QueryWarmup
 
 
 class SyncController:
@@ -23,12 +24,14 @@ class SyncController:
 
     def _run_sync(self):
         """Фоновая синхронизация"""
+        # Потоки torch не трогаем: настройка общая для процесса, синхронизации уступает ModelScheduler
         self._updater = UpdateDatabase()
         while self._running:
             try:
-                stats = self._updater.sync_changed_pages(max_pages=50)
+                stats = self._updater.sync_all_spaces(max_pages=50)
                 if stats['updated'] > 0:
                     logger.info(f"✅ Обновлено: {stats['updated']}/{stats['checked']}")
+                    QueryWarmup().run(trigger='sync')  # результаты частых запросов — по новому индексу
                 else:
                     logger.info(f"✅ Изменений нет ({stats['checked']} проверено)")
                 time.sleep(300)  # 5 минут
@@ -0,0 +1,260 @@
+# controllers/worker_controller.py
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from hybrid_search.metrics import mark_process_dead, multiprocess_enabled
+from hybrid_search.scheduler import serving_torch_threads, set_torch_threads
+from hybrid_search.utils import logger, Config
+
+# Параметры периодической синхронизации (как в SyncController)
+SYNC_INTERVAL_SECONDS = 300
+SYNC_MAX_PAGES = 50
+# Как часто диспетчер проверяет, живы ли воркеры (сек)
+HEALTH_CHECK_INTERVAL = 5.0
+
+
+def configure_torch_threads(num_threads: int):
+    """Бюджет потоков torch/OpenMP для процесса-воркера (до импорта torch)"""
+    if num_threads <= 0:
+        return
+    os.environ['OMP_NUM_THREADS'] = str(num_threads)
+    os.environ['MKL_NUM_THREADS'] = str(num_threads)
+    set_torch_threads(num_threads)
+
+
+def _query_worker_main(worker_id: int, requests, responses, generation, torch_threads: int):
+    """Процесс-воркер поиска: свой Embed, общая ChromaDB"""
+    configure_torch_threads(torch_threads)
+
+    from hybrid_search.database import Database
+    from hybrid_search.metrics import Tracer
+    from hybrid_search.search import SemanticSearch
+    from hybrid_search.warmup import QueryWarmup
+
+    semantic = SemanticSearch()
+    tracer = Tracer()
+    QueryWarmup().run(semantic, trigger='startup')  # у каждого воркера свои модели и кэши
+    seen_generation = generation.value
+    responses.put(('ready', f"query-{worker_id}", None))
+
+    while True:
+        item = requests.get()
+        if item is None:
+            break
+
+        request_id, deadline, query, n_results, spaces, filters = item
+        if time.time() > deadline:
+            # Клиент уже получил таймаут — не тратим воркер на ответ, которого никто не ждёт
+            tracer.inc("worker_expired_requests")
+            continue
+
+        # Ingestion-воркер записал новые чанки — переоткрываем базу перед поиском
+        if generation.value != seen_generation:
+            seen_generation = generation.value
+            Database().reload()
+            QueryWarmup().run(semantic, trigger='sync')
+
+        try:
+            result = semantic.search(query, n_results, spaces=spaces, filters=filters)
+        except Exception as e:
+            result = {'matches': [], 'query': query, 'error': str(e)}
+        responses.put(('result', request_id, result))
+
+
+def _ingestion_worker_main(commands, responses, generation, torch_threads: int, periodic: bool):
+    """Процесс-воркер индексации: синхронизация Confluence, не мешает поиску"""
+    configure_torch_threads(torch_threads)
+
+    from hybrid_search.update import UpdateDatabase
+
+    updater = UpdateDatabase()
+    responses.put(('ready', 'ingestion', None))
+    next_run = time.monotonic()
+
+    while True:
+        timeout = max(0.0, next_run - time.monotonic()) if periodic else None
+        try:
+            command = commands.get(timeout=timeout)
+        except queue.Empty:
+            command = (None, SYNC_MAX_PAGES)
+        if command is None:
+            break
+
+        request_id, max_pages = command
+        try:
+            stats = updater.sync_all_spaces(max_pages=max_pages)
+        except Exception as e:
+            logger.error(f"❌ Ошибка синхронизации в ingestion-воркере: {e}")
+            stats = {'checked': 0, 'updated': 0, 'new': 0, 'errors': 1}
+
+        if stats['updated'] > 0:
+            with generation.get_lock():
+                generation.value += 1
+            logger.info(f"✅ Обновлено: {stats['updated']}/{stats['checked']}")
+        else:
+            logger.info(f"✅ Изменений нет ({stats['checked']} проверено)")
+
+        if request_id is not None:
+            responses.put(('result', request_id, stats))
+        else:
+            next_run = time.monotonic() + SYNC_INTERVAL_SECONDS
+
+
+class WorkerPoolController:
+    """
+    ✅ Пул процессов: N воркеров поиска (у каждого свой Embed) и отдельный ingestion-воркер.
+
+    Воркеры работают с общей ChromaDB и получают задачи через локальные очереди,
+    поэтому encode/rerank масштабируются по ядрам, а переиндексация не конкурирует
+    с поиском за GIL и потоки torch.
+    """
+
+    def __init__(self, query_workers: int = None, ingestion: bool = None):
+        self.query_workers = query_workers or Config.QUERY_WORKERS
+        self.ingestion = Config.ENABLE_PERIODIC_SYNC if ingestion is None else ingestion
+        self._ctx = mp.get_context('spawn')  # fork небезопасен для torch и потоков Chroma
+        self._processes = []
+        self._futures: Dict[int, Future] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._dispatcher = None
+        self._running = False
+        self.ready = set()
+
+    def start(self):
+        """Запуск процессов-воркеров и диспетчера ответов"""
+        self._requests = self._ctx.Queue()
+        self._commands = self._ctx.Queue()
+        self._responses = self._ctx.Queue()
+        self._generation = self._ctx.Value('i', 0)
+        self._running = True
+
+        self._processes = [self._spawn_query(worker_id) for worker_id in range(self.query_workers)]
+        # Ingestion-воркер запускаем всегда: через него идёт /sync, периодика — по флагу
+        self._processes.append(self._spawn_ingestion())
+
+        if not multiprocess_enabled():
+            logger.warning("⚠️  PROMETHEUS_MULTIPROC_DIR не задан: /metrics не увидит стадии поиска в воркерах")
+
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+        logger.info(f"✅ Пул воркеров запущен: {self.query_workers} поиск + 1 ingestion "
+                    f"(периодическая синхронизация: {self.ingestion})")
+
+    def _spawn_query(self, worker_id: int):
+        process = self._ctx.Process(
+            target=_query_worker_main,
+            args=(worker_id, self._requests, self._responses, self._generation,
+                  serving_torch_threads(self.query_workers)),
+            name=f"rag-query-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def _spawn_ingestion(self):
+        process = self._ctx.Process(
+            target=_ingestion_worker_main,
+            args=(self._commands, self._responses, self._generation,
+                  max(1, Config.INGEST_TORCH_THREADS), self.ingestion),
+            name="rag-ingestion",
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def _respawn_dead(self):
+        """Перезапуск упавших воркеров (OOM, segfault в torch): их запросы завершаются по таймауту"""
+        for index, process in enumerate(self._processes):
+            if process.is_alive() or not self._running:
+                continue
+            if index < self.query_workers:
+                key, replacement = f"query-{index}", self._spawn_query(index)
+            else:
+                key, replacement = 'ingestion', self._spawn_ingestion()
+            self.ready.discard(key)
+            mark_process_dead(process.pid)
+            self._processes[index] = replacement
+            logger.error(f"❌ Воркер {key} завершился (код {process.exitcode}) — перезапущен (pid {replacement.pid})")
+
+    def _dispatch(self):
+        """Разбирает ответы воркеров, завершает ожидающие Future и перезапускает упавшие воркеры"""
+        next_check = time.monotonic() + HEALTH_CHECK_INTERVAL
+        while self._running:
+            if time.monotonic() >= next_check:
+                self._respawn_dead()
+                next_check = time.monotonic() + HEALTH_CHECK_INTERVAL
+            try:
+                kind, key, payload = self._responses.get(timeout=1)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            if kind == 'ready':
+                self.ready.add(key)
+                logger.info(f"✅ Воркер {key} готов ({len(self.ready)}/{self.query_workers + 1})")
+                continue
+
+            with self._lock:
+                future = self._futures.pop(key, None)
+            if future is not None and not future.done():
+                future.set_result(payload)
+
+    def _submit(self, target_queue, payload_fn) -> tuple:
+        future = Future()
+        request_id = next(self._ids)
+        with self._lock:
+            self._futures[request_id] = future
+        target_queue.put(payload_fn(request_id))
+        return request_id, future
+
+    def _forget(self, request_id: int):
+        """Запрос без ответа (таймаут, упавший воркер) больше не ждём: ответ, если придёт, отбрасывается"""
+        with self._lock:
+            self._futures.pop(request_id, None)
+
+    def search(self, query: str, n_results: int = None, spaces: Optional[List[str]] = None,
+               filters=None, timeout: Optional[float] = None) -> Dict:
+        """Поиск в свободном воркере (интерфейс совместим с SemanticSearch.search)"""
+        timeout = timeout or Config.WORKER_REQUEST_TIMEOUT
+        deadline = time.time() + timeout  # wall clock: сравнивается в другом процессе
+        request_id, future = self._submit(self._requests,
+                                          lambda rid: (rid, deadline, query, n_results, spaces, filters))
+        try:
+            return future.result(timeout=timeout)
+        except Exception as e:
+            self._forget(request_id)
+            error = str(e) or type(e).__name__  # TimeoutError — без текста
+            logger.error(f"❌ Воркер поиска не ответил: {error}")
+            return {'matches': [], 'query': query, 'error': error}
+
+    def sync_now(self, max_pages: int = 20, timeout: Optional[float] = None) -> Dict:
+        """Принудительная синхронизация в ingestion-воркере"""
+        request_id, future = self._submit(self._commands, lambda rid: (rid, max_pages))
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            self._forget(request_id)
+            raise
+
+    def stop(self):
+        """Остановка воркеров"""
+        self._running = False
+        for _ in range(self.query_workers):
+            self._requests.put(None)
+        self._commands.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+            mark_process_dead(process.pid)
+        if self._dispatcher and self._dispatcher.is_alive():
+            self._dispatcher.join(timeout=2)
+        logger.info("🛑 Пул воркеров остановлен")
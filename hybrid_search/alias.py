@@ -0,0 +1,100 @@
+# hybrid_search/alias.py
+import json
+import os
+import time
+from typing import Dict, Optional
+
+from hybrid_search.utils import logger, Config
+
+ALIAS_FILE = 'active_collection.json'
+VERSION_SEPARATOR = '_v'
+# Предыдущих коллекций в истории указателя (откат: python -m hybrid_search.reindex --switch NAME)
+ALIAS_HISTORY = 10
+WATERMARK_PREFIX = 'update_time:'
+
+# Процесс, строящий теневую коллекцию, работает с ней независимо от указателя
+_pinned: Optional[str] = None
+
+
+def alias_path() -> str:
+    return os.path.join(Config.CHROMA_DB_PATH, ALIAS_FILE)
+
+
+def read_alias() -> Dict:
+    """Указатель на активную коллекцию: {"collection", "previous", "switched_at"} или {}"""
+    try:
+        with open(alias_path(), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️  Указатель коллекции не прочитан ({e}) — используется {Config.CHROMA_COLLECTION}")
+        return {}
+
+
+def active_collection() -> str:
+    """Коллекция, из которой читают запросы (без указателя — CHROMA_COLLECTION)"""
+    return _pinned or read_alias().get('collection') or Config.CHROMA_COLLECTION
+
+
+def alias_version() -> int:
+    """Метка изменения указателя (mtime): процессы сверяют её перед запросом; 0 — нет указателя или pin"""
+    if _pinned:
+        return 0
+    try:
+        return os.stat(alias_path()).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def pin_collection(name: Optional[str]):
+    """Закрепляет коллекцию за процессом (сборка теневой коллекции), None — снова следовать указателю"""
+    global _pinned
+    _pinned = name
+
+
+def set_active_collection(name: str):
+    """✅ Атомарное переключение указателя: запись во временный файл + rename"""
+    alias = read_alias()
+    current = alias.get('collection') or Config.CHROMA_COLLECTION
+    previous = [c for c in [current] + alias.get('previous', []) if c != name][:ALIAS_HISTORY]
+    data = {'collection': name, 'previous': previous, 'switched_at': time.time()}
+
+    os.makedirs(Config.CHROMA_DB_PATH, exist_ok=True)
+    tmp_path = alias_path() + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, alias_path())
+    logger.info(f"🔀 Активная коллекция: {current} → {name}")
+
+
+def is_versioned(name: str) -> bool:
+    return name.startswith(Config.CHROMA_COLLECTION + VERSION_SEPARATOR)
+
+
+def new_collection_name() -> str:
+    """Имя новой версии коллекции: <CHROMA_COLLECTION>_v<время UTC>"""
+    return f"{Config.CHROMA_COLLECTION}{VERSION_SEPARATOR}{time.strftime('%Y%m%d%H%M%S', time.gmtime())}"
+
+
+def watermark_key(collection: str, page_id: str) -> str:
+    """
+    Ключ Redis с временем последней индексации страницы в коллекции. У каждой версии свои отметки:
+    сборка новой коллекции не сдвигает отметки текущей (исходная коллекция — прежний формат ключа).
+    """
+    if collection == Config.CHROMA_COLLECTION:
+        return f"{WATERMARK_PREFIX}{page_id}"
+    return f"{WATERMARK_PREFIX}{collection}:{page_id}"
+
+
+def state_dir(collection: str) -> str:
+    """Каталог файлов состояния коллекции (PageStore, манифест): исходная — корень CHROMA_DB_PATH"""
+    if collection == Config.CHROMA_COLLECTION:
+        return Config.CHROMA_DB_PATH
+    return os.path.join(Config.CHROMA_DB_PATH, 'collections', collection)
+
+
+def state_path(collection: str, filename: str) -> str:
+    return os.path.join(state_dir(collection), filename)
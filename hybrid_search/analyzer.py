@@ -0,0 +1,184 @@
+# hybrid_search/analyzer.py
+"""
+Анализатор текста для BM25 (sparse-поиск): слова из регулярного выражения проходят шаги ANALYZER_STEPS.
+
+    translit   — слово из смешанных латиницы и кириллицы (сервeр с латинской e) приводится к одной
+                 письменности, кириллические написания тех-терминов (докер, кубер, бэкапы) — к латинским
+                 (TECH_TERMS + ANALYZER_SYNONYMS_PATH)
+    stopwords  — служебные слова русского и английского
+    stem       — стемминг Snowball: русский для кириллицы, английский для латиницы
+                 ("сервер", "сервера", "серверов" → "сервер")
+
+Пустой ANALYZER_STEPS — прежнее поведение (только регулярное выражение). Свой шаг:
+register_step("name", fn), fn(слово) → слово или None (слово отбрасывается).
+Результат анализа слова кэшируется: словарь корпуса ограничен, повторный анализ — поиск в dict.
+
+    python -m benchmarks.analyzer     # постинги, латентность и recall BM25 для разных конвейеров
+"""
+import json
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+
+from hybrid_search.utils import logger, Config
+
+TOKEN_RE = re.compile(r'\b[a-zа-яё0-9]{2,}\b')
+CYRILLIC_RE = re.compile(r'[а-яё]')
+LATIN_RE = re.compile(r'[a-z]')
+MIN_TOKEN_LENGTH = 2
+
+STOP_WORDS = frozenset("""
+и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее её мне было вот от
+меня еще ещё нет о из ему теперь когда даже ну вдруг ли если уже или ни быть был него до вас нибудь опять уж
+вам ведь там потом себя ничего ей может они тут где есть надо ней для мы тебя их чем была сам чтоб без будто
+чего раз тоже себе под будет ж тогда кто этот того потому этого какой совсем ним здесь этом один почти мой тем
+чтобы нее неё сейчас были куда зачем всех никогда можно при наконец два об другой хоть после над больше тот
+через эти нас про всего них какая много разве три эту моя впрочем хорошо свою этой перед иногда лучше чуть том
+нельзя такой им более всегда конечно всю между это эта эти также либо каждый который которая которые которых
+the a an and or but if then else of at by for with about against between into through during before after
+above below to from up down in out on off over under again further once here there when where why how all any
+both each few more most other some such no nor not only own same so than too very can will just should now is
+are was were be been being have has had having do does did doing it its this that these those i you he she we
+they them their what which who whom as until while
+""".split())
+
+# Кириллические написания тех-терминов → латинское (сравниваются основы: "бэкапы" → "бэкап" → backup)
+TECH_TERMS = {
+    'докер': 'docker', 'кубернетес': 'kubernetes', 'кубер': 'kubernetes', 'гит': 'git', 'гитлаб': 'gitlab',
+    'гитхаб': 'github', 'джира': 'jira', 'конфлюенс': 'confluence', 'постгрес': 'postgresql', 'редис': 'redis',
+    'кафка': 'kafka', 'дженкинс': 'jenkins', 'графана': 'grafana',
+    'прометеус': 'prometheus', 'ансибл': 'ansible', 'терраформ': 'terraform', 'нжинкс': 'nginx',
+    'энджинкс': 'nginx', 'линукс': 'linux', 'питон': 'python', 'джава': 'java', 'впн': 'vpn', 'апи': 'api',
+    'эластик': 'elasticsearch', 'кибана': 'kibana', 'слак': 'slack', 'деплой': 'deploy', 'бэкап': 'backup',
+    'бекап': 'backup', 'хотфикс': 'hotfix', 'мердж': 'merge', 'коммит': 'commit', 'пайплайн': 'pipeline',
+    'релиз': 'release', 'продакшен': 'production', 'прод': 'prod', 'стейджинг': 'staging', 'тикет': 'ticket',
+}
+
+# Кириллические и латинские буквы одинакового начертания
+HOMOGLYPHS_LATIN = str.maketrans('аеорсхукмтнв', 'aeopcxykmthb')
+HOMOGLYPHS_CYRILLIC = str.maketrans('aeopcxykmthb', 'аеорсхукмтнв')
+
+_STEPS: Dict[str, Callable[[str], Optional[str]]] = {}
+
+
+def register_step(name: str, step: Callable[[str], Optional[str]]):
+    """Регистрирует шаг конвейера: слово → слово или None"""
+    _STEPS[name] = step
+
+
+# ===== Стемминг =====
+
+_local = threading.local()  # стеммеры Snowball хранят состояние разбора — свои в каждом потоке
+_warned = False
+
+
+def _stemmer(language: str):
+    global _warned
+    stemmers = getattr(_local, 'stemmers', None)
+    if stemmers is None:
+        try:
+            import snowballstemmer
+            stemmers = {lang: snowballstemmer.stemmer(lang) for lang in ('russian', 'english')}
+        except ImportError:
+            if not _warned:
+                _warned = True
+                logger.warning("⚠️  snowballstemmer не установлен — шаг stem пропускается")
+            stemmers = {}
+        _local.stemmers = stemmers
+    return stemmers.get(language)
+
+
+def stem(token: str) -> str:
+    if token.isdigit():
+        return token
+    stemmer = _stemmer('russian' if CYRILLIC_RE.search(token) else 'english')
+    return stemmer.stemWord(token) if stemmer else token
+
+
+# ===== Транслитерация =====
+
+_tech_stems: Optional[Dict[str, str]] = None
+
+
+def _tech_terms() -> Dict[str, str]:
+    """Основы кириллических написаний → латинский термин (TECH_TERMS + ANALYZER_SYNONYMS_PATH)"""
+    global _tech_stems
+    if _tech_stems is None:
+        terms = dict(TECH_TERMS)
+        path = Config.ANALYZER_SYNONYMS_PATH
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                terms.update({k.lower(): v.lower() for k, v in json.load(f).items()})
+        _tech_stems = {stem(source): target for source, target in terms.items()}
+    return _tech_stems
+
+
+def transliterate(token: str) -> str:
+    cyrillic, latin = len(CYRILLIC_RE.findall(token)), len(LATIN_RE.findall(token))
+    if cyrillic and latin:
+        # Опечатка раскладки / копипаст: меньшинство букв переводится в письменность большинства
+        fixed = token.translate(HOMOGLYPHS_CYRILLIC if cyrillic >= latin else HOMOGLYPHS_LATIN)
+        if not (CYRILLIC_RE.search(fixed) and LATIN_RE.search(fixed)):
+            token = fixed
+    if CYRILLIC_RE.search(token):
+        return _tech_terms().get(stem(token), token)
+    return token
+
+
+register_step('translit', transliterate)
+register_step('stopwords', lambda token: None if token in STOP_WORDS else token)
+register_step('stem', stem)
+
+
+class Analyzer:
+    """✅ Конвейер анализа: регулярное выражение → шаги (ANALYZER_STEPS) с кэшем результатов по слову"""
+
+    def __init__(self, steps: Sequence[str] = None, cache_size: int = None):
+        if steps is None:
+            steps = [s.strip() for s in Config.ANALYZER_STEPS.split(',') if s.strip()]
+        unknown = [name for name in steps if name not in _STEPS]
+        if unknown:
+            raise ValueError(f"Неизвестные шаги анализатора: {', '.join(unknown)} (есть: {', '.join(_STEPS)})")
+        self.steps = list(steps)
+        self._pipeline = [_STEPS[name] for name in self.steps]
+        self._memo: Dict[str, Optional[str]] = {}
+        self._memo_limit = Config.ANALYZER_CACHE_SIZE if cache_size is None else cache_size
+        self.hits = 0
+        self.misses = 0
+
+    def analyze_token(self, token: str) -> Optional[str]:
+        try:
+            result = self._memo[token]
+            self.hits += 1
+            return result
+        except KeyError:
+            pass
+        self.misses += 1
+        result = token
+        for step in self._pipeline:
+            result = step(result)
+            if result is None:
+                break
+        if result is not None and len(result) < MIN_TOKEN_LENGTH:
+            result = None
+        if self._memo_limit:
+            if len(self._memo) >= self._memo_limit:
+                self._memo.clear()
+            self._memo[token] = result
+        return result
+
+    def analyze(self, text: str) -> List[str]:
+        """Термины текста для BM25 (порядок и повторы сохраняются)"""
+        tokens = TOKEN_RE.findall(text.lower())
+        if not self._pipeline:
+            return tokens
+        analyzed = []
+        for token in tokens:
+            term = self.analyze_token(token)
+            if term is not None:
+                analyzed.append(term)
+        return analyzed
+
+    def describe(self) -> str:
+        return '+'.join(self.steps) or 'regex'
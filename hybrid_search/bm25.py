@@ -0,0 +1,138 @@
+# hybrid_search/bm25.py
+import math
+import os
+import pickle
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from hybrid_search.alias import state_path
+from hybrid_search.utils import logger
+
+
+def bm25_path(collection: str) -> str:
+    """Модель BM25 коллекции: индексы sparse-векторов чанков — номера документов её корпуса"""
+    return state_path(collection, 'bm25.pickle')
+
+
+def save_model(model, collection: str, analyzer: str) -> str:
+    """
+    Модель BM25 (BM25Okapi или StreamingBM25) — в каталог состояния коллекции (атомарная замена файла).
+    analyzer — Analyzer.describe(): словарь модели совпадает с токенами запросов только при том же конвейере.
+    """
+    path = bm25_path(collection)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump({'analyzer': analyzer, 'model': model}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_model(collection: str, analyzer: str) -> Optional[object]:
+    """Сохранённая модель BM25 коллекции или None (нет файла, не читается, обучена другим конвейером анализатора)"""
+    path = bm25_path(collection)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            saved = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if not isinstance(saved, dict):
+        return saved  # файл до записи конвейера: сверить не с чем
+    if saved.get('analyzer') != analyzer:
+        logger.warning(f"⚠️  BM25 коллекции {collection} обучен с анализатором {saved.get('analyzer')}, "
+                       f"текущий — {analyzer} (ANALYZER_STEPS): модель не используется до переобучения")
+        return None
+    return saved['model']
+
+
+def model_mtime(collection: str) -> Optional[float]:
+    """Время изменения файла модели (None — файла нет): по нему видно, что модель перезаписана"""
+    try:
+        return os.path.getmtime(bm25_path(collection))
+    except OSError:
+        return None
+
+
+class StreamingBM25:
+    """
+    ✅ BM25 (Okapi), строящийся потоково: документы добавляются по одному.
+
+    В отличие от rank_bm25.BM25Okapi не хранит токены корпуса — только постинги
+    (термин → номера документов и частоты в компактных array) и длины документов.
+    Формулы idf/score совпадают с BM25Okapi, поэтому sparse-векторы эквивалентны.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.corpus_size = 0
+        self.avgdl = 0.0
+        self.idf: Dict[str, float] = {}
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._doc_len = array('I')
+        self._norm = None
+
+    def add_document(self, tokens: List[str]):
+        """Добавляет документ (номер документа = порядок добавления)"""
+        doc_id = self.corpus_size
+        for term, tf in Counter(tokens).items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array('I'), array('H'))
+            postings[0].append(doc_id)
+            postings[1].append(min(tf, 65535))
+        self._doc_len.append(len(tokens))
+        self.corpus_size += 1
+
+    def finalize(self):
+        """Считает idf и нормировку длин после добавления всех документов"""
+        doc_len = np.frombuffer(self._doc_len, dtype=np.dtype(f'u{self._doc_len.itemsize}')).astype(np.float64)
+        self.avgdl = float(doc_len.mean()) if self.corpus_size else 0.0
+
+        # Как в BM25Okapi: отрицательные idf заменяются на epsilon * средний idf
+        idf_sum = 0.0
+        negative = []
+        for term, (docs, _) in self._postings.items():
+            df = len(docs)
+            idf = math.log(self.corpus_size - df + 0.5) - math.log(df + 0.5)
+            self.idf[term] = idf
+            idf_sum += idf
+            if idf < 0:
+                negative.append(term)
+        eps = self.epsilon * idf_sum / len(self.idf) if self.idf else 0.0
+        for term in negative:
+            self.idf[term] = eps
+
+        self._norm = self.k1 * (1 - self.b + self.b * doc_len / self.avgdl) if self.avgdl else doc_len
+        return self
+
+    def get_scores(self, query: List[str]) -> np.ndarray:
+        """BM25-оценки запроса для всех документов корпуса"""
+        scores = np.zeros(self.corpus_size)
+        for term in query:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            docs = np.frombuffer(postings[0], dtype=np.dtype(f'u{postings[0].itemsize}'))
+            tf = np.frombuffer(postings[1], dtype=np.dtype(f'u{postings[1].itemsize}')).astype(np.float64)
+            scores[docs] += self.idf[term] * tf * (self.k1 + 1) / (tf + self._norm[docs])
+        return scores
+
+    def document_frequency(self, term: str) -> int:
+        """Длина списка постингов термина (документов с термином)"""
+        postings = self._postings.get(term)
+        return len(postings[0]) if postings is not None else 0
+
+    @property
+    def postings_count(self) -> int:
+        return sum(len(docs) for docs, _ in self._postings.values())
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._postings)
@@ -1,4 +1,5 @@
 # hybrid_search/confluence.py
+import threading
 
 from hybrid_search.utils import load_env_variable, make_request, initialize_auth, singleton, logger, \
     extract_metadata_from_confluence, Config
@@ -8,32 +9,48 @@ from hybrid_search.utils import load_env_variable, make_request, initialize_auth
 class ConfluenceAPI:
     def __init__(self):
         self.api_url = Config.CONFLUENCE_URL
-        self.space_name = Config.CONFLUENCE_SPACE_NAME
+        self.space_keys = Config.CONFLUENCE_SPACES
+        self.space_name = self.space_keys[0] if self.space_keys else ''
         self.auth_token = initialize_auth()
-        logger.info(f"✅ ConfluenceAPI: {self.api_url}")
+        # ✅ Общий бюджет параллельных HTTP-запросов (на все пространства и потоки синхронизации)
+        self._http_slots = threading.BoundedSemaphore(max(1, Config.CONFLUENCE_MAX_CONCURRENT_REQUESTS))
+        logger.info(f"✅ ConfluenceAPI: {self.api_url} (пространства: {', '.join(self.space_keys) or '—'})")
 
-    def get_space_id(self) -> str:
+    def _request(self, url: str, params: dict = None) -> dict:
+        """Запрос к API в рамках общего бюджета HTTP"""
+        with self._http_slots:
+            return make_request(url, self.auth_token, params=params)
+
+    def get_space_id(self, space_key: str = None) -> str:
         """Получение ID пространства"""
+        space_key = space_key or self.space_name
         url = f"{self.api_url}/rest/api/space"
-        params = {'spaceKey': self.space_name} if self.space_name else {'limit': 50}
+        params = {'spaceKey': space_key} if space_key else {'limit': 50}
 
-        data = make_request(url, self.auth_token, params=params)
+        data = self._request(url, params=params)
         results = data.get('results', [])
 
-        if not results and 'key' in data and data.get('key') == self.space_name:
+        if not results and 'key' in data and data.get('key') == space_key:
             logger.info(f"✅ Пространство: {data.get('key')} (id: {data.get('id')})")
             return data['id']
 
         for space in results:
-            if space.get('key') == self.space_name or space.get('name') == self.space_name:
+            if space.get('key') == space_key or space.get('name') == space_key:
                 logger.info(f"✅ Пространство: {space.get('key')} (id: {space.get('id')})")
                 return space['id']
 
         available = [f"{s.get('key')}={s.get('name')}" for s in results[:10]]
-        raise ValueError(f"❌ Пространство '{self.space_name}' не найдено. Доступные: {available}")
+        raise ValueError(f"❌ Пространство '{space_key}' не найдено. Доступные: {available}")
+
+    def get_all_page_ids(self) -> dict:
+        """Страницы всех пространств CONFLUENCE_SPACES (page_id уникален в рамках Confluence)"""
+        pages = {}
+        for space_key in self.space_keys or [self.space_name]:
+            pages.update(self.get_page_ids(self.get_space_id(space_key), space_key))
+        return pages
 
-    def get_page_ids(self, space_id: str) -> dict:
-        """Получение списка страниц с базовыми метаданными"""
+    def get_page_ids(self, space_id: str, space_key: str = None) -> dict:
+        """Получение списка страниц пространства с базовыми метаданными"""
         page_info = {}  # {page_id: {'title': ..., 'version': ..., 'url': ...}}
         start = 0
         limit = 100
@@ -41,14 +58,14 @@ class ConfluenceAPI:
         while True:
             url = f"{self.api_url}/rest/api/content"
             params = {
-                'spaceKey': self.space_name,
+                'spaceKey': space_key or self.space_name,
                 'type': 'page',
                 'start': start,
                 'limit': limit,
                 'expand': 'version,space'
             }
 
-            data = make_request(url, self.auth_token, params=params)
+            data = self._request(url, params=params)
             results = data.get('results', [])
 
             for page in results:
@@ -99,7 +116,7 @@ class ConfluenceAPI:
         url = f"{self.api_url}/rest/api/content/{page_id}"
         params = {'expand': 'body.view,version,space,labels'}
 
-        data = make_request(url, self.auth_token, params=params)
+        data = self._request(url, params=params)
 
         return {
             'content': data.get('body', {}).get('view', {}).get('value', ''),
@@ -114,7 +131,7 @@ class ConfluenceAPI:
         """Получение даты последнего обновления"""
         url = f"{self.api_url}/rest/api/content/{page_id}"
         params = {'expand': 'version'}
-        data = make_request(url, self.auth_token, params=params)
+        data = self._request(url, params=params)
         return data['version'].get('when') or data['version'].get('createdAt')
 
     def get_page_url(self, page_id: str) -> str:
@@ -1,37 +1,254 @@
 # hybrid_search/database.py
-import chromadb
-from chromadb.config import Settings
+from hybrid_search.alias import active_collection, alias_version
+from hybrid_search.filters import filterable_fields, UPDATED_TS_KEY
+from hybrid_search.manifest import IndexManifest
+from hybrid_search.quantized import Int8VectorIndex
+from hybrid_search.pagestore import PageStore, SCHEMA_LEGACY, SCHEMA_SLIM, page_id_of, split_metadata
 from hybrid_search.utils import singleton, logger, Config
 import os
 import json
-from typing import Optional, Dict, Any, List
+import threading
+import numpy as np
+from typing import Optional, Dict, Any, List, Tuple
+
+# Модель векторов записывается в метаданные коллекции при создании
+EMBEDDING_MODEL_KEY = "embedding_model"
+# Модель коллекций, созданных до DENSE_MODEL (в метаданных модель не записана)
+LEGACY_DENSE_MODEL = "sentence-transformers/all-mpnet-base-v2"
+# Ключи, которые есть только в метаданных legacy-чанков, и сколько чанков смотреть при определении схемы
+LEGACY_KEYS = ('content', 'sparse_indices')
+SCHEMA_SAMPLE_SIZE = 20
+# Чанк без строки в таблице sparse (нет терминов после анализатора)
+EMPTY_SPARSE = np.array([], dtype=np.int32)
+
+
+class ChunkVectors:
+    """
+    ✅ Сохранённые векторы чанков одной матрицей (n, dim): строка i — чанк ids[i].
+
+    Матрица — массив, который вернул ChromaDB (float64, C-порядок), без копирования и приведения типа:
+    сходство с запросом или между чанками — одно матричное умножение, без вызова модели.
+    """
+
+    def __init__(self, ids: List[str], matrix: np.ndarray):
+        self.ids = list(ids)
+        self.matrix = matrix
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+
+    @classmethod
+    def empty(cls) -> 'ChunkVectors':
+        return cls([], np.zeros((0, 0)))
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._rows
+
+    def take(self, ids: List[str]) -> np.ndarray:
+        """Строки в порядке ids: тот же порядок — сама матрица (без копии); нет вектора — нулевая строка"""
+        if list(ids) == self.ids:
+            return self.matrix
+        rows = np.fromiter((self._rows.get(chunk_id, -1) for chunk_id in ids), dtype=np.int64, count=len(ids))
+        found = rows >= 0
+        if found.all():
+            return self.matrix[rows]
+        vectors = np.zeros((len(ids), self.dim), dtype=self.matrix.dtype if self.dim else np.float32)
+        vectors[found] = self.matrix[rows[found]]
+        return vectors
+
+    @classmethod
+    def concat(cls, blocks: List[Optional['ChunkVectors']]) -> 'ChunkVectors':
+        """Блоки одного пространства → один (повторный ID берётся из первого блока)"""
+        blocks = [block for block in blocks if block is not None and len(block)]
+        if len(blocks) == 1:
+            return blocks[0]
+        ids, parts = [], []
+        seen = set()
+        for block in blocks:
+            keep = [row for row, chunk_id in enumerate(block.ids) if chunk_id not in seen]
+            seen.update(block.ids)
+            ids.extend(block.ids[row] for row in keep)
+            parts.append(block.matrix if len(keep) == len(block) else block.matrix[keep])
+        return cls(ids, np.concatenate(parts)) if parts else cls.empty()
+
+
+def parent_spans(total_chunks: int, window: int) -> List[tuple]:
+    """Родительский фрагмент каждого чанка страницы: (первый, последний номер) — ±window в пределах страницы"""
+    return [(max(0, num - window), min(total_chunks - 1, num + window)) for num in range(total_chunks)]
+
+
+def embedding_model_of(collection) -> str:
+    """Dense-модель, векторами которой построена коллекция"""
+    return (collection.metadata or {}).get(EMBEDDING_MODEL_KEY) or LEGACY_DENSE_MODEL
 
 
 @singleton
 class Database:
     def __init__(self):
         self.persist_dir = Config.CHROMA_DB_PATH
-        self.index_name = Config.CHROMA_COLLECTION
         os.makedirs(self.persist_dir, exist_ok=True)
+        self.search_ef = Config.HNSW_SEARCH_EF
+        self.vectors = None
+        self._vectors_collection = None  # коллекция, из которой построен int8-слой
+        self._switch_lock = threading.RLock()
+
+        self._open()
+        self.startup()
+
+    def _open(self, name: str = None):
+        """Открывает клиент ChromaDB и коллекцию (по умолчанию — активную по указателю)"""
+        # Импорт chromadb (~секунды) — при открытии базы, чтобы его можно было вести параллельно
+        import chromadb
+        from chromadb.config import Settings
 
         self.client = chromadb.PersistentClient(
             path=self.persist_dir,
             settings=Settings(anonymized_telemetry=False, allow_reset=True)
         )
 
+        self._alias_version = alias_version()
+        self._bind(name or active_collection())
+
+    def _bind(self, name: str):
+        """Коллекция + её файлы состояния (PageStore, манифест)"""
+        # M, construction_ef и модель векторов задаются только при создании коллекции (изменение — переиндексация)
         self.collection = self.client.get_or_create_collection(
-            name=self.index_name,
+            name=name,
             metadata={
                 "hnsw:space": "cosine",
-                "hnsw:search_ef": 100,
-                "hnsw:construction_ef": 100
+                "hnsw:M": Config.HNSW_M,
+                "hnsw:search_ef": self.search_ef,
+                "hnsw:construction_ef": Config.HNSW_CONSTRUCTION_EF,
+                EMBEDDING_MODEL_KEY: Config.DENSE_MODEL
             }
         )
-        self.startup()
+        self.index_name = name
+        self._embedding_model = embedding_model_of(self.collection)
+        IndexManifest().bind(name)
+        self._init_schema()
+        self._init_vector_tier()
+        self._check_hnsw_config()
+        if self._embedding_model != Config.DENSE_MODEL:
+            logger.warning(
+                f"⚠️  Коллекция {name} построена моделью {self._embedding_model}, DENSE_MODEL={Config.DENSE_MODEL}: "
+                f"поиск идёт прежней моделью до перекодирования (python -m hybrid_search.reindex --reembed)")
+
+    def embedding_model(self) -> str:
+        """✅ Модель векторов активной коллекции: ею кодируются запросы и новые чанки"""
+        self._follow_alias()
+        return self._embedding_model
+
+    def set_embedding_model(self, model: str):
+        """Записывает модель в метаданные коллекции (восстановление снимка другой модели)"""
+        metadata = {k: v for k, v in (self.collection.metadata or {}).items() if not k.startswith('hnsw:')}
+        self.collection.modify(metadata={**metadata, EMBEDDING_MODEL_KEY: model})
+        self._embedding_model = model
+
+    def switch_collection(self, name: str):
+        """
+        ✅ Переключает чтение и запись на другую коллекцию (blue/green) без переоткрытия клиента:
+        запросы, уже начатые на прежней коллекции, дочитывают её.
+        """
+        with self._switch_lock:
+            if name == self.index_name:
+                return
+            previous = self.index_name
+            self._bind(name)
+            self._alias_version = alias_version()  # явное переключение не отменяется следованием указателю
+            logger.info(f"🔀 ChromaDB: {previous} → {name} ({self.collection.count()} документов)")
+
+    def current_collection(self) -> str:
+        """Коллекция, с которой сейчас работает процесс (с учётом переключения указателя)"""
+        self._follow_alias()
+        return self.index_name
+
+    def _follow_alias(self):
+        """Указатель переключён (reindex в другом процессе) — переходим на новую коллекцию"""
+        version = alias_version()
+        if version == self._alias_version:
+            return
+        with self._switch_lock:
+            if version != self._alias_version:
+                self._alias_version = version
+                self.switch_collection(active_collection())
+
+    def _hnsw_config(self) -> Dict[str, Any]:
+        return (getattr(self.collection, 'configuration', None) or {}).get('hnsw') or {}
+
+    def _check_hnsw_config(self):
+        """Приводит ef_search существующей коллекции к заданному (HNSW_SEARCH_EF), предупреждает о расхождении M"""
+        hnsw = self._hnsw_config()
+        if hnsw.get('max_neighbors') not in (None, Config.HNSW_M):
+            logger.warning(
+                f"⚠️  HNSW M={hnsw['max_neighbors']} задан при создании коллекции (HNSW_M={Config.HNSW_M} "
+                f"применится после переиндексации, FORCE_RELOAD=true)")
+        if hnsw.get('ef_search') not in (None, self.search_ef):
+            self.set_search_ef(self.search_ef)
+
+    def set_search_ef(self, ef: int):
+        """
+        ✅ Меняет ef поиска HNSW (полнота ↔ скорость).
+
+        ChromaDB не принимает ef в запросе и применяет новое значение только к заново
+        открытой коллекции, поэтому после modify клиент переоткрывается.
+        """
+        self.search_ef = int(ef)
+        self.collection.modify(configuration={"hnsw": {"ef_search": self.search_ef}})
+        logger.info(f"🔧 HNSW ef_search={ef}")
+        self.reload(self.index_name)
+
+    def _init_vector_tier(self):
+        """
+        VECTOR_TIER=int8: первый проход по сжатым векторам в памяти вместо HNSW (строится при первом поиске).
+        reload() той же коллекции не сбрасывает готовый слой: он пересобирается в фоне, поиск идёт по прежнему.
+        """
+        previous = self.vectors
+        if Config.VECTOR_TIER != 'int8':
+            self.vectors = None
+        elif previous is not None and previous.ready and self._vectors_collection == self.index_name:
+            previous.refresh(self.collection)
+        else:
+            self.vectors = Int8VectorIndex()
+        self._vectors_collection = self.index_name
+
+    def _init_schema(self):
+        """
+        ✅ Схема хранения: legacy — текст, sparse-векторы и все метаданные в метаданных Chroma;
+        slim — в Chroma только текст (documents) и поля чанка, остальное в PageStore.
+
+        Новый индекс создаётся по STORAGE_SCHEMA, существующий определяется по содержимому
+        (перевод legacy → slim: python -m hybrid_search.migrate).
+        """
+        self.page_store = PageStore()
+        self.page_store.bind(self.index_name)
+        schema = self.page_store.get_schema()
+        if schema is None:
+            sample = self.collection.get(limit=SCHEMA_SAMPLE_SIZE, include=['metadatas'])
+            if not sample['ids']:
+                schema = Config.STORAGE_SCHEMA
+            else:
+                # Пустой sparse-вектор не попадает в метаданные (_serialize_metadata пропускает пустые списки),
+                # а текст legacy-чанка есть всегда — смотрим оба ключа и не по одному чанку
+                legacy = any(key in (metadata or {}) for metadata in sample['metadatas'] for key in LEGACY_KEYS)
+                schema = SCHEMA_LEGACY if legacy else SCHEMA_SLIM
+            self.page_store.set_schema(schema)
+        self.schema = schema
+
+    def reload(self, name: str = None):
+        """✅ Переоткрывает базу, чтобы увидеть записи другого процесса (ingestion-воркера)"""
+        from chromadb.api.client import SharedSystemClient
+        SharedSystemClient.clear_system_cache()
+        self._open(name)
+        logger.info(f"🔄 ChromaDB переоткрыта ({self.collection.count()} документов)")
 
     def startup(self):
         count = self.collection.count()
-        logger.info(f"✅ ChromaDB: {self.persist_dir}/{self.index_name} ({count} документов)")
+        logger.info(f"✅ ChromaDB: {self.persist_dir}/{self.index_name} ({count} документов, схема {self.schema})")
 
     def count(self) -> int:
         return self.collection.count()
@@ -43,6 +260,14 @@ class Database:
             if not items['ids']:
                 break
             self.collection.delete(ids=items['ids'])
+        self.page_store.clear()
+        if self.vectors is not None:
+            self.vectors.clear()
+        # Пустой индекс заполняется заново — в схеме и модели из конфигурации
+        self.schema = Config.STORAGE_SCHEMA
+        self.page_store.set_schema(self.schema)
+        if self._embedding_model != Config.DENSE_MODEL:
+            self.set_embedding_model(Config.DENSE_MODEL)
         logger.info("✅ База очищена")
 
     def _serialize_metadata(self, metadata: Dict[str, Any]) -> Dict[str, Any]:
@@ -81,17 +306,34 @@ class Database:
                 metadata[k] = v
         return metadata
 
+    def _join_page_metadata(self, ids: List[str], raw_metadatas: List[Dict]) -> List[Dict[str, Any]]:
+        """Метаданные чанков + метаданные их страниц (slim-схема; поля чанка приоритетнее)"""
+        metadatas = [self._deserialize_metadata(raw) for raw in raw_metadatas]
+        if self.schema != SCHEMA_SLIM:
+            return metadatas
+        pages = self.page_store.get_pages(page_id_of(chunk_id) for chunk_id in ids)
+        return [{**pages.get(page_id_of(chunk_id), {}), **metadata}
+                for chunk_id, metadata in zip(ids, metadatas)]
+
     def upsert_page(self, chunk_id: str, dense_vector: list, sparse_vector: dict,
                     text: str, metadata: Dict[str, Any]):
         """Добавление/обновление чанка с расширенными метаданными"""
+        self._follow_alias()
         try:
-            full_metadata = {
-                'content': text,
-                'sparse_indices': sparse_vector['indices'],
-                'sparse_values': sparse_vector['values'],
-                **metadata
-            }
-            clean_metadata = self._serialize_metadata(full_metadata)
+            if self.schema == SCHEMA_SLIM:
+                # ✅ Текст — только в documents, метаданные страницы и sparse-вектор — в PageStore
+                chunk_metadata, page_metadata = split_metadata({**metadata, **filterable_fields(metadata)})
+                self.page_store.put(page_id_of(chunk_id), page_metadata, chunk_id, sparse_vector)
+                clean_metadata = self._serialize_metadata(chunk_metadata)
+            else:
+                full_metadata = {
+                    'content': text,
+                    'sparse_indices': sparse_vector['indices'],
+                    'sparse_values': sparse_vector['values'],
+                    **metadata,
+                    **filterable_fields(metadata)  # ✅ Метки и дата — в виде, пригодном для where
+                }
+                clean_metadata = self._serialize_metadata(full_metadata)
 
             if isinstance(dense_vector[0], list):
                 dense_vector = dense_vector[0]
@@ -102,33 +344,77 @@ class Database:
                 metadatas=[clean_metadata],
                 documents=[text]
             )
+            if self.vectors is not None and self.vectors.ready:
+                self.vectors.upsert([chunk_id], dense_vector)
         except Exception as e:
             logger.error(f"❌ Ошибка upsert для {chunk_id}: {e}")
             raise
 
+    def needs_filter_backfill(self) -> bool:
+        """Индекс построен до появления полей фильтрации (tag_*, last_updated_ts)"""
+        sample = self.collection.get(limit=1, include=['metadatas'])
+        if not sample['ids']:
+            return False
+        metadata = sample['metadatas'][0] or {}
+        return bool(metadata.get('last_updated')) and UPDATED_TS_KEY not in metadata
+
+    def backfill_filter_fields(self, batch_size: int = 500) -> int:
+        """✅ Добавляет поля фильтрации в метаданные существующих чанков (без перевекторизации)"""
+        logger.info("🔧 Добавление полей фильтрации в существующий индекс...")
+        updated = 0
+        offset = 0
+        while True:
+            batch = self.collection.get(limit=batch_size, offset=offset, include=['metadatas'])
+            if not batch['ids']:
+                break
+            ids, metadatas = [], []
+            for chunk_id, raw in zip(batch['ids'], batch['metadatas']):
+                fields = filterable_fields(self._deserialize_metadata(raw))
+                if fields:
+                    ids.append(chunk_id)
+                    metadatas.append({**raw, **fields})
+            if ids:
+                self.collection.update(ids=ids, metadatas=metadatas)
+                updated += len(ids)
+            offset += len(batch['ids'])
+        logger.info(f"✅ Поля фильтрации добавлены: {updated} чанков")
+        return updated
+
     def search(self, dense_vector: list, sparse_vector: dict,
-               n_results: int = None, where: Dict = None) -> List[Dict]:
-        """Поиск с поддержкой фильтрации по метаданным"""
+               n_results: int = None, where: Dict = None, with_vectors: bool = False):
+        """
+        Поиск с поддержкой фильтрации по метаданным.
+
+        with_vectors=True — (чанки, ChunkVectors): сохранённые векторы кандидатов приходят тем же
+        запросом к ChromaDB (MMR, дедупликация и т.п. без повторного кодирования текста).
+        """
+        self._follow_alias()
         try:
             n_results = n_results or Config.RETRIEVAL_TOP_K
 
             if isinstance(dense_vector[0], list):
                 dense_vector = dense_vector[0]
 
-            dense_results = self.collection.query(
-                query_embeddings=[dense_vector],
-                n_results=n_results * 2,
-                where=where,
-                include=['metadatas', 'documents', 'distances']
-            )
+            include = ['metadatas', 'documents', 'distances'] + (['embeddings'] if with_vectors else [])
+            if self.vectors is not None and not where:
+                # С фильтром — HNSW: Chroma фильтрует до обхода графа, int8-слою пришлось бы
+                # перебирать все подходящие ID в Python на каждый запрос
+                dense_results = self._query_quantized(dense_vector, n_results * 2)
+            else:
+                dense_results = self.collection.query(
+                    query_embeddings=[dense_vector],
+                    n_results=n_results * 2,
+                    where=where,
+                    include=include
+                )
 
             chunks = []
             if dense_results.get('ids') and dense_results['ids'][0]:
-                for i, doc_id in enumerate(dense_results['ids'][0]):
-                    raw_metadata = dense_results['metadatas'][0][i] if dense_results.get('metadatas') else {}
-
-                    # ✅ Десериализация метаданных
-                    metadata = self._deserialize_metadata(raw_metadata)
+                ids = dense_results['ids'][0]
+                # ✅ Десериализация метаданных (+ метаданные страниц одним запросом в slim-схеме)
+                metadatas = self._join_page_metadata(ids, dense_results['metadatas'][0])
+                for i, doc_id in enumerate(ids):
+                    metadata = metadatas[i]
 
                     chunk = {
                         'id': doc_id,
@@ -139,61 +425,151 @@ class Database:
                     chunks.append(chunk)
 
             # Boosting по sparse-совпадениям
-            if sparse_vector.get('indices') and sparse_vector['indices'][0] != 0:
+            # Заглушка без BM25 — indices [0] с value 1e-9; настоящий индекс 0 — документ корпуса
+            if sparse_vector.get('indices') and sparse_vector['values'][0] > 1e-9:
                 query_indices = set(sparse_vector['indices'])
+                stored_sparse = (self.page_store.get_sparse_indices([c['id'] for c in chunks])
+                                 if self.schema == SCHEMA_SLIM else {})
                 for chunk in chunks:
-                    doc_sparse = set(chunk['metadata'].get('sparse_indices', []))
+                    if self.schema == SCHEMA_SLIM:
+                        doc_sparse = set(stored_sparse.get(chunk['id'], EMPTY_SPARSE).tolist())
+                    else:
+                        doc_sparse = set(chunk['metadata'].get('sparse_indices', []))
                     overlap = len(query_indices & doc_sparse)
                     if overlap > 0:
                         chunk['score'] += 0.1 * overlap
 
+            if with_vectors:
+                embeddings = dense_results.get('embeddings')
+                matrix = np.asarray(embeddings[0]) if embeddings is not None and chunks else np.zeros((0, 0))
+                return chunks, ChunkVectors([chunk['id'] for chunk in chunks], matrix)
             return chunks
         except Exception as e:
             logger.error(f"❌ Ошибка поиска: {e}")
-            return []
+            return ([], ChunkVectors.empty()) if with_vectors else []
+
+    def _query_quantized(self, dense_vector: list, n_results: int) -> Dict:
+        """
+        ✅ Первый проход по int8-кодам (n * QUANTIZED_OVERSAMPLE кандидатов), затем точный
+        косинус по float32 из ChromaDB. Результат — в формате collection.query.
+        """
+        self.vectors.ensure_built(self.collection)
+        candidate_ids = self.vectors.search(dense_vector, n_results * Config.QUANTIZED_OVERSAMPLE)
+        if not candidate_ids:
+            return {'ids': [[]], 'metadatas': [[]], 'documents': [[]], 'distances': [[]]}
 
-    def get_neighbors(self, chunk_id: str, window: int = 1) -> List[Dict]:
-        """✅ ПОЛУЧЕНИЕ СОСЕДНИХ ЧАНКОВ (решает проблему фрагментации)"""
-        neighbors = []
+        found = self.collection.get(ids=candidate_ids, include=['embeddings', 'metadatas', 'documents'])
+        query = np.asarray(dense_vector, dtype=np.float32)
+        embeddings = np.asarray(found['embeddings'], dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1) * (np.linalg.norm(query) or 1.0)
+        similarity = (embeddings @ query) / np.where(norms > 0, norms, 1.0)
+        order = np.argsort(-similarity)[:n_results]
+        return {
+            'ids': [[found['ids'][i] for i in order]],
+            'metadatas': [[found['metadatas'][i] for i in order]],
+            'documents': [[found['documents'][i] for i in order]],
+            'distances': [[float(1.0 - similarity[i]) for i in order]],
+            'embeddings': [embeddings[order]],
+        }
+
+    def get_neighbors(self, chunk_id: str, window: int = 1, with_vectors: bool = False):
+        """
+        ✅ ПОЛУЧЕНИЕ СОСЕДНИХ ЧАНКОВ (решает проблему фрагментации) — одним запросом к ChromaDB.
+        with_vectors=True — (соседи, ChunkVectors).
+        """
         parts = chunk_id.rsplit('-', 1)
         if len(parts) != 2:
-            return neighbors
+            return ([], ChunkVectors.empty()) if with_vectors else []
 
         page_id, chunk_num = parts[0], int(parts[1])
+        offsets = [offset for offset in range(-window, window + 1) if offset != 0 and chunk_num + offset >= 0]
+        found, vectors = self._get_chunks([f"{page_id}-{chunk_num + offset}" for offset in offsets], with_vectors)
+        neighbors = [
+            {**found[f"{page_id}-{chunk_num + offset}"], 'is_neighbor': True, 'offset': offset}
+            for offset in offsets if f"{page_id}-{chunk_num + offset}" in found
+        ]
+        return (neighbors, vectors) if with_vectors else neighbors
 
-        for offset in range(-window, window + 1):
-            if offset == 0:
-                continue
+    def put_parent_spans(self, page_id: str, total_chunks: int):
+        """Записывает родительские фрагменты чанков страницы (PARENT_WINDOW; 0 — не записываются)"""
+        if Config.PARENT_WINDOW <= 0:
+            return
+        spans = parent_spans(total_chunks, Config.PARENT_WINDOW)
+        self.page_store.put_parents(page_id, {f"{page_id}-{num}": span for num, span in enumerate(spans)})
 
-            neighbor_id = f"{page_id}-{chunk_num + offset}"
-            try:
-                result = self.collection.get(
-                    ids=[neighbor_id],
-                    include=['metadatas', 'documents']
-                )
-                if result['ids'] and result['ids'][0]:
-                    raw_metadata = result['metadatas'][0][0] if result.get('metadatas') else {}
-                    metadata = self._deserialize_metadata(raw_metadata)
+    def get_parent_chunks(self, chunks: List[Dict], with_vectors: bool = False):
+        """
+        ✅ Соседи чанков в пределах их родительских фрагментов: chunk_id → соседи (is_neighbor, offset).
 
-                    neighbors.append({
-                        'id': neighbor_id,
-                        'text': result['documents'][0][0] if result.get('documents') else '',
-                        'metadata': metadata,
-                        'is_neighbor': True,
-                        'offset': offset
-                    })
-            except Exception as e:
-                logger.debug(f"⚠️  Сосед {neighbor_id} не найден: {e}")
+        Фрагменты — одним запросом к PageStore, тексты всех соседей — одним запросом к ChromaDB,
+        сколько бы чанков ни расширялось. Для чанков без записи (индекс построен с PARENT_WINDOW=0)
+        фрагмент считается по chunk_index / total_chunks из метаданных.
+        with_vectors=True — (соседи по чанкам, ChunkVectors всех соседей).
+        """
+        stored = self.page_store.get_parents([chunk['id'] for chunk in chunks])
+        plan = {}
+        for chunk in chunks:
+            page_id, _, num = chunk['id'].rpartition('-')
+            if not num.isdigit():
                 continue
+            num = int(num)
+            first, last = stored.get(chunk['id']) or self._fallback_span(chunk, num)
+            plan[chunk['id']] = [(f"{page_id}-{other}", other - num)
+                                 for other in range(first, last + 1) if other != num]
+
+        neighbor_ids = list(dict.fromkeys(neighbor_id for ids in plan.values() for neighbor_id, _ in ids))
+        found, vectors = self._get_chunks(neighbor_ids, with_vectors)
+        parents = {
+            chunk_id: [{**found[neighbor_id], 'is_neighbor': True, 'offset': offset}
+                       for neighbor_id, offset in ids if neighbor_id in found]
+            for chunk_id, ids in plan.items()
+        }
+        return (parents, vectors) if with_vectors else parents
 
-        return neighbors
+    @staticmethod
+    def _fallback_span(chunk: Dict, num: int) -> tuple:
+        total = (chunk.get('metadata') or {}).get('total_chunks')
+        last = int(total) - 1 if total else num + Config.PARENT_WINDOW
+        return max(0, num - Config.PARENT_WINDOW), min(last, num + Config.PARENT_WINDOW)
+
+    def _get_chunks(self, chunk_ids: List[str],
+                    with_vectors: bool = False) -> Tuple[Dict[str, Dict], Optional[ChunkVectors]]:
+        """Чанки по ID одним запросом: (id → {id, text, metadata}, векторы или None); отсутствующие пропускаются"""
+        if not chunk_ids:
+            return {}, (ChunkVectors.empty() if with_vectors else None)
+        include = ['metadatas', 'documents'] + (['embeddings'] if with_vectors else [])
+        try:
+            result = self.collection.get(ids=chunk_ids, include=include)
+        except Exception as e:
+            logger.debug(f"⚠️  Чанки {chunk_ids[:3]}… не получены: {e}")
+            return {}, (ChunkVectors.empty() if with_vectors else None)
+        metadatas = self._join_page_metadata(result['ids'], result['metadatas'])
+        found = {
+            chunk_id: {'id': chunk_id, 'text': text or '', 'metadata': metadata}
+            for chunk_id, text, metadata in zip(result['ids'], result['documents'], metadatas)
+        }
+        return found, (self._vectors_of(result) if with_vectors else None)
+
+    @staticmethod
+    def _vectors_of(result: Dict) -> ChunkVectors:
+        embeddings = result.get('embeddings')
+        if embeddings is None or not result['ids']:
+            return ChunkVectors.empty()
+        return ChunkVectors(result['ids'], np.asarray(embeddings))
+
+    def get_embeddings(self, ids: List[str]) -> np.ndarray:
+        """✅ Сохранённые векторы чанков одним запросом: (len(ids), dim), строки в порядке ids (нет — нулевая)"""
+        if not ids:
+            return np.zeros((0, 0))
+        return self._vectors_of(self.collection.get(ids=ids, include=['embeddings'])).take(ids)
 
     def get_text(self, id: str) -> str:
         """Получение текста по ID"""
         try:
-            result = self.collection.get(ids=[id], include=['metadatas'])
-            if result['metadatas'] and result['metadatas'][0]:
-                return result['metadatas'][0].get('content', '')
+            # Текст чанка хранится в documents в обеих схемах (content — дубль legacy-схемы)
+            result = self.collection.get(ids=[id], include=['documents'])
+            if result['documents'] and result['documents'][0]:
+                return result['documents'][0]
         except Exception as e:
             logger.error(f"❌ Ошибка получения текста {id}: {e}")
         return ""
@@ -203,7 +579,7 @@ class Database:
         try:
             result = self.collection.get(ids=[id], include=['metadatas'])
             if result['metadatas'] and result['metadatas'][0]:
-                return self._deserialize_metadata(result['metadatas'][0])
+                return self._join_page_metadata([id], result['metadatas'])[0]
         except Exception as e:
             logger.error(f"❌ Ошибка получения метаданных {id}: {e}")
         return None
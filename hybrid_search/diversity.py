@@ -0,0 +1,72 @@
+# hybrid_search/diversity.py
+"""
+Отбор контекста для LLM по Maximal Marginal Relevance (MMR_ENABLED).
+
+После расширения соседями в кандидатах много почти одинаковых фрагментов: перекрытие чанков
+(CHUNK_OVERLAP), соседи лучшего чанка, одинаковые абзацы на разных страницах. MMR выбирает
+кандидатов по очереди: λ · релевантность − (1 − λ) · максимальное сходство с уже выбранными.
+Сходство — косинус сохранённых векторов чанков (без повторного кодирования), одной матрицей
+на все пары; кандидат, почти дословно повторяющий выбранный (MMR_DUPLICATE_THRESHOLD),
+отбрасывается, а набор заполняется жадно в пределах бюджета токенов.
+
+    python -m benchmarks.mmr     # размер промпта, recall/MRR и избыточность: MMR против top-K
+"""
+from typing import Dict, List
+
+import numpy as np
+
+from hybrid_search.utils import Config
+
+
+def token_cost(chunk: Dict) -> int:
+    """Оценка токенов текста чанка (как в RAG.create_prompt: символы / 4)"""
+    return max(1, len(chunk.get('text') or '') // 4)
+
+
+def mmr_select(vectors: np.ndarray, relevance: np.ndarray, costs: np.ndarray, budget: int, limit: int,
+               lambda_: float, duplicate_threshold: float) -> List[int]:
+    """
+    ✅ Индексы выбранных кандидатов в порядке выбора.
+
+    vectors — (n, dim), relevance (0–1, шкала rerank) и costs — (n,). Кандидат, не влезающий
+    в остаток бюджета, пропускается: следующие, покороче, ещё могут поместиться.
+    """
+    n = len(relevance)
+    if n == 0:
+        return []
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.where(norms > 0, norms, 1.0)
+    similarity = unit @ unit.T  # десятки кандидатов: матрица целиком дешевле пошагового пересчёта
+
+    redundancy = np.zeros(n)  # максимум сходства с уже выбранными
+    available = np.ones(n, dtype=bool)
+    remaining = budget
+    selected = []
+    while len(selected) < limit:
+        available &= costs <= remaining
+        if not available.any():
+            break
+        scores = np.where(available, lambda_ * relevance - (1 - lambda_) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        remaining -= int(costs[best])
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+        available &= redundancy < duplicate_threshold
+    return selected
+
+
+def select_context(chunks: List[Dict], vectors: np.ndarray, limit: int = None, budget: int = None) -> List[Dict]:
+    """Кандидаты (с rerank_score / score) → разнообразный набор в пределах MMR_TOKEN_BUDGET"""
+    if not chunks:
+        return []
+    relevance = np.array([c.get('rerank_score', c.get('score', 0)) for c in chunks], dtype=np.float32)
+    costs = np.array([token_cost(c) for c in chunks], dtype=np.int64)
+    order = mmr_select(
+        vectors, relevance, costs,
+        budget=budget or Config.MMR_TOKEN_BUDGET or Config.MAX_CONTEXT_TOKENS,
+        limit=limit or Config.RERANK_TOP_K,
+        lambda_=Config.MMR_LAMBDA,
+        duplicate_threshold=Config.MMR_DUPLICATE_THRESHOLD,
+    )
+    return [chunks[i] for i in order]
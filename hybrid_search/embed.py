@@ -1,40 +1,131 @@
 # hybrid_search/embed.py
-from sentence_transformers import SentenceTransformer, CrossEncoder
 from rank_bm25 import BM25Okapi
+from hybrid_search.analyzer import Analyzer
+from hybrid_search import bm25 as bm25_store
+from hybrid_search.bm25 import StreamingBM25
+from hybrid_search.rerank import AdaptiveReranker
 from hybrid_search.utils import singleton, logger, Config
+import argparse
 import re
 import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from scipy.special import expit
 
+# Загруженных dense-моделей одновременно: модель активной коллекции + новая на время перехода
+MAX_DENSE_MODELS = 2
+
+
+def configure_model_cache():
+    """
+    Каталог весов и офлайн-режим Hugging Face (MODEL_CACHE_DIR, MODEL_OFFLINE).
+    Переменные читаются при импорте huggingface_hub — вызывать до импорта sentence_transformers
+    (main.py и StartupManager._load_embed вызывают её первой).
+    """
+    if Config.MODEL_CACHE_DIR:
+        os.makedirs(Config.MODEL_CACHE_DIR, exist_ok=True)
+        os.environ.setdefault('HF_HOME', Config.MODEL_CACHE_DIR)
+        os.environ.setdefault('SENTENCE_TRANSFORMERS_HOME', Config.MODEL_CACHE_DIR)
+    if Config.MODEL_OFFLINE:
+        os.environ['HF_HUB_OFFLINE'] = '1'
+        os.environ['TRANSFORMERS_OFFLINE'] = '1'
+
+
+def dense_prefixes(model_name: str) -> tuple[str, str]:
+    """Префиксы (запрос, фрагмент), с которыми обучена модель: E5 — "query: " / "passage: " """
+    if re.search(r'(^|[/_-])e5([_-]|$)', model_name.lower()):
+        return "query: ", "passage: "
+    return "", ""
+
 
 @singleton
 class Embed:
     def __init__(self):
+        configure_model_cache()
+        # Тяжёлый импорт (torch) — только при реальной загрузке моделей
+        from sentence_transformers import SentenceTransformer, CrossEncoder
+
         # ✅ ОПРЕДЕЛЯЕМ устройство автоматически
         self.device = self._get_device()
         logger.info(f"🔧 Используемое устройство: {self.device}")
+        self._dense_cls = SentenceTransformer
+        self._dense_models: OrderedDict = OrderedDict()
+        self._dense_lock = threading.Lock()
+        self.dense_model_name = Config.DENSE_MODEL
 
-        # Dense embedding модель
-        logger.info("🔧 Загрузка embedding модели...")
-        self.dense_model = SentenceTransformer(
-            "sentence-transformers/all-mpnet-base-v2",
-            device=self.device
-        )
-
-        # Reranker (cross-encoder) для точного ранжирования
-        logger.info(f"🔧 Загрузка reranker модели: {Config.RERANKER_MODEL}")
-        self.reranker = CrossEncoder(
-            Config.RERANKER_MODEL,
-            device=self.device
-        )
+        if Config.FAST_START:
+            # ⚡ Параллельная загрузка: веса читаются с диска / инициализируются одновременно
+            with ThreadPoolExecutor(max_workers=2, thread_name_prefix="embed-load") as pool:
+                dense_future = pool.submit(self._load_dense_model, self.dense_model_name)
+                reranker_future = pool.submit(self._load_reranker, CrossEncoder)
+                dense_model = dense_future.result()
+                self.reranker = reranker_future.result()
+        else:
+            dense_model = self._load_dense_model(self.dense_model_name)
+            self.reranker = self._load_reranker(CrossEncoder)
+        self._dense_models[self.dense_model_name] = dense_model
+        self.adaptive_reranker = AdaptiveReranker(self._predict_rerank_scores)
 
         # Sparse: BM25
+        self.analyzer = Analyzer()
         self.bm25 = None
         self.corpus_tokens = []
         self._bm25_initialized = False
+        self.bm25_collection = None  # коллекция, чей корпус в self.bm25
+        self._bm25_mtime = None  # файл модели коллекции при последней загрузке
+        self._bm25_lock = threading.Lock()
         logger.info("✅ Embed + Reranker готовы")
 
+    def _load_dense_model(self, name: str):
+        """Dense embedding модель"""
+        started = time.perf_counter()
+        logger.info(f"🔧 Загрузка embedding модели: {name}")
+        model = self._dense_cls(
+            name,
+            device=self.device,
+            cache_folder=Config.MODEL_CACHE_DIR or None
+        )
+        logger.info(f"✅ Embedding модель загружена за {time.perf_counter() - started:.2f} сек "
+                    f"({model.get_sentence_embedding_dimension()}-dim)")
+        return model
+
+    def _dense(self, name: str = None):
+        """
+        Загруженная модель по имени (None — DENSE_MODEL). Вектор запроса должен быть в пространстве
+        коллекции, поэтому поиск и запись передают модель коллекции (Database.embedding_model()).
+        """
+        name = name or self.dense_model_name
+        model = self._dense_models.get(name)
+        if model is not None:
+            return model
+        with self._dense_lock:
+            model = self._dense_models.get(name)
+            if model is None:
+                model = self._load_dense_model(name)
+                self._dense_models[name] = model
+                while len(self._dense_models) > MAX_DENSE_MODELS:
+                    evicted, _ = self._dense_models.popitem(last=False)
+                    logger.info(f"♻️  Embedding модель {evicted} выгружена")
+            else:
+                self._dense_models.move_to_end(name)
+        return model
+
+    def _load_reranker(self, model_cls):
+        """Reranker (cross-encoder) для точного ранжирования"""
+        started = time.perf_counter()
+        logger.info(f"🔧 Загрузка reranker модели: {Config.RERANKER_MODEL}")
+        model = model_cls(
+            Config.RERANKER_MODEL,
+            device=self.device,
+            cache_folder=Config.MODEL_CACHE_DIR or None
+        )
+        logger.info(f"✅ Reranker загружен за {time.perf_counter() - started:.2f} сек")
+        return model
+
     def _get_device(self) -> str:
         """✅ Автоматическое определение доступного устройства"""
         force_cpu = os.getenv("FORCE_CPU", "false").lower() == "true"
@@ -61,13 +152,14 @@ class Embed:
             return "cpu"
 
     def _tokenize(self, text: str) -> list[str]:
-        """Токенизация для BM25"""
-        return re.findall(r'\b[a-zа-яё0-9]{2,}\b', text.lower())
+        """Термины для BM25: стоп-слова, стемминг и т.д. (ANALYZER_STEPS)"""
+        return self.analyzer.analyze(text)
 
-    def embed_text(self, text: str) -> list[float]:
-        """Возвращает dense-вектор (768-dim)"""
-        dense_embeddings = self.dense_model.encode(
-            text,
+    def embed_text(self, text: str, model: str = None) -> list[float]:
+        """Возвращает dense-вектор запроса (размерность — по модели)"""
+        name = model or self.dense_model_name
+        dense_embeddings = self._dense(name).encode(
+            dense_prefixes(name)[0] + text,
             convert_to_numpy=True,
             normalize_embeddings=True
         )
@@ -81,42 +173,33 @@ class Embed:
         tokens = self._tokenize(text)
         if self._bm25_initialized and self.bm25 and tokens:
             scores = self.bm25.get_scores(tokens)
-            indices = [i for i, s in enumerate(scores) if s > 1e-6]
-            values = [float(scores[i]) for i in indices]
+            nonzero = np.flatnonzero(scores > 1e-6)
+            indices = nonzero.tolist()
+            values = scores[nonzero].astype(float).tolist()
         else:
             indices, values = [0], [1e-9]
         return {"indices": indices, "values": values}
 
-    def rerank(self, query: str, chunks: list[dict]) -> list[dict]:
-        """Ранжирует чанки с помощью cross-encoder"""
+    def _predict_rerank_scores(self, pairs: list[list[str]]) -> np.ndarray:
+        """Оценки cross-encoder для пар (query, chunk_text), нормализованные SIGMOID в 0-1"""
+        return expit(self.reranker.predict(pairs))
+
+    def rerank(self, query: str, chunks: list[dict], adaptive: bool = None) -> list[dict]:
+        """
+        Ранжирует чанки с помощью cross-encoder: фильтр по RERANK_MIN_SCORE, топ RERANK_TOP_K.
+
+        RERANK_ADAPTIVE — пакетами с ранним выходом и кэшем оценок (hybrid_search/rerank.py),
+        иначе — все кандидаты одним вызовом.
+        """
         if not chunks:
             return []
 
-        # Формируем пары (query, chunk_text) для reranker
-        pairs = [[query, chunk.get('text', chunk.get('content', ''))] for chunk in chunks]
-
-        # Предсказываем scores
         try:
-            scores = self.reranker.predict(pairs)
-
-            # ПРИМЕНЯЕМ SIGMOID для нормализации в 0-1
-            scores = expit(scores)
-
+            return self.adaptive_reranker.rerank(query, chunks, adaptive=adaptive)
         except Exception as e:
             logger.error(f"❌ Ошибка rerank: {e}")
             return sorted(chunks, key=lambda x: x.get('score', 0), reverse=True)
 
-        # Добавляем rerank_score к чанкам
-        for chunk, score in zip(chunks, scores):
-            chunk['rerank_score'] = float(score)
-
-        # Фильтруем по порогу и сортируем
-        filtered = [c for c in chunks if c.get('rerank_score', 0) >= Config.RERANK_MIN_SCORE]
-        sorted_chunks = sorted(filtered, key=lambda x: x.get('rerank_score', 0), reverse=True)
-
-        # Возвращаем топ-K
-        return sorted_chunks[:Config.RERANK_TOP_K]
-
     def fit_bm25(self, documents: list[str]):
         """Инициализация BM25 на корпусе документов"""
         if not documents:
@@ -136,13 +219,84 @@ class Embed:
         else:
             logger.warning("⚠️  BM25 не инициализирован")
 
-    def embed_texts_batch(self, texts: list[str]) -> list[list[float]]:
-        """Пакетная генерация эмбеддингов (быстрее в 5-10 раз)"""
+    def fit_bm25_streaming(self, documents):
+        """✅ Инициализация BM25 потоковым проходом (документы — любой итератор, корпус не держится в памяти)"""
+        logger.info("🔧 Потоковая инициализация BM25...")
+        bm25 = StreamingBM25()
+        for doc in documents:
+            tokens = self._tokenize(doc) if doc and doc.strip() else []
+            if tokens:
+                bm25.add_document(tokens)
+
+        if bm25.corpus_size:
+            self.bm25 = bm25.finalize()
+            self.corpus_tokens = []
+            self._bm25_initialized = True
+            logger.info(
+                f"✅ BM25 инициализирован: {bm25.corpus_size} документов, "
+                f"{bm25.vocabulary_size} терминов, {bm25.postings_count} постингов")
+        else:
+            logger.warning("⚠️  BM25 не инициализирован")
+
+    def save_bm25(self, collection: str):
+        """Сохраняет обученную модель BM25 рядом с коллекцией: её загрузят процессы поиска после переключения"""
+        if not self._bm25_initialized:
+            return
+        path = bm25_store.save_model(self.bm25, collection, self.analyzer.describe())
+        self.bm25_collection = collection
+        self._bm25_mtime = bm25_store.model_mtime(collection)
+        logger.info(f"💾 BM25 коллекции {collection} сохранён ({os.path.getsize(path) / 1024 ** 2:.1f} МБ)")
+
+    def use_bm25(self, collection: str):
+        """
+        ✅ BM25 корпуса коллекции, по которой идёт поиск или запись.
+
+        Sparse-векторы чанков — номера документов корпуса, на котором обучен BM25, поэтому после
+        переключения коллекции (blue/green, сборка в другом процессе) загружается её сохранённая модель.
+        Без модели (sparse-буст выключен) файл читается снова, когда он изменится: его мог записать
+        другой процесс или восстановление из снимка. Модель другого конвейера анализатора не загружается.
+        """
+        if self._bm25_current(collection):
+            return
+        with self._bm25_lock:
+            if self._bm25_current(collection):
+                return
+            self._bm25_mtime = bm25_store.model_mtime(collection)
+            model = bm25_store.load_model(collection, self.analyzer.describe())
+            if model is None and self.bm25_collection is None:
+                # Модели на диске нет (индекс собран до сохранения BM25) — остаётся обученная в этом процессе
+                self.bm25_collection = collection
+                return
+            if model is None:
+                logger.warning(f"⚠️  Нет сохранённого BM25 коллекции {collection}: sparse-буст выключен "
+                               f"до полной загрузки")
+            else:
+                logger.info(f"✅ BM25 коллекции {collection} загружен")
+            self.bm25 = model
+            self.corpus_tokens = []
+            self._bm25_initialized = model is not None
+            self.bm25_collection = collection
+
+    def _bm25_current(self, collection: str) -> bool:
+        return collection == self.bm25_collection and (
+            self._bm25_initialized or bm25_store.model_mtime(collection) == self._bm25_mtime)
+
+    def embed_texts_batch(self, texts: list[str], model: str = None) -> list[list[float]]:
+        """Пакетная генерация эмбеддингов фрагментов документов (быстрее в 5-10 раз)"""
+        return self._encode_batch(texts, model, passage=True)
+
+    def embed_queries_batch(self, texts: list[str], model: str = None) -> list[list[float]]:
+        """Пакетная генерация эмбеддингов запросов (запрос + варианты расширения)"""
+        return self._encode_batch(texts, model, passage=False)
+
+    def _encode_batch(self, texts: list[str], model: str, passage: bool) -> list[list[float]]:
         if not texts:
             return []
 
-        dense_embeddings = self.dense_model.encode(
-            texts,
+        name = model or self.dense_model_name
+        prefix = dense_prefixes(name)[1 if passage else 0]
+        dense_embeddings = self._dense(name).encode(
+            [prefix + text for text in texts] if prefix else texts,
             convert_to_numpy=True,
             normalize_embeddings=True,
             batch_size=32,
@@ -160,3 +314,32 @@ class Embed:
         for text in texts:
             results.append(self.embed_sparse(text))
         return results
+
+
+def download_models(dense_models: list[str] = None) -> list[str]:
+    """Скачивает веса dense-моделей и reranker в MODEL_CACHE_DIR (подготовка к MODEL_OFFLINE=true)"""
+    configure_model_cache()
+    from sentence_transformers import SentenceTransformer, CrossEncoder
+
+    dense_models = dense_models or [Config.DENSE_MODEL]
+    for name in dense_models:
+        logger.info(f"⬇️  {name}")
+        SentenceTransformer(name, device="cpu", cache_folder=Config.MODEL_CACHE_DIR or None)
+    logger.info(f"⬇️  {Config.RERANKER_MODEL}")
+    CrossEncoder(Config.RERANKER_MODEL, device="cpu", cache_folder=Config.MODEL_CACHE_DIR or None)
+    logger.info(f"✅ Модели в кэше {Config.MODEL_CACHE_DIR or '~/.cache/huggingface'}")
+    return dense_models + [Config.RERANKER_MODEL]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Загрузка моделей в кэш (MODEL_CACHE_DIR)")
+    parser.add_argument('--dense', nargs='*', help="Dense-модели (по умолчанию DENSE_MODEL)")
+    args = parser.parse_args(argv)
+    if Config.MODEL_OFFLINE:
+        parser.error("MODEL_OFFLINE=true: загрузка из сети отключена")
+    download_models(args.dense)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+# hybrid_search/expansion.py
+"""
+Расширение запроса (QUERY_EXPANSION): перефразировки (multi), гипотетический ответ (hyde) или оба.
+
+Варианты генерирует локальная LLM (Ollama); если она не успевает в бюджет QUERY_EXPANSION_BUDGET_MS
+или недоступна — правила (ключевые слова, повествовательная форма вопроса). Если бюджета не хватает
+и на дополнительные поиски, расширение для запроса отключается — обычный поиск по одному вектору.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, List, Optional, Tuple
+
+from hybrid_search.metrics import Tracer
+from hybrid_search.utils import singleton, logger, Config
+
+MODES = ('off', 'multi', 'hyde', 'both')
+# Константа RRF: вклад кандидата из списка — 1 / (RRF_K + ранг)
+RRF_K = 60
+LLM_CACHE_SIZE = 1000
+# Сглаживание оценки стоимости дополнительного поиска
+COST_EWMA_ALPHA = 0.2
+# Запас бюджета при ожидании LLM (сек): опоздание потока на доли мс не отменяет готовые варианты
+LLM_WAIT_RESERVE = 0.005
+
+STOP_WORDS = {
+    'как', 'что', 'где', 'когда', 'почему', 'зачем', 'какой', 'какая', 'какое', 'какие', 'каких', 'сколько',
+    'кто', 'чем', 'ли', 'можно', 'нужно', 'надо', 'есть', 'это', 'для', 'при', 'на', 'по', 'из', 'от', 'до',
+    'не', 'же', 'бы', 'мне', 'меня', 'мы', 'нам', 'вы', 'вам', 'ты', 'тебе', 'он', 'она', 'они', 'его', 'её',
+    'их', 'там', 'тут', 'вообще', 'просто', 'пожалуйста', 'подскажите', 'скажите', 'расскажи', 'подскажи',
+}
+
+# Вопрос → повествовательная форма, как фраза могла бы звучать в документации
+QUESTION_TEMPLATES = (
+    (re.compile(r'^\s*как\s+(.+)$', re.I), "Инструкция: как {0}. Порядок действий"),
+    (re.compile(r'^\s*что\s+такое\s+(.+)$', re.I), "{0} — это"),
+    (re.compile(r'^\s*где\s+(.+)$', re.I), "{0} находится, расположение и ссылка"),
+    (re.compile(r'^\s*почему\s+(.+)$', re.I), "Причина: {0}. Решение проблемы"),
+    (re.compile(r'^\s*сколько\s+(.+)$', re.I), "{0}: значение, лимит, срок"),
+    (re.compile(r'^\s*(когда|в какие дни)\s+(.+)$', re.I), "{1}: сроки и расписание"),
+    (re.compile(r'^\s*(кто|к кому)\s+(.+)$', re.I), "{1}: ответственный, контакты"),
+)
+
+
+def keywords(query: str) -> List[str]:
+    return [w for w in re.findall(r'[a-zа-яё0-9][a-zа-яё0-9\-_.]*', query.lower()) if w not in STOP_WORDS]
+
+
+def rule_variants(query: str, mode: str) -> List[str]:
+    """Варианты запроса без LLM: ключевые слова (multi) и повествовательная форма (hyde)"""
+    variants = []
+    terms = keywords(query)
+    text = query.strip().rstrip('?!. ')
+    if mode in ('multi', 'both') and terms and ' '.join(terms) != text.lower():
+        variants.append(' '.join(terms))
+    if mode in ('hyde', 'both'):
+        for pattern, template in QUESTION_TEMPLATES:
+            match = pattern.match(text)
+            if match:
+                variants.append(template.format(*match.groups()))
+                break
+        else:
+            if terms:
+                variants.append(f"В документации описано: {' '.join(terms)}")
+    return variants
+
+
+def _llm_prompt(query: str, mode: str, count: int) -> str:
+    parts = [f"Вопрос сотрудника к внутренней документации компании: «{query}»\n"]
+    if mode in ('multi', 'both'):
+        parts.append(f"Перефразируй вопрос {count} разными способами: синонимы, полные названия вместо "
+                     f"сокращений, другой порядок слов. Каждая перефразировка — отдельной строкой.")
+    if mode in ('hyde', 'both'):
+        parts.append("Затем одной строкой, начиная с «Ответ:», напиши 2–3 предложения, как мог бы выглядеть "
+                     "фрагмент документации с ответом. Правдоподобно, без оговорок.")
+    parts.append("Без нумерации, пояснений и пустых строк.")
+    return "\n".join(parts)
+
+
+def parse_llm_variants(text: str, query: str, mode: str, count: int) -> List[str]:
+    """Строки ответа LLM → варианты (без нумерации, повторов и самого запроса)"""
+    paraphrases, answers = [], []
+    seen = {query.strip().lower()}
+    for line in text.splitlines():
+        line = re.sub(r'^\s*(?:[-•*]|\d+[.)])\s*', '', line).strip().strip('«»"')
+        if not line or line.lower() in seen:
+            continue
+        seen.add(line.lower())
+        answer = re.match(r'^(?:ответ|answer)\s*:\s*(.+)$', line, re.I)
+        if answer:
+            answers.append(answer.group(1))
+        elif mode in ('multi', 'both'):
+            paraphrases.append(line)
+    variants = paraphrases[:count] if mode in ('multi', 'both') else []
+    if mode in ('hyde', 'both'):
+        variants += answers[:1]
+    return variants
+
+
+def fuse_candidates(result_lists: List[List[Dict]], limit: int) -> List[Dict]:
+    """
+    Reciprocal Rank Fusion списков кандидатов: отбор — по сумме 1/(RRF_K + ранг),
+    score кандидата — лучший из списков (шкала косинуса, как у одиночного поиска).
+    """
+    fused: Dict[str, Dict] = {}
+    for results in result_lists:
+        for rank, chunk in enumerate(results, 1):
+            entry = fused.get(chunk['id'])
+            if entry is None:
+                entry = fused[chunk['id']] = dict(chunk, fusion_score=0.0, fusion_hits=0)
+            entry['fusion_score'] += 1.0 / (RRF_K + rank)
+            entry['fusion_hits'] += 1
+            entry['score'] = max(entry['score'], chunk['score'])
+    ranked = sorted(fused.values(), key=lambda c: c['fusion_score'], reverse=True)
+    return ranked[:limit]
+
+
+@singleton
+class QueryExpander:
+    """✅ Варианты запроса для multi-query / HyDE с бюджетом латентности"""
+
+    def __init__(self):
+        self.tracer = Tracer()
+        # Один поток LLM: если прошлый вызов не уложился в бюджет и ещё идёт — сразу правила
+        self._llm_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="expand-llm")
+        self._llm_busy = threading.Event()
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._search_cost: Optional[float] = None
+        logger.info(f"✅ QueryExpander: mode={Config.QUERY_EXPANSION}, llm={Config.QUERY_EXPANSION_LLM}, "
+                    f"budget={Config.QUERY_EXPANSION_BUDGET_MS:.0f}ms")
+
+    @staticmethod
+    def mode() -> str:
+        mode = Config.QUERY_EXPANSION.lower()
+        return mode if mode in MODES else 'off'
+
+    def expand(self, query: str, mode: str = None) -> Tuple[List[str], str]:
+        """Варианты запроса и их источник: llm | cache | rules | budget (расширение отключено)"""
+        mode = mode or self.mode()
+        if mode == 'off':
+            return [], 'off'
+        started = time.perf_counter()
+        budget = Config.QUERY_EXPANSION_BUDGET_MS / 1000
+
+        variants, source = None, 'rules'
+        key = (mode, ' '.join(query.lower().split()))
+        if Config.QUERY_EXPANSION_LLM:
+            with self._lock:
+                variants = self._cache.get(key)
+                if variants is not None:
+                    self._cache.move_to_end(key)
+                    source = 'cache'
+            if variants is None and not self._llm_busy.is_set():
+                variants = self._llm_variants(query, mode, key, budget)
+                source = 'llm' if variants else 'rules'
+        if not variants:
+            variants = rule_variants(query, mode)
+
+        # Бюджет: параллельный поиск стоит ~ одного поиска. Правила — микросекунды, а ожидание LLM
+        # уже ограничено остатком бюджета на поиск, поэтому для них в расчёт идёт только поиск
+        elapsed = time.perf_counter() - started if source != 'rules' else 0.0
+        if variants and self._search_cost is not None and elapsed + self._search_cost > budget:
+            self.tracer.inc("expansion_skipped_budget")
+            return [], 'budget'
+        self.tracer.inc(f"expansion_{source}")
+        return variants, source
+
+    def _llm_variants(self, query: str, mode: str, key, budget: float) -> List[str]:
+        self._llm_busy.set()
+        future = self._llm_pool.submit(self._ask_llm, query, mode)
+
+        def finished(done):
+            self._llm_busy.clear()
+            try:
+                variants = done.result()
+            except Exception as e:
+                logger.debug(f"⚠️  Расширение запроса через LLM не удалось: {e}")
+                return
+            if variants:
+                # Ответ, не уложившийся в бюджет, пригодится следующему такому же запросу
+                with self._lock:
+                    self._cache[key] = variants
+                    self._cache.move_to_end(key)
+                    while len(self._cache) > LLM_CACHE_SIZE:
+                        self._cache.popitem(last=False)
+
+        future.add_done_callback(finished)
+        try:
+            # Остаток бюджета — на сам расширенный поиск
+            return future.result(timeout=max(0.0, budget - (self._search_cost or 0.0) - LLM_WAIT_RESERVE))
+        except FutureTimeout:
+            self.tracer.inc("expansion_llm_timeouts")
+            return []
+        except Exception:
+            return []
+
+    def _ask_llm(self, query: str, mode: str) -> List[str]:
+        from rag_llm.model import Model
+        count = Config.QUERY_EXPANSION_COUNT
+        with self.tracer.span("llm_expand"):
+            text = Model().complete(_llm_prompt(query, mode, count), max_tokens=48 * count + 96, temperature=0.3)
+        return parse_llm_variants(text, query, mode, count)
+
+    def record_search_cost(self, seconds: float):
+        """Длительность поиска по одному вектору — оценка стоимости параллельного расширенного поиска"""
+        if self._search_cost is None:
+            self._search_cost = seconds
+        else:
+            self._search_cost += COST_EWMA_ALPHA * (seconds - self._search_cost)
@@ -0,0 +1,146 @@
+# hybrid_search/filters.py
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Префикс булевых ключей меток: tags=["vpn", "hr"] → tag_vpn=True, tag_hr=True
+TAG_KEY_PREFIX = 'tag_'
+UPDATED_TS_KEY = 'last_updated_ts'
+
+# Синтаксис фильтров в тексте запроса: space:HR label:vpn,wifi after:2024-01-01 since:30d
+_FILTER_TOKEN = re.compile(r'(?<!\S)(space|label|tag|after|before|since):(\S+)', re.IGNORECASE)
+_SINCE_VALUE = re.compile(r'^(\d+)([dwmy]?)$', re.IGNORECASE)
+_SINCE_DAYS = {'d': 1, 'w': 7, 'm': 30, 'y': 365, '': 1}
+
+
+def parse_moment(value: str) -> Optional[datetime]:
+    """ISO-дата/время (2024-05-01, 2024-05-01T10:00:00.000+0000, ...Z) → datetime в UTC"""
+    if not value:
+        return None
+    value = value.strip().replace('Z', '+00:00')
+    value = re.sub(r'([+-]\d{2})(\d{2})$', r'\1:\2', value)  # +0000 → +00:00
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def tag_key(tag: str) -> str:
+    return f"{TAG_KEY_PREFIX}{tag.strip().lower()}"
+
+
+def filterable_fields(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Поля метаданных, по которым ChromaDB фильтрует до HNSW.
+
+    Chroma сравнивает только скаляры: метки раскладываются в булевы ключи,
+    дата обновления — в unix-время (для $gte/$lt).
+    """
+    fields = {}
+    tags = metadata.get('tags') or []
+    if isinstance(tags, str):
+        tags = [tags]
+    for tag in tags:
+        if tag:
+            fields[tag_key(tag)] = True
+
+    updated = parse_moment(metadata.get('last_updated') or '')
+    if updated:
+        fields[UPDATED_TS_KEY] = updated.timestamp()
+    return fields
+
+
+class SearchFilters:
+    """✅ Фильтры поиска: пространства, метки (ИЛИ), диапазон даты обновления"""
+
+    def __init__(self, spaces: List[str] = None, labels: List[str] = None,
+                 updated_after: Optional[datetime] = None, updated_before: Optional[datetime] = None):
+        self.spaces = list(spaces or [])
+        self.labels = list(labels or [])
+        self.updated_after = updated_after
+        self.updated_before = updated_before
+
+    def __bool__(self) -> bool:
+        return bool(self.spaces or self.labels or self.updated_after or self.updated_before)
+
+    def __repr__(self) -> str:
+        return (f"SearchFilters(spaces={self.spaces}, labels={self.labels}, "
+                f"after={self.updated_after}, before={self.updated_before})")
+
+    def to_where(self) -> Optional[Dict]:
+        """where-условие ChromaDB (None — без фильтра)"""
+        clauses = []
+        if self.spaces:
+            clauses.append({'space_key': self.spaces[0]} if len(self.spaces) == 1
+                           else {'space_key': {'$in': self.spaces}})
+        if self.labels:
+            label_clauses = [{tag_key(label): True} for label in self.labels]
+            clauses.append(label_clauses[0] if len(label_clauses) == 1 else {'$or': label_clauses})
+        if self.updated_after:
+            clauses.append({UPDATED_TS_KEY: {'$gte': self.updated_after.timestamp()}})
+        if self.updated_before:
+            clauses.append({UPDATED_TS_KEY: {'$lt': self.updated_before.timestamp()}})
+
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+    def describe(self) -> str:
+        """Человекочитаемое описание для логов и ответов бота"""
+        parts = []
+        if self.spaces:
+            parts.append(f"пространства: {', '.join(self.spaces)}")
+        if self.labels:
+            parts.append(f"метки: {', '.join(self.labels)}")
+        if self.updated_after:
+            parts.append(f"обновлено с {self.updated_after.date().isoformat()}")
+        if self.updated_before:
+            parts.append(f"обновлено до {self.updated_before.date().isoformat()}")
+        return '; '.join(parts)
+
+    @classmethod
+    def merge(cls, filters: Optional['SearchFilters'], spaces: Optional[List[str]]) -> 'SearchFilters':
+        """Новые фильтры: filters + пространства spaces (объект вызывающего не меняется)"""
+        base = filters or cls()
+        return cls(spaces=list(dict.fromkeys(base.spaces + list(spaces or []))), labels=base.labels,
+                   updated_after=base.updated_after, updated_before=base.updated_before)
+
+
+def parse_filters(text: str) -> Tuple[str, SearchFilters]:
+    """
+    Выделяет фильтры из текста запроса.
+
+    >>> parse_filters("space:HR label:vpn since:30d как подключить VPN?")
+    ('как подключить VPN?', SearchFilters(spaces=['HR'], labels=['vpn'], ...))
+
+    Нераспознанное значение остаётся в тексте запроса как есть.
+    """
+    filters = SearchFilters()
+
+    def consume(match: re.Match) -> str:
+        key, value = match.group(1).lower(), match.group(2)
+        values = [v for v in value.split(',') if v]
+        if key == 'space':
+            filters.spaces.extend(values)
+        elif key in ('label', 'tag'):
+            filters.labels.extend(v.lower() for v in values)
+        elif key == 'since':
+            since = _SINCE_VALUE.match(value)
+            if not since:
+                return match.group(0)
+            days = int(since.group(1)) * _SINCE_DAYS[since.group(2).lower()]
+            filters.updated_after = datetime.now(timezone.utc) - timedelta(days=days)
+        else:
+            moment = parse_moment(value)
+            if moment is None:
+                return match.group(0)
+            if key == 'after':
+                filters.updated_after = moment
+            else:
+                filters.updated_before = moment
+        return ''
+
+    query = _FILTER_TOKEN.sub(consume, text)
+    return ' '.join(query.split()), filters
@@ -0,0 +1,125 @@
+# hybrid_search/manifest.py
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from hybrid_search.alias import active_collection, state_path
+from hybrid_search.utils import singleton, logger, Config
+
+STATUS_IN_PROGRESS = 'in_progress'
+STATUS_COMPLETE = 'complete'
+
+
+def manifest_path(collection: str) -> str:
+    """Манифест коллекции: для исходной — INDEX_MANIFEST_PATH (если задан), для версий — рядом с их PageStore"""
+    if collection == Config.CHROMA_COLLECTION and Config.INDEX_MANIFEST_PATH:
+        return Config.INDEX_MANIFEST_PATH
+    return state_path(collection, 'index_manifest.sqlite3')
+
+
+@singleton
+class IndexManifest:
+    """
+    ✅ Манифест индекса: какие страницы (ID + версия) уже проиндексированы.
+
+    Хранится в SQLite рядом с ChromaDB и пишется после каждой страницы, поэтому
+    прерванная полная загрузка (таймаут Confluence, OOM, рестарт контейнера)
+    продолжается с оставшихся страниц, а не с нуля.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connect(manifest_path(active_collection()))
+        logger.info(f"✅ Манифест индекса: {self.path} ({self.page_count()} страниц)")
+
+    def bind(self, collection: str):
+        """Переключает на манифест другой коллекции (blue/green)"""
+        path = manifest_path(collection)
+        if path == self.path:
+            return
+        with self._lock:
+            previous = self._conn
+            self._connect(path)
+        previous.close()
+
+    def _connect(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                page_id    TEXT PRIMARY KEY,
+                version    TEXT NOT NULL,
+                chunks     INTEGER NOT NULL,
+                indexed_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS state (
+                key   TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    # ===== Состояние полной загрузки =====
+
+    def load_status(self) -> Optional[str]:
+        """Статус полной загрузки: None (не запускалась), in_progress или complete"""
+        return self._get_state('load_status')
+
+    def begin_load(self, total_pages: int):
+        self._set_state('load_status', STATUS_IN_PROGRESS)
+        self._set_state('load_total', str(total_pages))
+        self._set_state('load_started_at', str(time.time()))
+
+    def finish_load(self):
+        self._set_state('load_status', STATUS_COMPLETE)
+        self._set_state('load_finished_at', str(time.time()))
+
+    # ===== Страницы =====
+
+    def mark_page(self, page_id: str, version, chunks: int):
+        """Фиксирует, что страница полностью записана в индекс (после upsert всех чанков)"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (page_id, version, chunks, indexed_at) VALUES (?, ?, ?, ?)",
+                (str(page_id), str(version), int(chunks), time.time())
+            )
+            self._conn.commit()
+
+    def is_indexed(self, page_id: str, version) -> bool:
+        """Страница уже проиндексирована в этой версии"""
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM pages WHERE page_id = ?", (str(page_id),)).fetchone()
+        return row is not None and row[0] == str(version)
+
+    def indexed_versions(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT page_id, version FROM pages").fetchall())
+
+    def page_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def reset(self):
+        """Очистка манифеста (FORCE_RELOAD)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM pages")
+            self._conn.execute("DELETE FROM state")
+            self._conn.commit()
+        logger.info("🧹 Манифест индекса очищен")
+
+    # ===== Внутреннее =====
+
+    def _get_state(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+            self._conn.commit()
@@ -0,0 +1,220 @@
+# hybrid_search/metrics.py
+import contextvars
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from hybrid_search.utils import singleton, logger, Config
+
+# Пустая переменная тоже включила бы multiprocess-режим prometheus_client — с несуществующим каталогом
+if not os.environ.get('PROMETHEUS_MULTIPROC_DIR', 'unset'):
+    del os.environ['PROMETHEUS_MULTIPROC_DIR']
+
+import prometheus_client as prom  # noqa: E402 — режим выбирается по окружению при импорте
+from prometheus_client import multiprocess  # noqa: E402
+
+# Границы бакетов гистограмм (секунды)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Текущая трасса запроса (своя для каждого потока / asyncio-задачи)
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("rag_current_trace", default=None)
+
+
+def peak_rss_mb() -> float:
+    """Пиковый RSS процесса (МБ); 0.0, если платформа не поддерживает resource"""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def multiprocess_enabled() -> bool:
+    """Метрики пишутся в файлы PROMETHEUS_MULTIPROC_DIR и собираются со всех процессов пула"""
+    return bool(Config.PROMETHEUS_MULTIPROC_DIR)
+
+
+def prepare_multiprocess_dir():
+    """Очищает каталог multiprocess-метрик от файлов прошлого запуска (до первого наблюдения)"""
+    if not multiprocess_enabled():
+        return
+    os.makedirs(Config.PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+    for path in glob.glob(os.path.join(Config.PROMETHEUS_MULTIPROC_DIR, '*.db')):
+        os.remove(path)
+    logger.info(f"✅ Метрики Prometheus в multiprocess-режиме: {Config.PROMETHEUS_MULTIPROC_DIR}")
+
+
+def mark_process_dead(pid: int):
+    """Сообщает prometheus_client о завершённом процессе пула"""
+    if multiprocess_enabled() and pid:
+        multiprocess.mark_process_dead(pid)
+
+
+class Histogram:
+    """Окно последних длительностей стадии для перцентилей (бенчмарки, сводки)"""
+
+    def __init__(self, window: int = 2048):
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def percentile(self, q: float) -> float:
+        """Перцентиль по окну последних наблюдений (q в диапазоне 0-100)"""
+        if not self.recent:
+            return 0.0
+        values = sorted(self.recent)
+        idx = min(len(values) - 1, max(0, int(round(q / 100 * (len(values) - 1)))))
+        return values[idx]
+
+
+@singleton
+class Tracer:
+    """
+    ✅ Лёгкая трассировка стадий пайплайна: спаны, гистограммы, JSON-трассы.
+
+    Экспорт /metrics — через prometheus_client; перцентили для бенчмарков считаются по окну
+    последних наблюдений процесса.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[str, float] = {}
+        self._create_collectors()
+        self._trace_path = Config.TRACE_LOG_PATH
+        self._trace_lock = threading.Lock()
+        logger.info(f"✅ Tracer инициализирован (JSON-трассы: {self._trace_path or 'выкл'})")
+
+    @contextmanager
+    def trace(self, name: str, **attrs):
+        """Корневая трасса запроса; вложенные span() попадают в неё"""
+        parent = _current_trace.get()
+        if parent is not None:
+            # Уже внутри трассы — работаем как обычный спан
+            with self.span(name):
+                yield parent
+            return
+
+        record = {
+            'trace_id': uuid.uuid4().hex[:16],
+            'name': name,
+            'start': time.time(),
+            'attrs': attrs,
+            'spans': []
+        }
+        token = _current_trace.set(record)
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            duration = time.perf_counter() - started
+            _current_trace.reset(token)
+            record['duration'] = round(duration, 6)
+            self.observe(name, duration)
+            self._write_trace(record)
+
+    @contextmanager
+    def span(self, name: str):
+        """Измеряет длительность стадии и пишет её в гистограмму и текущую трассу"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def observe(self, name: str, seconds: float):
+        """Регистрирует длительность стадии, измеренную снаружи (например, тайминги Ollama)"""
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = Histogram()
+            hist.observe(seconds)
+        self._stage_seconds.labels(stage=name).observe(seconds)
+
+        record = _current_trace.get()
+        if record is not None and record['name'] != name:
+            record['spans'].append({'name': name, 'duration': round(seconds, 6)})
+
+    def inc(self, name: str, value: float = 1):
+        """Увеличивает счётчик событий (токены, запросы и т.п.)"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        self._events.labels(event=name).inc(value)
+
+    def annotate(self, **attrs):
+        """Добавляет атрибуты в текущую трассу (если она есть)"""
+        record = _current_trace.get()
+        if record is not None:
+            record['attrs'].update(attrs)
+
+    def current_trace(self) -> Optional[dict]:
+        return _current_trace.get()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Сводка по стадиям: count / avg / p50 / p95 / p99 (секунды)"""
+        with self._lock:
+            return {
+                name: {
+                    'count': hist.count,
+                    'avg': hist.sum / hist.count if hist.count else 0.0,
+                    'p50': hist.percentile(50),
+                    'p95': hist.percentile(95),
+                    'p99': hist.percentile(99),
+                }
+                for name, hist in self._histograms.items()
+            }
+
+    def counters(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):
+        """Сбрасывает накопленные метрики (для бенчмарков)"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._create_collectors()
+
+    def render_prometheus(self) -> str:
+        """Экспорт метрик в текстовом формате Prometheus (в multiprocess-режиме — по всем процессам)"""
+        if multiprocess_enabled():
+            registry = prom.CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = self._registry
+        return prom.generate_latest(registry).decode('utf-8')
+
+    def _create_collectors(self):
+        """Метрики prometheus_client в собственном реестре (без метрик процесса и GC по умолчанию)"""
+        self._registry = prom.CollectorRegistry()
+        self._stage_seconds = prom.Histogram(
+            'rag_stage_duration_seconds', 'Длительность стадий RAG-пайплайна', ['stage'],
+            buckets=DEFAULT_BUCKETS, registry=self._registry)
+        self._events = prom.Counter(
+            'rag_events', 'Счётчики событий RAG-пайплайна', ['event'], registry=self._registry)
+
+    def _write_trace(self, record: dict):
+        """Дописывает трассу запроса в JSONL-файл (если включено)"""
+        if not self._trace_path:
+            return
+        try:
+            line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+            with self._trace_lock:
+                with open(self._trace_path, 'a', encoding='utf-8') as f:
+                    f.write(line + "\n")
+        except Exception as e:
+            logger.debug(f"⚠️  Не удалось записать трассу: {e}")
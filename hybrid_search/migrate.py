@@ -0,0 +1,178 @@
+# hybrid_search/migrate.py
+"""
+Миграция индекса ChromaDB из legacy-схемы в компактную (slim) + замеры до/после.
+
+Legacy-схема хранит в метаданных каждого чанка дубль текста (content), sparse-вектор
+в JSON и все метаданные страницы. Миграция переносит метаданные страниц (один раз на
+страницу) и sparse-векторы в PageStore и удаляет эти ключи из Chroma — без перевекторизации.
+
+    python -m hybrid_search.migrate                 # миграция + отчёт
+    python -m hybrid_search.migrate --vacuum        # + VACUUM chroma.sqlite3 (освободить место на диске)
+    python -m hybrid_search.migrate --dry-run       # только замеры текущей схемы
+
+Приложение на время миграции нужно остановить (VACUUM требует монопольного доступа).
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+from typing import Dict
+
+import numpy as np
+
+from hybrid_search.database import Database
+from hybrid_search.filters import filterable_fields
+from hybrid_search.pagestore import SCHEMA_LEGACY, SCHEMA_SLIM, page_id_of, split_metadata
+from hybrid_search.utils import logger
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Миграция индекса в компактную схему хранения")
+    parser.add_argument('--batch-size', type=int, default=500, help="Чанков за один проход")
+    parser.add_argument('--queries', type=int, default=50, help="Сколько запросов для замера латентности")
+    parser.add_argument('--vacuum', action='store_true', help="VACUUM chroma.sqlite3 после миграции")
+    parser.add_argument('--dry-run', action='store_true', help="Только замеры, без миграции")
+    parser.add_argument('--output', help="Куда сохранить JSON-отчёт")
+    return parser.parse_args(argv)
+
+
+def disk_usage_mb(db: Database) -> Dict[str, float]:
+    """Размер каталога ChromaDB (без файлов PageStore) и PageStore, МБ"""
+    store_files = {os.path.basename(db.page_store.path) + s for s in ('', '-wal', '-shm')}
+    chroma = 0
+    for root, _, files in os.walk(db.persist_dir):
+        for name in files:
+            if root == db.persist_dir and name in store_files:
+                continue
+            chroma += os.path.getsize(os.path.join(root, name))
+    page_store = db.page_store.size_bytes()
+    return {
+        'chroma_mb': round(chroma / 2 ** 20, 2),
+        'page_store_mb': round(page_store / 2 ** 20, 2),
+        'total_mb': round((chroma + page_store) / 2 ** 20, 2),
+    }
+
+
+def sample_queries(db: Database, n: int) -> list:
+    """(dense, sparse) запросов: сохранённые эмбеддинги чанков — без загрузки моделей"""
+    count = db.count()
+    if not count:
+        return []
+    offsets = np.linspace(0, count - 1, num=min(n, count), dtype=int)
+    queries = []
+    for offset in offsets:
+        item = db.collection.get(limit=1, offset=int(offset), include=['embeddings', 'metadatas'])
+        if not item['ids']:
+            continue
+        if db.schema == SCHEMA_SLIM:
+            indices = db.page_store.get_sparse_indices(item['ids']).get(item['ids'][0], np.array([]))
+            indices = indices.tolist()
+        else:
+            indices = json.loads(item['metadatas'][0].get('sparse_indices') or '[]')
+        queries.append((list(item['embeddings'][0]), {'indices': indices[:10] or [0], 'values': []}))
+    return queries
+
+
+def measure_latency(db: Database, queries: list, repeat: int = 3) -> Dict[str, float]:
+    """Латентность Database.search (HNSW + метаданные + sparse-буст), мс"""
+    if not queries:
+        return {}
+    db.search(*queries[0])  # прогрев
+    timings = []
+    for _ in range(repeat):
+        for dense, sparse in queries:
+            started = time.perf_counter()
+            db.search(dense, sparse)
+            timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'p50_ms': round(float(np.percentile(timings, 50)), 2),
+        'p95_ms': round(float(np.percentile(timings, 95)), 2),
+        'mean_ms': round(float(np.mean(timings)), 2),
+    }
+
+
+def migrate(db: Database, batch_size: int = 500) -> int:
+    """Переносит метаданные страниц и sparse-векторы в PageStore, чистит метаданные Chroma"""
+    migrated = 0
+    offset = 0
+    while True:
+        batch = db.collection.get(limit=batch_size, offset=offset, include=['metadatas'])
+        if not batch['ids']:
+            break
+        pages, sparse, ids, metadatas = {}, {}, [], []
+        for chunk_id, raw in zip(batch['ids'], batch['metadatas']):
+            raw = raw or {}
+            if 'sparse_indices' not in raw and 'content' not in raw:
+                continue  # уже в компактной схеме (повторный запуск после сбоя)
+            metadata = db._deserialize_metadata(raw)
+            # Поля фильтрации считаются заново: индекс мог быть построен до их появления
+            chunk_meta, page_meta = split_metadata({**metadata, **filterable_fields(metadata)})
+            pages[page_id_of(chunk_id)] = page_meta
+            sparse[chunk_id] = {
+                'indices': metadata.get('sparse_indices') or [],
+                'values': metadata.get('sparse_values') or [],
+            }
+            # update сливает метаданные: None удаляет ключ
+            ids.append(chunk_id)
+            metadatas.append({**{key: None for key in raw if key not in chunk_meta},
+                              **db._serialize_metadata(chunk_meta)})
+        if ids:
+            # Сначала PageStore, потом Chroma: прерванная миграция безопасно повторяется
+            db.page_store.put_many(pages, sparse)
+            db.collection.update(ids=ids, metadatas=metadatas)
+            migrated += len(ids)
+            logger.info(f"🔧 Миграция: {migrated} чанков")
+        offset += len(batch['ids'])
+
+    db.page_store.set_schema(SCHEMA_SLIM)
+    db.schema = SCHEMA_SLIM
+    return migrated
+
+
+def vacuum(db: Database):
+    """VACUUM chroma.sqlite3: удалённые из метаданных данные иначе остаются в файле"""
+    from chromadb.api.client import SharedSystemClient
+    SharedSystemClient.clear_system_cache()
+    path = os.path.join(db.persist_dir, 'chroma.sqlite3')
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    db.reload()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    db = Database()
+    queries = sample_queries(db, args.queries)
+    report = {'chunks': db.count(), 'schema_before': db.schema}
+
+    report['before'] = {**disk_usage_mb(db), **measure_latency(db, queries)}
+    logger.info(f"📏 До: {report['before']}")
+
+    if args.dry_run:
+        pass
+    elif db.schema == SCHEMA_LEGACY:
+        started = time.perf_counter()
+        report['migrated_chunks'] = migrate(db, args.batch_size)
+        if args.vacuum:
+            vacuum(db)
+        report['migration_seconds'] = round(time.perf_counter() - started, 1)
+    else:
+        logger.info("✅ Индекс уже в компактной схеме")
+
+    if not args.dry_run:
+        report['after'] = {**disk_usage_mb(db), **measure_latency(db, queries)}
+        logger.info(f"📏 После: {report['after']}")
+    report['schema_after'] = db.schema
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# hybrid_search/pagestore.py
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from hybrid_search.alias import active_collection, state_path
+from hybrid_search.filters import TAG_KEY_PREFIX, UPDATED_TS_KEY
+from hybrid_search.utils import singleton
+
+SCHEMA_LEGACY = 'legacy'
+SCHEMA_SLIM = 'slim'
+
+# Поля чанка, которые остаются в метаданных ChromaDB в компактной схеме:
+# нужны для группировки, соседей и where-фильтров (плюс tag_* и last_updated_ts из filters)
+CHUNK_FIELDS = ('document_id', 'chunk_index', 'total_chunks', 'space_key')
+
+
+def page_store_path(collection: str) -> str:
+    return state_path(collection, 'page_store.sqlite3')
+
+
+def page_id_of(chunk_id: str) -> str:
+    """ID страницы из ID чанка (формат: "page_id-chunk_num")"""
+    return chunk_id.rsplit('-', 1)[0]
+
+
+def split_metadata(metadata: Dict) -> tuple:
+    """(метаданные чанка для Chroma, метаданные страницы для PageStore)"""
+    chunk_meta, page_meta = {}, {}
+    for key, value in metadata.items():
+        if key in CHUNK_FIELDS or key.startswith(TAG_KEY_PREFIX) or key == UPDATED_TS_KEY:
+            chunk_meta[key] = value
+        elif key not in ('content', 'sparse_indices', 'sparse_values'):
+            page_meta[key] = value
+    return chunk_meta, page_meta
+
+
+@singleton
+class PageStore:
+    """
+    ✅ Хранилище компактной схемы: метаданные страниц и sparse-векторы чанков (SQLite).
+
+    Метаданные страницы (title, url, section, версия, метки...) хранятся один раз на страницу
+    и присоединяются к чанкам по document_id одним запросом; sparse-векторы — бинарные
+    массивы по chunk_id, без JSON в метаданных Chroma. Родительские фрагменты чанков
+    (PARENT_WINDOW) хранятся здесь в обеих схемах.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connect(page_store_path(active_collection()))
+
+    def bind(self, collection: str):
+        """Переключает на PageStore другой коллекции (blue/green): у каждой коллекции свой файл"""
+        path = page_store_path(collection)
+        if path == self.path:
+            return
+        with self._lock:
+            previous = self._conn
+            self._connect(path)
+        previous.close()
+
+    def _connect(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                page_id  TEXT PRIMARY KEY,
+                metadata TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS sparse (
+                chunk_id TEXT PRIMARY KEY,
+                indices  BLOB NOT NULL,
+                vals     BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS parents (
+                chunk_id TEXT PRIMARY KEY,
+                page_id  TEXT NOT NULL,
+                first    INTEGER NOT NULL,
+                last     INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS parents_page ON parents (page_id);
+            CREATE TABLE IF NOT EXISTS state (
+                key   TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    # ===== Схема хранения =====
+
+    def get_schema(self) -> Optional[str]:
+        """Схема хранения индекса: legacy (всё в метаданных Chroma), slim или None (не определена)"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM state WHERE key = 'storage_schema'").fetchone()
+        return row[0] if row else None
+
+    def set_schema(self, schema: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('storage_schema', ?)", (schema,))
+            self._conn.commit()
+
+    # ===== Запись =====
+
+    def put(self, page_id: str, page_metadata: Dict, chunk_id: str, sparse_vector: Dict):
+        """Метаданные страницы + sparse-вектор чанка (одна транзакция)"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (page_id, metadata) VALUES (?, ?)",
+                (str(page_id), json.dumps(page_metadata, ensure_ascii=False, default=str))
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sparse (chunk_id, indices, vals) VALUES (?, ?, ?)",
+                (chunk_id,
+                 np.asarray(sparse_vector.get('indices', []), dtype=np.int32).tobytes(),
+                 np.asarray(sparse_vector.get('values', []), dtype=np.float32).tobytes())
+            )
+            self._conn.commit()
+
+    def put_many(self, pages: Dict[str, Dict], sparse: Dict[str, Dict]):
+        """Пакетная запись (миграция)"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages (page_id, metadata) VALUES (?, ?)",
+                [(pid, json.dumps(meta, ensure_ascii=False, default=str)) for pid, meta in pages.items()]
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sparse (chunk_id, indices, vals) VALUES (?, ?, ?)",
+                [(cid,
+                  np.asarray(vec.get('indices', []), dtype=np.int32).tobytes(),
+                  np.asarray(vec.get('values', []), dtype=np.float32).tobytes())
+                 for cid, vec in sparse.items()]
+            )
+            self._conn.commit()
+
+    def put_parents(self, page_id: str, spans: Dict[str, Tuple[int, int]]):
+        """Родительские фрагменты чанков страницы: chunk_id → (первый, последний номер чанка)"""
+        with self._lock:
+            # Прежние записи страницы удаляются: после правки чанков может стать меньше
+            self._conn.execute("DELETE FROM parents WHERE page_id = ?", (str(page_id),))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO parents (chunk_id, page_id, first, last) VALUES (?, ?, ?, ?)",
+                [(chunk_id, str(page_id), first, last) for chunk_id, (first, last) in spans.items()]
+            )
+            self._conn.commit()
+
+    def clear(self):
+        """Очистка данных (схема хранения сохраняется)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM pages")
+            self._conn.execute("DELETE FROM sparse")
+            self._conn.execute("DELETE FROM parents")
+            self._conn.commit()
+
+    # ===== Чтение =====
+
+    def get_pages(self, page_ids: Iterable[str]) -> Dict[str, Dict]:
+        """Метаданные страниц одним запросом"""
+        ids = list(dict.fromkeys(str(p) for p in page_ids))
+        if not ids:
+            return {}
+        placeholders = ','.join('?' * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT page_id, metadata FROM pages WHERE page_id IN ({placeholders})", ids
+            ).fetchall()
+        return {page_id: json.loads(meta) for page_id, meta in rows}
+
+    def get_sparse_indices(self, chunk_ids: List[str]) -> Dict[str, np.ndarray]:
+        """Индексы sparse-векторов чанков (для sparse-буста)"""
+        if not chunk_ids:
+            return {}
+        placeholders = ','.join('?' * len(chunk_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT chunk_id, indices FROM sparse WHERE chunk_id IN ({placeholders})", list(chunk_ids)
+            ).fetchall()
+        return {chunk_id: np.frombuffer(blob, dtype=np.int32) for chunk_id, blob in rows}
+
+    def get_parents(self, chunk_ids: List[str]) -> Dict[str, Tuple[int, int]]:
+        """Родительские фрагменты чанков одним запросом (чанки без записи отсутствуют в ответе)"""
+        if not chunk_ids:
+            return {}
+        placeholders = ','.join('?' * len(chunk_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT chunk_id, first, last FROM parents WHERE chunk_id IN ({placeholders})", list(chunk_ids)
+            ).fetchall()
+        return {chunk_id: (first, last) for chunk_id, first, last in rows}
+
+    def size_bytes(self) -> int:
+        return sum(
+            os.path.getsize(self.path + suffix)
+            for suffix in ('', '-wal') if os.path.exists(self.path + suffix)
+        )
@@ -0,0 +1,157 @@
+# hybrid_search/quantized.py
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from hybrid_search.utils import logger
+
+# Строк на блок при скоринге: int8 → float32 конвертируется поблочно, без копии всей матрицы
+SCORE_BLOCK_ROWS = 65536
+
+
+class Int8VectorIndex:
+    """
+    ✅ Сжатый слой векторов для первого прохода: int8-коды + масштаб на вектор.
+
+    Нормализованный 768-мерный вектор занимает 768 байт вместо 3072 (float32).
+    Первый проход — полный перебор по кодам (скалярное произведение ≈ косинус),
+    затем кандидаты (n * QUANTIZED_OVERSAMPLE) пересчитываются точно по float32 из ChromaDB.
+    """
+
+    def __init__(self, dim: int = 0):
+        self.dim = dim
+        self._codes = np.zeros((0, dim), dtype=np.int8)
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._size = 0
+        self._lock = threading.RLock()
+        self.ready = False  # построен из коллекции
+        self._pending = None  # upsert во время фоновой пересборки (None — пересборки нет)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def quantize(vectors: np.ndarray):
+        """float32 (n, dim) → (int8 коды, масштабы): симметричная квантизация по max |x|"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def build(self, collection, batch_size: int = 2000):
+        """Строит слой из эмбеддингов коллекции ChromaDB (пакетами)"""
+        started = time.perf_counter()
+        with self._lock:
+            self._reset(0)
+            offset = 0
+            while True:
+                batch = collection.get(limit=batch_size, offset=offset, include=['embeddings'])
+                if not batch['ids']:
+                    break
+                self.upsert(batch['ids'], np.asarray(batch['embeddings'], dtype=np.float32))
+                offset += len(batch['ids'])
+            self.ready = True
+        logger.info(
+            f"✅ int8-слой векторов: {self._size} векторов, {self.memory_bytes() / 2 ** 20:.1f} МБ "
+            f"за {time.perf_counter() - started:.1f} сек")
+
+    def ensure_built(self, collection):
+        """Строит слой один раз (параллельные первые запросы ждут одну сборку)"""
+        with self._lock:
+            if not self.ready:
+                self.build(collection)
+
+    def refresh(self, collection):
+        """
+        Пересборка в фоне (коллекцию дописал другой процесс): поиск до конца сборки идёт по текущим
+        кодам, новые подменяют их целиком; upsert за время сборки повторяется поверх новых.
+        """
+        with self._lock:
+            if self._pending is not None:
+                return
+            self._pending = []
+        threading.Thread(target=self._refresh, args=(collection,), name="int8-refresh", daemon=True).start()
+
+    def _refresh(self, collection):
+        fresh = Int8VectorIndex()
+        try:
+            fresh.build(collection)
+        except Exception as e:
+            logger.error(f"❌ Пересборка int8-слоя не удалась: {e} (поиск — по прежним кодам)")
+            with self._lock:
+                self._pending = None
+            return
+        with self._lock:
+            pending, self._pending = self._pending, None
+            self.dim, self._codes, self._scales = fresh.dim, fresh._codes, fresh._scales
+            self._ids, self._rows, self._size = fresh._ids, fresh._rows, fresh._size
+            for ids, vectors in pending:
+                self.upsert(ids, vectors)
+
+    def upsert(self, ids: List[str], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((list(ids), vectors))
+            if not self.dim:
+                self._reset(vectors.shape[1])
+            codes, scales = self.quantize(vectors)
+            for chunk_id, code, scale in zip(ids, codes, scales):
+                row = self._rows.get(chunk_id)
+                if row is None:
+                    row = self._append_row()
+                    self._rows[chunk_id] = row
+                    self._ids.append(chunk_id)
+                self._codes[row] = code
+                self._scales[row] = scale
+
+    def search(self, query: np.ndarray, k: int) -> List[str]:
+        """Приближённые top-k ID по int8-кодам (запросы с where-фильтром идут в HNSW ChromaDB)"""
+        query = np.asarray(query, dtype=np.float32).ravel()
+        with self._lock:
+            scores = np.empty(self._size, dtype=np.float32)
+            for start in range(0, self._size, SCORE_BLOCK_ROWS):
+                end = min(start + SCORE_BLOCK_ROWS, self._size)
+                scores[start:end] = (self._codes[start:end].astype(np.float32) @ query) * self._scales[start:end]
+            if not len(scores):
+                return []
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [self._ids[i] for i in top]
+
+    def clear(self):
+        with self._lock:
+            self._reset(self.dim)
+
+    def memory_bytes(self) -> int:
+        return self._codes.nbytes + self._scales.nbytes
+
+    # ===== Внутреннее =====
+
+    def _reset(self, dim: int):
+        self.dim = dim
+        self._codes = np.zeros((1024, dim), dtype=np.int8)
+        self._scales = np.zeros(1024, dtype=np.float32)
+        self._ids = []
+        self._rows = {}
+        self._size = 0
+
+    def _append_row(self) -> int:
+        if self._size == len(self._codes):
+            # Рост ×2, как у list: амортизированно O(1) на вставку
+            capacity = max(1024, 2 * len(self._codes))
+            codes = np.zeros((capacity, self.dim), dtype=np.int8)
+            codes[:self._size] = self._codes[:self._size]
+            scales = np.zeros(capacity, dtype=np.float32)
+            scales[:self._size] = self._scales[:self._size]
+            self._codes, self._scales = codes, scales
+        self._size += 1
+        return self._size - 1
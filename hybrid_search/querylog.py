@@ -0,0 +1,189 @@
+# hybrid_search/querylog.py
+"""
+Журнал запросов для регрессионных замеров (QUERY_LOG_PATH, по умолчанию выключен).
+
+Запись на границах SemanticSearch.search ("s") и Response.query_model ("g") — JSON в строку,
+короткие ключи:
+    k    тип записи: s — поиск, g — генерация
+    ts   время начала (unix, сек)          tid  trace_id (совпадает с TRACE_LOG_PATH)
+    q    запрос                            f    фильтры {spaces, labels, after, before}
+    n    n_results                         ids  ID чанков результата по рангу
+    nc   кандидатов до rerank              wc   ответ из кэша прогрева
+    ms   длительность (мс)                 st   стадии {имя: мс}
+    tok  токены {in, out} (генерация)      err  ошибка
+
+Файл ротируется по размеру: QUERY_LOG_PATH.1.gz (свежий) … .N.gz — сжатые прошлые части.
+Повтор журнала против текущей сборки: python -m benchmarks.replay QUERY_LOG_PATH
+"""
+import fcntl
+import gzip
+import json
+import os
+import shutil
+import threading
+from typing import Dict, Iterator, List, Optional
+
+from hybrid_search.filters import SearchFilters
+from hybrid_search.utils import singleton, logger, Config
+
+KIND_SEARCH = 's'
+KIND_GENERATE = 'g'
+
+
+def _round_ms(seconds: float) -> float:
+    return round(seconds * 1000, 1)
+
+
+def stage_timings(trace: Optional[Dict]) -> Dict[str, float]:
+    """Стадии трассы в мс (повторяющиеся спаны суммируются)"""
+    stages: Dict[str, float] = {}
+    for span in (trace or {}).get('spans', []):
+        stages[span['name']] = stages.get(span['name'], 0.0) + span['duration']
+    return {name: _round_ms(seconds) for name, seconds in stages.items()}
+
+
+def filters_to_dict(filters: Optional[SearchFilters]) -> Optional[Dict]:
+    """Фильтры в JSON (даты — unix-время: относительные since:30d повторяются как абсолютные)"""
+    if not filters:
+        return None
+    data = {
+        'spaces': filters.spaces or None,
+        'labels': filters.labels or None,
+        'after': filters.updated_after.timestamp() if filters.updated_after else None,
+        'before': filters.updated_before.timestamp() if filters.updated_before else None,
+    }
+    return {key: value for key, value in data.items() if value is not None}
+
+
+def filters_from_dict(data: Optional[Dict]) -> Optional[SearchFilters]:
+    from datetime import datetime, timezone
+    if not data:
+        return None
+    to_dt = (lambda ts: datetime.fromtimestamp(ts, tz=timezone.utc) if ts is not None else None)
+    return SearchFilters(spaces=data.get('spaces'), labels=data.get('labels'),
+                         updated_after=to_dt(data.get('after')), updated_before=to_dt(data.get('before')))
+
+
+def log_segments(path: str) -> List[str]:
+    """Части журнала от старых к новым: .N.gz … .1.gz, затем текущий файл"""
+    rotated = []
+    index = 1
+    while os.path.exists(f"{path}.{index}.gz"):
+        rotated.append(f"{path}.{index}.gz")
+        index += 1
+    segments = list(reversed(rotated))
+    if os.path.exists(path):
+        segments.append(path)
+    return segments
+
+
+def read_log(path: str) -> Iterator[Dict]:
+    """Записи журнала в порядке записи (битые строки — обрыв при падении процесса — пропускаются)"""
+    for segment in log_segments(path):
+        opener = gzip.open if segment.endswith('.gz') else open
+        with opener(segment, 'rt', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+@singleton
+class QueryLog:
+    """
+    ✅ Компактный журнал запросов с ротацией.
+
+    Пишут несколько процессов (пул воркеров поиска, бот): строка дописывается под flock,
+    ротация выполняется под той же блокировкой.
+    """
+
+    def __init__(self):
+        self.path = Config.QUERY_LOG_PATH
+        self.max_bytes = int(Config.QUERY_LOG_MAX_MB * 2 ** 20)
+        self.backups = Config.QUERY_LOG_BACKUPS
+        self._lock = threading.Lock()
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            logger.info(f"✅ Журнал запросов: {self.path} (ротация {Config.QUERY_LOG_MAX_MB} МБ × {self.backups})")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def log_search(self, trace: Optional[Dict], started: float, seconds: float, query: str,
+                   n_results: Optional[int], filters: Optional[SearchFilters], result: Dict):
+        if not self.enabled:
+            return
+        attrs = (trace or {}).get('attrs', {})
+        record = {
+            'k': KIND_SEARCH,
+            'ts': round(started, 3),
+            'tid': (trace or {}).get('trace_id'),
+            'q': query,
+            'f': filters_to_dict(filters),
+            'n': n_results,
+            'ids': [match['id'] for match in result.get('matches', [])],
+            'nc': attrs.get('candidates'),
+            'wc': attrs.get('warm_cache') or None,
+            'ms': _round_ms(seconds),
+            'st': stage_timings(trace),
+            'err': result.get('error'),
+        }
+        self._write(record)
+
+    def log_generate(self, trace: Optional[Dict], started: float, seconds: float, query: str,
+                     matches: Dict, answer: str):
+        if not self.enabled:
+            return
+        attrs = (trace or {}).get('attrs', {})
+        record = {
+            'k': KIND_GENERATE,
+            'ts': round(started, 3),
+            'tid': (trace or {}).get('trace_id'),
+            'q': query,
+            'ids': [match['id'] for match in matches.get('matches', [])],
+            'ms': _round_ms(seconds),
+            'st': stage_timings(trace),
+            'tok': {'in': attrs.get('prompt_tokens', 0), 'out': attrs.get('generated_tokens', 0)},
+            'len': len(answer or ''),
+        }
+        self._write(record)
+
+    def _write(self, record: Dict):
+        line = json.dumps({k: v for k, v in record.items() if v is not None},
+                          ensure_ascii=False, separators=(',', ':')) + "\n"
+        try:
+            with self._lock:
+                for _ in range(3):
+                    with open(self.path, 'a', encoding='utf-8') as f:
+                        fcntl.flock(f, fcntl.LOCK_EX)  # снимается при закрытии файла
+                        if not self._is_current(f):
+                            continue  # файл ротирован другим процессом, пока ждали блокировку
+                        if self.max_bytes and f.tell() and f.tell() + len(line) > self.max_bytes:
+                            self._rotate()
+                            continue
+                        f.write(line)
+                        return
+        except Exception as e:
+            logger.debug(f"⚠️  Не удалось записать журнал запросов: {e}")
+
+    def _is_current(self, handle) -> bool:
+        try:
+            return os.fstat(handle.fileno()).st_ino == os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return False
+
+    def _rotate(self):
+        """Сжимает текущий файл в .1.gz, сдвигая прошлые части (под flock текущего файла)"""
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}.gz"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}.gz")
+        if self.backups > 0:
+            tmp_path = f"{self.path}.1.gz.tmp"
+            with open(self.path, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_path, f"{self.path}.1.gz")
+        os.remove(self.path)
+        logger.info(f"🗜️  Журнал запросов ротирован: {self.path}")
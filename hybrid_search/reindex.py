@@ -0,0 +1,439 @@
+# hybrid_search/reindex.py
+"""
+Blue/green переиндексация: полная загрузка в новую версионированную коллекцию,
+проверка и атомарное переключение указателя — поиск всё это время идёт по текущей.
+
+    1. load_all в <CHROMA_COLLECTION>_v<время> (свои PageStore и манифест в collections/<имя>/);
+    2. догрузка страниц, обновлённых синхронизацией в текущей коллекции за время сборки;
+    3. проверка: загрузка завершена, страниц ≥ REINDEX_MIN_PAGE_RATIO от текущей,
+       smoke-запросы (REINDEX_SMOKE_QUERIES) находят результаты не хуже текущей коллекции;
+    4. переключение указателя active_collection.json (процессы поиска переходят на новую
+       коллекцию перед следующим запросом) и удаление старых версий (кроме REINDEX_KEEP_COLLECTIONS).
+
+Перекодирование (--reembed, смена DENSE_MODEL): вместо шага 1 — копия PageStore и манифеста текущей
+коллекции и перекодирование её текстов моделью DENSE_MODEL, без обращения к Confluence.
+
+    python -m hybrid_search.reindex
+    DENSE_MODEL=intfloat/multilingual-e5-small python -m hybrid_search.reindex --reembed
+    python -m hybrid_search.reindex --smoke-queries benchmarks/fixtures/queries.json --output reindex.json
+    python -m hybrid_search.reindex --list
+    python -m hybrid_search.reindex --switch confluence_index_v20261019101500   # откат на прежнюю версию
+    python -m hybrid_search.reindex --gc
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from hybrid_search.alias import (
+    is_versioned, new_collection_name, pin_collection, read_alias,
+    set_active_collection, state_dir,
+)
+from hybrid_search.bm25 import bm25_path
+from hybrid_search.database import embedding_model_of
+from hybrid_search.manifest import STATUS_COMPLETE, STATUS_IN_PROGRESS, manifest_path
+from hybrid_search.pagestore import page_id_of, page_store_path
+from hybrid_search.snapshot import _backup_sqlite
+from hybrid_search.utils import logger, Config
+
+# Чанков на пакет перекодирования (чтение из текущей коллекции + encode + запись в новую)
+REEMBED_BATCH = 256
+
+
+def _read_manifest(collection: str, query: str) -> list:
+    """Чтение манифеста другой коллекции (только чтение, без синглтона)"""
+    path = manifest_path(collection)
+    if not os.path.exists(path):
+        return []
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return conn.execute(query).fetchall()
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        conn.close()
+
+
+def load_status(collection: str) -> Optional[str]:
+    rows = _read_manifest(collection, "SELECT value FROM state WHERE key = 'load_status'")
+    return rows[0][0] if rows else None
+
+
+def page_versions(collection: str) -> Dict[str, str]:
+    return dict(_read_manifest(collection, "SELECT page_id, version FROM pages"))
+
+
+def reembed_source(collection: str) -> Optional[str]:
+    """Коллекция, из которой перекодируется эта (None — сборка полной загрузкой)"""
+    rows = _read_manifest(collection, "SELECT value FROM state WHERE key = 'reembed_from'")
+    return rows[0][0] if rows else None
+
+
+def list_collections(client) -> List[Dict]:
+    """Версии индекса (исходная + <CHROMA_COLLECTION>_v*), от старых к новым"""
+    active = read_alias().get('collection') or Config.CHROMA_COLLECTION
+    names = sorted(
+        c.name if hasattr(c, 'name') else str(c) for c in client.list_collections()
+    )
+    result = []
+    for name in names:
+        if name != Config.CHROMA_COLLECTION and not is_versioned(name):
+            continue
+        collection = client.get_collection(name)
+        result.append({
+            'name': name,
+            'active': name == active,
+            'embedding_model': embedding_model_of(collection),
+            'chunks': collection.count(),
+            'pages': len(page_versions(name)),
+            'load_status': load_status(name),
+        })
+    return result
+
+
+def _pending_shadow(client, live: str) -> Optional[str]:
+    """Незавершённая сборка новее активной коллекции (той же модели) — продолжается, а не начинается заново"""
+    pending = [c['name'] for c in list_collections(client)
+               if c['name'] > live and is_versioned(c['name']) and c['load_status'] == STATUS_IN_PROGRESS
+               and c['embedding_model'] == Config.DENSE_MODEL]
+    return pending[-1] if pending else None
+
+
+def load_smoke_queries(path: str) -> List[Dict]:
+    """JSON: ["запрос", ...] или [{"query": ..., "relevant": [page_id, ...]}, ...] (как benchmarks/fixtures)"""
+    if not path:
+        return []
+    with open(path, encoding='utf-8') as f:
+        items = json.load(f)
+    return [{'query': item} if isinstance(item, str) else item for item in items]
+
+
+def catch_up(updater, live: str, shadow: str) -> int:
+    """
+    Страницы, обновлённые синхронизацией в текущей коллекции после того, как сборка их прочитала
+    (или созданные за это время), — перечитываются из Confluence в новую коллекцию.
+    """
+    live_versions = page_versions(live)
+    shadow_versions = page_versions(shadow)
+    stale = []
+    for page_id, version in live_versions.items():
+        built = shadow_versions.get(page_id)
+        if built is None:
+            stale.append(page_id)
+        elif built != version:
+            try:
+                if int(version) > int(built):
+                    stale.append(page_id)
+            except ValueError:
+                stale.append(page_id)
+    for page_id in stale:
+        updater.update_page(page_id)
+    if stale:
+        logger.info(f"🔁 Догрузка в {shadow}: {len(stale)} страниц, изменённых во время сборки")
+    return len(stale)
+
+
+def copy_state(live: str, shadow: str):
+    """
+    PageStore и манифест текущей коллекции — в новую (перекодирование: страницы и sparse-векторы
+    те же, меняются только dense-векторы). Манифест помечается незавершённым до конца перекодирования.
+    """
+    os.makedirs(state_dir(shadow), exist_ok=True)
+    for source, target in ((page_store_path(live), page_store_path(shadow)),
+                           (manifest_path(live), manifest_path(shadow))):
+        if os.path.exists(source):
+            _backup_sqlite(source, target)
+    if os.path.exists(bm25_path(live)):
+        shutil.copyfile(bm25_path(live), bm25_path(shadow))  # sparse-векторы те же — и корпус BM25
+    conn = sqlite3.connect(manifest_path(shadow))
+    try:
+        conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.executemany("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+                         [('load_status', STATUS_IN_PROGRESS), ('reembed_from', live)])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def reembed(db, embedder, live: str, batch_size: int = REEMBED_BATCH) -> int:
+    """
+    ✅ Перекодирование текстов текущей коллекции в новую (к ней привязан db) моделью новой коллекции.
+
+    Идёт по списку ID, снятому в начале: уже записанные чанки пропускаются (продолжение после
+    прерывания), удалённые за это время — тоже; страницы, изменённые синхронизацией, догружает catch_up.
+    """
+    source = db.client.get_collection(live)
+    target = db.collection
+    model = db.embedding_model()
+    ids = source.get(include=[])['ids']
+    started = time.perf_counter()
+    added = 0
+    for start in range(0, len(ids), batch_size):
+        batch_ids = ids[start:start + batch_size]
+        existing = set(target.get(ids=batch_ids, include=[])['ids'])
+        todo = [chunk_id for chunk_id in batch_ids if chunk_id not in existing]
+        if todo:
+            batch = source.get(ids=todo, include=['documents', 'metadatas'])
+            if batch['ids']:
+                documents = [document or '' for document in batch['documents']]
+                target.add(
+                    ids=batch['ids'],
+                    embeddings=embedder.embed_texts_batch(documents, model),
+                    documents=documents,
+                    metadatas=[metadata or None for metadata in batch['metadatas']],
+                )
+                added += len(batch['ids'])
+        done = min(start + batch_size, len(ids))
+        if done == len(ids) or (start // batch_size) % 20 == 0:
+            elapsed = time.perf_counter() - started
+            logger.info(f"🧬 Перекодирование {model}: {done}/{len(ids)} чанков "
+                        f"({added / elapsed if elapsed else 0:.0f} чанков/сек)")
+    return added
+
+
+def _search_pages(db, embedder, query: str) -> List[str]:
+    """ID страниц выдачи первого этапа (без повторов, в порядке оценки)"""
+    embedder.use_bm25(db.index_name)
+    chunks = db.search(embedder.embed_text(query, db.embedding_model()), embedder.embed_sparse(query),
+                       n_results=Config.RETRIEVAL_TOP_K)
+    chunks.sort(key=lambda c: c['score'], reverse=True)
+    return list(dict.fromkeys(page_id_of(c['id']) for c in chunks))
+
+
+def validate(db, live: str, shadow: str, queries: List[Dict]) -> Dict:
+    """Проверка новой коллекции перед переключением: объём и smoke-запросы против текущей"""
+    from hybrid_search.embed import Embed
+
+    client = db.client
+    live_chunks = client.get_collection(live).count()
+    live_pages = len(page_versions(live))
+    shadow_pages = len(page_versions(shadow))
+    report = {
+        'live': {'collection': live, 'chunks': live_chunks, 'pages': live_pages},
+        'shadow': {'collection': shadow, 'chunks': client.get_collection(shadow).count(), 'pages': shadow_pages,
+                   'load_status': load_status(shadow)},
+        'failures': [],
+    }
+    failures = report['failures']
+    if report['shadow']['load_status'] != STATUS_COMPLETE:
+        failures.append(f"загрузка не завершена ({report['shadow']['load_status']})")
+    if not report['shadow']['chunks']:
+        failures.append("коллекция пуста")
+    if live_pages and shadow_pages < Config.REINDEX_MIN_PAGE_RATIO * live_pages:
+        failures.append(f"страниц {shadow_pages} < {Config.REINDEX_MIN_PAGE_RATIO:.0%} от {live_pages}")
+
+    if queries and not failures:
+        embedder = Embed()
+        results = {}
+        for collection in (live, shadow):
+            db.switch_collection(collection)
+            results[collection] = [_search_pages(db, embedder, item['query']) for item in queries]
+        db.switch_collection(shadow)
+
+        empty, overlap, hits = 0, [], {live: 0, shadow: 0}
+        labeled = 0
+        for item, old, new in zip(queries, results[live], results[shadow]):
+            if old and not new:
+                empty += 1
+            if old:
+                overlap.append(len(set(old) & set(new)) / len(old))
+            relevant = {str(page_id) for page_id in item.get('relevant', [])}
+            if relevant:
+                labeled += 1
+                hits[live] += bool(relevant & set(old))
+                hits[shadow] += bool(relevant & set(new))
+        report['smoke'] = {
+            'queries': len(queries),
+            'empty': empty,
+            'page_overlap': round(sum(overlap) / len(overlap), 4) if overlap else None,
+            'hit_rate': {'live': round(hits[live] / labeled, 4), 'shadow': round(hits[shadow] / labeled, 4)}
+            if labeled else None,
+        }
+        if empty:
+            failures.append(f"{empty} smoke-запросов без результатов (в текущей коллекции результаты есть)")
+        if labeled and hits[shadow] < hits[live]:
+            failures.append(f"smoke hit rate {hits[shadow]}/{labeled} < {hits[live]}/{labeled} текущей коллекции")
+
+    report['ok'] = not failures
+    return report
+
+
+def gc_collections(client, keep: int = None) -> List[str]:
+    """Удаляет старые версии: кроме активной, последних keep из истории указателя и незавершённых новых сборок"""
+    keep = Config.REINDEX_KEEP_COLLECTIONS if keep is None else keep
+    alias = read_alias()
+    active = alias.get('collection') or Config.CHROMA_COLLECTION
+    kept = {active, *alias.get('previous', [])[:keep]}
+
+    removed = []
+    for info in list_collections(client):
+        name = info['name']
+        if name in kept or (name > active and info['load_status'] == STATUS_IN_PROGRESS):
+            continue
+        client.delete_collection(name)
+        if is_versioned(name):
+            shutil.rmtree(state_dir(name), ignore_errors=True)
+        else:
+            # Исходная коллекция: файлы состояния в корне CHROMA_DB_PATH
+            for path in (page_store_path(name), manifest_path(name), bm25_path(name)):
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+        removed.append(name)
+        logger.info(f"🗑️  Удалена старая коллекция {name} ({info['chunks']} чанков)")
+    if removed:
+        _remove_orphan_segments()
+    return removed
+
+
+def _remove_orphan_segments():
+    """Каталоги HNSW-сегментов удалённых коллекций (локальная ChromaDB оставляет их на диске)"""
+    conn = sqlite3.connect(f"file:{os.path.join(Config.CHROMA_DB_PATH, 'chroma.sqlite3')}?mode=ro", uri=True)
+    try:
+        segments = {row[0] for row in conn.execute("SELECT id FROM segments")}
+    except sqlite3.OperationalError:
+        return
+    finally:
+        conn.close()
+    for entry in os.listdir(Config.CHROMA_DB_PATH):
+        path = os.path.join(Config.CHROMA_DB_PATH, entry)
+        try:
+            uuid.UUID(entry)
+        except ValueError:
+            continue
+        if os.path.isdir(path) and entry not in segments:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def run_reindex(name: str = None, queries: List[Dict] = None, switch: bool = True, gc: bool = True,
+                reembed_only: bool = False) -> Dict:
+    """
+    ✅ Полная переиндексация в новую коллекцию с проверкой и переключением.
+
+    Запускается в отдельном процессе (python -m hybrid_search.reindex или фоновый процесс при
+    FORCE_RELOAD / смене DENSE_MODEL): процесс закрепляет за собой новую коллекцию и не следует указателю.
+    reembed_only — новая коллекция строится перекодированием текущей моделью DENSE_MODEL.
+    """
+    from hybrid_search.database import Database
+    from hybrid_search.embed import Embed
+    from hybrid_search.manifest import IndexManifest
+    from hybrid_search.update import UpdateDatabase
+
+    started = time.perf_counter()
+    db = Database()
+    live = db.index_name
+    name = name or _pending_shadow(db.client, live) or new_collection_name()
+    if name == live:
+        raise RuntimeError(f"❌ {name} — активная коллекция: сборка только в новую")
+    source = reembed_source(name)  # прерванное перекодирование продолжается перекодированием
+    reembed_only = reembed_only or source is not None
+
+    logger.info("=" * 60)
+    logger.info(f"🔄 BLUE/GREEN {'ПЕРЕКОДИРОВАНИЕ' if reembed_only else 'ПЕРЕИНДЕКСАЦИЯ'}: {live} → {name} "
+                f"({db.embedding_model()} → {Config.DENSE_MODEL})")
+    logger.info("=" * 60)
+    if reembed_only and source is None:
+        copy_state(live, name)
+    pin_collection(name)
+    db.switch_collection(name)
+
+    updater = UpdateDatabase()
+    if reembed_only:
+        reembed(db, Embed(), source or live)
+        IndexManifest().finish_load()
+    else:
+        updater.load_all(resume=True)  # прерванная сборка этой коллекции продолжается с чекпоинта
+    caught_up = catch_up(updater, live, name)
+
+    report = validate(db, live, name, queries or [])
+    report['caught_up'] = caught_up
+    report['build_seconds'] = round(time.perf_counter() - started, 1)
+    if not report['ok']:
+        logger.error(f"❌ Коллекция {name} не прошла проверку: {'; '.join(report['failures'])} — "
+                     f"поиск остаётся на {live}")
+        return report
+
+    if switch:
+        set_active_collection(name)
+        report['switched'] = True
+        if gc:
+            report['removed'] = gc_collections(db.client)
+    logger.info(f"✅ Переиндексация завершена за {report['build_seconds']:.0f} сек: {report['shadow']}")
+    return report
+
+
+def _reindex_process(torch_threads: int, reembed_only: bool):
+    """Фоновый процесс переиндексации (FORCE_RELOAD при непустом индексе) или перекодирования (DENSE_MODEL)"""
+    from hybrid_search.scheduler import set_torch_threads
+
+    if torch_threads > 0:
+        os.environ['OMP_NUM_THREADS'] = str(torch_threads)
+        os.environ['MKL_NUM_THREADS'] = str(torch_threads)
+        set_torch_threads(torch_threads)
+    try:
+        run_reindex(queries=load_smoke_queries(Config.REINDEX_SMOKE_QUERIES), reembed_only=reembed_only)
+    except Exception as e:
+        logger.error(f"❌ Blue/green переиндексация прервана: {e} (повторный запуск продолжит сборку)")
+
+
+def start_background_reindex(reembed_only: bool = False):
+    """
+    ✅ Сборка новой коллекции в отдельном процессе: поиск в основном процессе не делит с ней
+    GIL и потоки torch, а переходит на новую коллекцию после переключения указателя.
+    """
+    ctx = multiprocessing.get_context('spawn')  # fork небезопасен для torch и потоков Chroma
+    process = ctx.Process(target=_reindex_process, args=(Config.INGEST_TORCH_THREADS, reembed_only),
+                          name="rag-reindex", daemon=True)
+    process.start()
+    logger.info(f"🚀 Blue/green {'перекодирование запущено' if reembed_only else 'переиндексация запущена'} "
+                f"в фоне (pid {process.pid})")
+    return process
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Blue/green переиндексация в новую коллекцию")
+    parser.add_argument('--name', help="Имя новой коллекции (по умолчанию <CHROMA_COLLECTION>_v<время>)")
+    parser.add_argument('--smoke-queries', default=Config.REINDEX_SMOKE_QUERIES,
+                        help="JSON со smoke-запросами (REINDEX_SMOKE_QUERIES)")
+    parser.add_argument('--no-switch', action='store_true', help="Только собрать и проверить")
+    parser.add_argument('--reembed', action='store_true',
+                        help="Перекодировать текущую коллекцию моделью DENSE_MODEL (без загрузки из Confluence)")
+    parser.add_argument('--keep', type=int, default=None, help="Сколько прежних версий оставить (REINDEX_KEEP_COLLECTIONS)")
+    parser.add_argument('--list', action='store_true', help="Показать версии коллекции")
+    parser.add_argument('--switch', metavar='NAME', help="Переключить указатель на существующую версию (откат)")
+    parser.add_argument('--gc', action='store_true', help="Только удалить старые версии")
+    parser.add_argument('--output', help="Куда сохранить JSON-отчёт")
+    args = parser.parse_args(argv)
+
+    if args.list or args.switch or args.gc:
+        from hybrid_search.database import Database
+        client = Database().client
+        if args.switch:
+            if args.switch not in {c['name'] for c in list_collections(client)}:
+                parser.error(f"коллекция {args.switch} не найдена")
+            set_active_collection(args.switch)
+        if args.gc:
+            gc_collections(client, args.keep)
+        report = {'collections': list_collections(client)}
+    else:
+        if args.keep is not None:
+            Config.REINDEX_KEEP_COLLECTIONS = args.keep
+        report = run_reindex(args.name, load_smoke_queries(args.smoke_queries), switch=not args.no_switch,
+                             reembed_only=args.reembed)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"💾 Отчёт сохранён: {args.output}")
+    return 0 if report.get('ok', True) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+# hybrid_search/rerank.py
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from hybrid_search.metrics import Tracer
+from hybrid_search.utils import logger, Config
+
+
+class RerankCache:
+    """LRU-кэш оценок cross-encoder: (хэш запроса, chunk_id, crc текста) → score"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def query_hash(query: str) -> str:
+        return hashlib.sha1(' '.join(query.lower().split()).encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def key(query_hash: str, chunk: Dict) -> Tuple[str, str, int]:
+        # crc текста: после синхронизации страницы тот же chunk_id не отдаёт старую оценку
+        return query_hash, chunk.get('id', ''), zlib.crc32(_chunk_text(chunk).encode('utf-8'))
+
+    def get(self, key) -> Optional[float]:
+        with self._lock:
+            score = self._items.get(key)
+            if score is not None:
+                self._items.move_to_end(key)
+            return score
+
+    def put(self, key, score: float):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._items[key] = score
+            self._items.move_to_end(key)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+def _chunk_text(chunk: Dict) -> str:
+    return chunk.get('text', chunk.get('content', ''))
+
+
+class AdaptiveReranker:
+    """
+    ✅ Rerank с ранним выходом и кэшем оценок.
+
+    Кандидаты оцениваются cross-encoder'ом мини-пакетами в порядке оценки первого этапа
+    (dense + sparse). Оценка прекращается, когда топ-K стабилен и оставшиеся кандидаты
+    не могут в него попасть:
+      • топ-K заполнен, не изменился на последнем пакете, а оценка первого этапа следующего
+        кандидата ниже, чем у самого слабого по первому этапу из топ-K, более чем на RERANK_EARLY_EXIT_MARGIN;
+      • или топ-K заполнен и RERANK_PATIENCE пакетов подряд его не изменили (хвост выдачи первого этапа пуст).
+    Пока топ-K не заполнен (часть кандидатов ниже RERANK_MIN_SCORE), оценка продолжается:
+    релевантные чанки могут стоять глубоко в выдаче первого этапа.
+
+    predict(pairs) → оценки 0..1 для пар [query, text].
+    """
+
+    def __init__(self, predict: Callable[[List[List[str]]], np.ndarray]):
+        self.predict = predict
+        self.cache = RerankCache(Config.RERANK_CACHE_SIZE)
+        self.tracer = Tracer()
+
+    def rerank(self, query: str, chunks: List[Dict], adaptive: bool = None) -> List[Dict]:
+        """Оценивает кандидатов, отсекает по RERANK_MIN_SCORE и возвращает топ RERANK_TOP_K"""
+        if not chunks:
+            return []
+        adaptive = Config.RERANK_ADAPTIVE if adaptive is None else adaptive
+        if adaptive:
+            scored = self._rerank_adaptive(query, chunks)
+        else:
+            scored = self._rerank_exhaustive(query, chunks)
+        return self._top(scored)
+
+    def _rerank_exhaustive(self, query: str, chunks: List[Dict]) -> List[Dict]:
+        """Все кандидаты одним вызовом, без кэша (прежнее поведение)"""
+        scores = self.predict([[query, _chunk_text(chunk)] for chunk in chunks])
+        for chunk, score in zip(chunks, scores):
+            chunk['rerank_score'] = float(score)
+        self.tracer.inc("rerank_pairs_scored", len(chunks))
+        return chunks
+
+    def _rerank_adaptive(self, query: str, chunks: List[Dict]) -> List[Dict]:
+        query_hash = RerankCache.query_hash(query)
+        ordered = sorted(chunks, key=lambda c: c.get('score', 0), reverse=True)
+        top_k = Config.RERANK_TOP_K
+        batch_size = max(1, Config.RERANK_BATCH_SIZE)
+
+        position = 0
+        stale_batches = 0
+        top_ids: List[str] = []
+        while position < len(ordered):
+            # Первый пакет — не меньше top_k: иначе топ заведомо не заполнится
+            size = max(batch_size, top_k) if position == 0 else batch_size
+            batch = ordered[position:position + size]
+            position += len(batch)
+            self._score_batch(query, query_hash, batch)
+
+            top = self._top(ordered[:position])
+            changed = [c['id'] for c in top] != top_ids
+            top_ids = [c['id'] for c in top]
+            full = len(top) == top_k
+            # Незаполненный топ не считается стабильным: пустой топ «не меняется» и на нерелевантной голове
+            stale_batches = stale_batches + 1 if full and not changed else 0
+
+            if position >= len(ordered) or not full:
+                continue
+            next_score = ordered[position].get('score', 0)
+            weakest = min(c.get('score', 0) for c in top)
+            if not changed and next_score < weakest - Config.RERANK_EARLY_EXIT_MARGIN:
+                break
+            if stale_batches >= Config.RERANK_PATIENCE:
+                break
+
+        skipped = len(ordered) - position
+        if skipped:
+            self.tracer.inc("rerank_early_exits")
+            self.tracer.inc("rerank_pairs_skipped", skipped)
+            logger.debug(f"⏭️  Rerank: ранний выход, оценено {position}/{len(ordered)}")
+        return ordered[:position]
+
+    def _score_batch(self, query: str, query_hash: str, batch: List[Dict]):
+        """Оценки пакета: из кэша, остальные — одним вызовом predict"""
+        misses = []
+        for chunk in batch:
+            key = RerankCache.key(query_hash, chunk)
+            score = self.cache.get(key)
+            if score is None:
+                misses.append((chunk, key))
+            else:
+                chunk['rerank_score'] = score
+
+        if len(misses) < len(batch):
+            self.tracer.inc("rerank_cache_hits", len(batch) - len(misses))
+        if not misses:
+            return
+
+        scores = self.predict([[query, _chunk_text(chunk)] for chunk, _ in misses])
+        for (chunk, key), score in zip(misses, scores):
+            chunk['rerank_score'] = float(score)
+            self.cache.put(key, float(score))
+        self.tracer.inc("rerank_pairs_scored", len(misses))
+
+    @staticmethod
+    def _top(chunks: List[Dict]) -> List[Dict]:
+        filtered = [c for c in chunks if c.get('rerank_score', 0) >= Config.RERANK_MIN_SCORE]
+        # При равных оценках cross-encoder — порядок первого этапа: полный и адаптивный rerank совпадают
+        return sorted(filtered, key=lambda x: (x.get('rerank_score', 0), x.get('score', 0)),
+                      reverse=True)[:Config.RERANK_TOP_K]
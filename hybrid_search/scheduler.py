@@ -0,0 +1,152 @@
+# hybrid_search/scheduler.py
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from hybrid_search.metrics import Tracer
+from hybrid_search.utils import singleton, logger, Config
+
+
+# Бюджет потоков torch, выставленный в этом процессе (None — ещё не задавался)
+_process_threads = None
+
+
+def set_torch_threads(num_threads: int):
+    """
+    Число intra-op потоков torch (ATen, MKL) для всего процесса (0 — не трогать).
+
+    Настройка глобальная, а не потоковая: поток синхронизации, поменяв её, замедлил бы и поиск.
+    Поэтому бюджет задаётся один раз на процесс — при старте воркера пула / процесса переиндексации
+    или при первом вызове модели поиска (serving_torch_threads).
+    """
+    global _process_threads
+    if num_threads <= 0:
+        return
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+        _process_threads = num_threads
+    except ImportError:
+        pass
+
+
+def serving_torch_threads(workers: int = None) -> int:
+    """Потоков torch на процесс поиска: SERVING_TORCH_THREADS или ядра поровну между процессами поиска"""
+    if Config.SERVING_TORCH_THREADS > 0:
+        return Config.SERVING_TORCH_THREADS
+    workers = workers or Config.QUERY_WORKERS or 1
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+@singleton
+class ModelScheduler:
+    """
+    ✅ Приоритетный доступ к моделям: поиск важнее фоновой индексации.
+
+    Вызовы моделей на пути запроса (encode, BM25, rerank) идут через foreground(),
+    пакеты эмбеддингов синхронизации — через background(). Фоновый пакет:
+      • не больше INGEST_MAX_CONCURRENT_BATCHES пакетов одновременно (на все пространства);
+      • ждёт, пока нет активных вызовов поиска (не дольше INGEST_MAX_WAIT_SECONDS);
+      • при живом трафике (вызовы поиска за последнюю минуту) — не чаще INGEST_MAX_BATCHES_PER_SEC пакетов в секунду;
+      • уступает дополнительно, если p95 недавних вызовов поиска выше INGEST_QUERY_LATENCY_TARGET_MS
+        (пауза растёт вдвое до INGEST_MAX_YIELD_SECONDS и сбрасывается, когда латентность в норме).
+    """
+
+    LATENCY_WINDOW_SECONDS = 60.0
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._active_queries = 0
+        self._latencies = deque(maxlen=512)  # (время завершения, длительность)
+        self._last_batch = 0.0
+        self._backoff = 0.0
+        # Общий бюджет эмбеддингов для всех потоков синхронизации (пространства идут параллельно)
+        self._batch_slots = threading.BoundedSemaphore(max(1, Config.INGEST_MAX_CONCURRENT_BATCHES))
+        self.tracer = Tracer()
+
+    # ===== Путь запроса =====
+
+    @contextmanager
+    def foreground(self):
+        """Вызов модели на пути запроса пользователя"""
+        if _process_threads is None:
+            # Поиск в основном процессе (QUERY_WORKERS=0): бюджет поиска, общий с синхронизацией
+            set_torch_threads(serving_torch_threads())
+        with self._cond:
+            self._active_queries += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            finished = time.perf_counter()
+            with self._cond:
+                self._active_queries -= 1
+                self._latencies.append((finished, finished - started))
+                if self._active_queries == 0:
+                    self._cond.notify_all()
+
+    # ===== Фоновая индексация =====
+
+    @contextmanager
+    def background(self):
+        """Пакет эмбеддингов фоновой индексации (уступает поиску)"""
+        started = time.perf_counter()
+        with self._batch_slots:
+            waited = self._wait_turn() + (time.perf_counter() - started)
+            if waited > 0.001:
+                self.tracer.observe("ingest_yield", waited)
+                self.tracer.inc("ingest_yields")
+            yield
+
+    def _wait_turn(self) -> float:
+        started = time.perf_counter()
+        p95 = self.query_latency_p95()
+
+        # Без живого трафика (первичная индексация) — полная скорость
+        if p95 == 0.0 and self._active_queries == 0:
+            self._last_batch = started
+            return 0.0
+
+        # 1. Rate limit фоновых пакетов
+        if Config.INGEST_MAX_BATCHES_PER_SEC > 0:
+            min_interval = 1.0 / Config.INGEST_MAX_BATCHES_PER_SEC
+            delay = self._last_batch + min_interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        # 2. Адаптивная пауза по латентности поиска
+        if p95 * 1000 > Config.INGEST_QUERY_LATENCY_TARGET_MS:
+            self._backoff = min(max(self._backoff * 2, 0.1), Config.INGEST_MAX_YIELD_SECONDS)
+            logger.debug(f"⏸️  Индексация уступает поиску: p95={p95 * 1000:.0f} мс, пауза {self._backoff:.1f} сек")
+            time.sleep(self._backoff)
+        else:
+            self._backoff = 0.0
+
+        # 3. Ждём, пока завершатся активные вызовы поиска
+        deadline = time.perf_counter() + Config.INGEST_MAX_WAIT_SECONDS
+        with self._cond:
+            while self._active_queries > 0:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break  # Не даём индексации голодать бесконечно
+                self._cond.wait(remaining)
+
+        self._last_batch = time.perf_counter()
+        return self._last_batch - started
+
+    # ===== Состояние =====
+
+    def query_latency_p95(self) -> float:
+        """p95 длительности вызовов моделей поиска за последнюю минуту (сек)"""
+        horizon = time.perf_counter() - self.LATENCY_WINDOW_SECONDS
+        with self._cond:
+            recent = sorted(d for t, d in self._latencies if t >= horizon)
+        if not recent:
+            return 0.0
+        return recent[min(len(recent) - 1, int(0.95 * len(recent)))]
+
+    @property
+    def active_queries(self) -> int:
+        return self._active_queries
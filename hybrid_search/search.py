@@ -1,9 +1,18 @@
 # hybrid_search/search.py
-from hybrid_search.database import Database
+from hybrid_search.database import Database, ChunkVectors
+from hybrid_search.diversity import select_context
 from hybrid_search.embed import Embed
+from hybrid_search.expansion import QueryExpander, fuse_candidates
+from hybrid_search.filters import SearchFilters
+from hybrid_search.metrics import Tracer
+from hybrid_search.querylog import QueryLog
+from hybrid_search.scheduler import ModelScheduler
 from hybrid_search.utils import singleton, logger, Config
-from typing import Dict, List
+from hybrid_search.warmup import QueryWarmup
+from typing import Dict, List, Optional, Tuple
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import time
 
 
 @singleton
@@ -11,42 +20,123 @@ class SemanticSearch:
     def __init__(self):
         self.db = Database()
         self.embedder = Embed()
+        self.tracer = Tracer()
+        self.scheduler = ModelScheduler()
+        self.warmup = QueryWarmup() if Config.WARMUP_ENABLED else None
+        self.query_log = QueryLog()
+        self.expander = QueryExpander()
+        self._fanout_pool = None
         logger.info("✅ SemanticSearch инициализирован")
 
-    def search(self, query: str, n_results: int = None) -> Dict:
-        """✅ УЛУЧШЕННЫЙ поиск с группировкой по документам"""
+    def search(self, query: str, n_results: int = None, spaces: Optional[List[str]] = None,
+               filters: Optional[SearchFilters] = None, warmup: bool = True, expand: bool = True) -> Dict:
+        """
+        ✅ УЛУЧШЕННЫЙ поиск с группировкой по документам.
+
+        spaces / filters (метки, дата обновления) передаются в where ChromaDB —
+        кандидаты отбираются до HNSW и rerank, а не отсеиваются после.
+        Для частых запросов (hybrid_search/warmup.py) векторы и результат берутся из кэша прогрева;
+        warmup=False — полный пайплайн (замеры прогрева).
+        QUERY_EXPANSION — поиск ещё и по перефразировкам / гипотетическому ответу (hybrid_search/expansion.py),
+        expand=False — только по исходному запросу.
+        """
+        n_results = n_results or Config.RETRIEVAL_TOP_K
+        filters = SearchFilters.merge(filters, spaces)
+        started, begin = time.time(), time.perf_counter()
+        with self.tracer.trace("search_total") as trace:
+            result = self._search(query, n_results, filters, warmup, expand)
+        if self.query_log.enabled:
+            own_trace = trace if trace['name'] == "search_total" else None  # вложенный вызов — стадии в чужой трассе
+            self.query_log.log_search(own_trace, started, time.perf_counter() - begin, query, n_results, filters, result)
+        return result
+
+    def _search(self, query: str, n_results: int, filters: SearchFilters, warmup: bool, expand: bool) -> Dict:
         try:
-            n_results = n_results or Config.RETRIEVAL_TOP_K
+            where = filters.to_where()
+            if where:
+                logger.info(f"🔎 Фильтры: {filters.describe()}")
+                self.tracer.annotate(filtered=True)
+
+            model = self.db.embedding_model()  # запрос кодируется моделью коллекции
+            self.embedder.use_bm25(self.db.index_name)  # и её корпусом BM25
+
+            warm = self.warmup.lookup(query) if warmup and self.warmup else None
+            if warm is not None and not where and n_results == Config.RETRIEVAL_TOP_K:
+                cached = self.warmup.cached_result(warm, self.embedder)
+                if cached is not None:
+                    self.tracer.inc("warmup_result_hits")
+                    self.tracer.annotate(warm_cache=True)
+                    return cached
+
+            # Векторы кандидатов для MMR приходят вместе с кандидатами (без повторного кодирования)
+            with_vectors = Config.MMR_ENABLED
+            vectors = None
+            variants, source = [], 'off'
+            if expand and self.expander.mode() != 'off':
+                with self.tracer.span("query_expand"):
+                    variants, source = self.expander.expand(query)
 
             # 1. Dense + Sparse поиск (берём больше кандидатов)
-            dense_vector = self.embedder.embed_text(query)
-            sparse_vector = self.embedder.embed_sparse(query)
+            if variants:
+                self.tracer.annotate(expansion=source, variants=len(variants))
+                dense_vector, sparse_vector, candidates, vectors = self._expanded_search(
+                    query, variants, n_results, where, model, with_vectors)
+            else:
+                if warm is not None:
+                    dense_vector, sparse_vector = self.warmup.vectors(warm, self.embedder, model)
+                    self.tracer.inc("warmup_vector_hits")
+                else:
+                    with self.tracer.span("query_encode"), self.scheduler.foreground():
+                        dense_vector = self.embedder.embed_text(query, model)
+                    with self.tracer.span("bm25_score"):
+                        sparse_vector = self.embedder.embed_sparse(query)
 
-            candidates = self.db.search(
-                dense_vector,
-                sparse_vector,
-                n_results=n_results * 2  # Больше кандидатов для фильтрации
-            )
+                started = time.perf_counter()
+                with self.tracer.span("chroma_query"):
+                    candidates = self.db.search(
+                        dense_vector,
+                        sparse_vector,
+                        n_results=n_results * 2,  # Больше кандидатов для фильтрации
+                        where=where,
+                        with_vectors=with_vectors
+                    )
+                if with_vectors:
+                    candidates, vectors = candidates
+                self.expander.record_search_cost(time.perf_counter() - started)
 
             if not candidates:
-                return {'matches': [], 'query': query}
+                return {'matches': [], 'query': query, 'filters': filters.describe()}
 
             # 2. RERANK ПЕРЕД расширением (фильтруем шум раньше)
-            reranked = self.embedder.rerank(query, candidates)
+            with self.tracer.span("rerank"), self.scheduler.foreground():
+                reranked = self.embedder.rerank(query, candidates)
 
             # 3. РУППИРОВКА по документам (page_id)
             grouped = self._group_by_document(reranked)
 
             # 4. ДИНАМИЧЕСКОЕ расширение контекста
-            expanded = self._expand_with_smart_neighbors(
-                grouped,
-                query,
-                dense_vector,
-                sparse_vector
-            )
+            with self.tracer.span("neighbor_expansion"):
+                expanded, neighbor_vectors = self._expand_with_smart_neighbors(
+                    grouped,
+                    query,
+                    dense_vector,
+                    sparse_vector,
+                    with_vectors
+                )
 
-            # 5. ФИНАЛЬНЫЙ отбор топ-K
-            final_matches = expanded[:Config.RERANK_TOP_K]
+            # 5. ФИНАЛЬНЫЙ отбор топ-K (MMR — разнообразные чанки в пределах бюджета токенов)
+            if Config.MMR_ENABLED:
+                with self.tracer.span("mmr_select"):
+                    ids = [chunk['id'] for chunk in expanded]
+                    stored = ChunkVectors.concat([vectors, neighbor_vectors])
+                    if all(chunk_id in stored for chunk_id in ids):
+                        matrix = stored.take(ids)
+                    else:
+                        matrix = self.db.get_embeddings(ids)  # страховка: векторы не пришли вместе с чанками
+                        self.tracer.inc("mmr_vector_fetches")
+                    final_matches = select_context(expanded, matrix)
+            else:
+                final_matches = expanded[:Config.RERANK_TOP_K]
 
             logger.info(
                 f"📊 Поиск: {len(candidates)} кандидатов → "
@@ -54,13 +144,47 @@ class SemanticSearch:
                 f"{len(grouped)} документов → "
                 f"{len(final_matches)} финальных чанков"
             )
+            self.tracer.annotate(candidates=len(candidates), matches=len(final_matches))
 
-            return {'matches': final_matches, 'query': query}
+            return {'matches': final_matches, 'query': query, 'filters': filters.describe()}
 
         except Exception as e:
             logger.error(f"❌ Ошибка поиска: {e}")
+            self.tracer.inc("search_errors")
             return {'matches': [], 'query': query, 'error': str(e)}
 
+    def _expanded_search(self, query: str, variants: List[str], n_results: int, where: Optional[Dict], model: str,
+                         with_vectors: bool = False):
+        """
+        ✅ Запрос + варианты: векторы одним батчем, поиски параллельно, слияние RRF до rerank.
+        Кандидатов после слияния столько же, сколько у поиска по одному вектору — rerank не дорожает.
+        with_vectors — сохранённые векторы кандидатов всех поисков (ChunkVectors), иначе None.
+        """
+        texts = [query] + variants
+        with self.tracer.span("query_encode"), self.scheduler.foreground():
+            dense_vectors = self.embedder.embed_queries_batch(texts, model)
+        with self.tracer.span("bm25_score"):
+            sparse_vectors = self.embedder.embed_sparse_batch(texts)
+
+        if self._fanout_pool is None:
+            self._fanout_pool = ThreadPoolExecutor(max_workers=max(1, Config.QUERY_EXPANSION_WORKERS),
+                                                   thread_name_prefix="fanout")
+        started = time.perf_counter()
+        with self.tracer.span("chroma_query"):
+            result_lists = list(self._fanout_pool.map(
+                lambda pair: self.db.search(pair[0], pair[1], n_results=n_results * 2, where=where,
+                                            with_vectors=with_vectors),
+                zip(dense_vectors, sparse_vectors)))
+        self.expander.record_search_cost(time.perf_counter() - started)
+        vectors = None
+        if with_vectors:
+            vectors = ChunkVectors.concat([block for _, block in result_lists])
+            result_lists = [results for results, _ in result_lists]
+
+        candidates = fuse_candidates(result_lists, limit=max(len(results) for results in result_lists))
+        logger.info(f"🔀 Расширение запроса: {len(variants)} вариантов → {len(candidates)} кандидатов после слияния")
+        return dense_vectors[0], sparse_vectors[0], candidates, vectors
+
     def _group_by_document(self, chunks: List[Dict]) -> Dict[str, List[Dict]]:
         """✅ Группирует чанки по document_id (page_id)"""
         grouped = defaultdict(list)
@@ -91,9 +215,13 @@ class SemanticSearch:
             grouped: Dict[str, List[Dict]],
             query: str,
             dense_vector: list,
-            sparse_vector: dict
-    ) -> List[Dict]:
-        """✅ расширение контекста с приоритетом релевантных документов и ограничением чанков на документ"""
+            sparse_vector: dict,
+            with_vectors: bool = False
+    ) -> Tuple[List[Dict], Optional[ChunkVectors]]:
+        """
+        ✅ расширение контекста с приоритетом релевантных документов и ограничением чанков на документ.
+        Возвращает (чанки, сохранённые векторы добавленных соседей — при with_vectors, иначе None).
+        """
         expanded = []
         seen_ids = set()
 
@@ -101,6 +229,7 @@ class SemanticSearch:
         max_chunks_per_doc = Config.MAX_CHUNKS_PER_DOC
 
         # ✅ Сначала добавляем ограниченное число лучших чанков из топ-документов
+        selected = []  # (чанк, окно расширения)
         for page_id, doc_chunks in list(grouped.items())[:5]:  # Топ-5 документов
             # Сортируем чанки документа по убыванию релевантности
             sorted_chunks = sorted(
@@ -126,18 +255,35 @@ class SemanticSearch:
                 window = 2
             else:
                 window = 1
+            selected.extend((chunk, window) for chunk in top_chunks)
 
-            # Расширяем соседями только для выбранных чанков (не для всех в документе)
-            for chunk in top_chunks:
-                neighbors = self.db.get_neighbors(chunk['id'], window=window)
-                for neighbor in neighbors:
-                    if neighbor['id'] not in seen_ids:
-                        # Сохраняем оценку родительского чанка (с понижающим коэффициентом)
-                        neighbor['score'] = chunk.get('rerank_score',
-                                                      chunk.get('score', 0)) * Config.SEARCH_NEIGHBOR_SCORE_MULTIPLIER
-                        neighbor['rerank_score'] = neighbor['score']
-                        expanded.append(neighbor)
-                        seen_ids.add(neighbor['id'])
+        # Расширяем соседями только выбранные чанки (не все в документе)
+        blocks = []
+        if Config.PARENT_WINDOW > 0:
+            # ✅ Родительские фрагменты, записанные при индексации: одно чтение на запрос
+            parents = self.db.get_parent_chunks([chunk for chunk, _ in selected], with_vectors=with_vectors)
+            if with_vectors:
+                parents, block = parents
+                blocks.append(block)
+            neighbor_lists = [parents.get(chunk['id'], []) for chunk, _ in selected]
+        else:
+            neighbor_lists = []
+            for chunk, window in selected:
+                neighbors = self.db.get_neighbors(chunk['id'], window=window, with_vectors=with_vectors)
+                if with_vectors:
+                    neighbors, block = neighbors
+                    blocks.append(block)
+                neighbor_lists.append(neighbors)
+
+        for (chunk, _), neighbors in zip(selected, neighbor_lists):
+            for neighbor in neighbors:
+                if neighbor['id'] not in seen_ids:
+                    # Сохраняем оценку родительского чанка (с понижающим коэффициентом)
+                    neighbor['score'] = chunk.get('rerank_score',
+                                                  chunk.get('score', 0)) * Config.SEARCH_NEIGHBOR_SCORE_MULTIPLIER
+                    neighbor['rerank_score'] = neighbor['score']
+                    expanded.append(neighbor)
+                    seen_ids.add(neighbor['id'])
 
         # Сортировка по score (rerank_score приоритет)
         expanded = sorted(
@@ -147,4 +293,4 @@ class SemanticSearch:
         )
 
         logger.info(f"🔗 После расширения: {len(expanded)} чанков")
-        return expanded
+        return expanded, (ChunkVectors.concat(blocks) if with_vectors else None)
@@ -0,0 +1,318 @@
+# hybrid_search/snapshot.py
+"""
+Снимок индекса и быстрое восстановление (новые реплики без переиндексации Confluence).
+
+Бандл — один tar-файл:
+    snapshot.json             формат, коллекция, схема хранения, размерность, sha256 частей
+    embeddings.npy            float32 (n, dim), порядок = records
+    records.jsonl.gz          [id, document, metadata] по строке на чанк
+    page_store.sqlite3        метаданные страниц, sparse-векторы, родительские фрагменты (slim-схема)
+    index_manifest.sqlite3    страницы и версии (манифест индексации)
+    bm25.pickle               модель BM25 коллекции (индексы sparse-векторов — номера её документов)
+    watermarks.json           update_time:[<коллекция>:]<page_id> из Redis — отметки синхронизации
+
+    python -m hybrid_search.snapshot export /backups/index.snapshot
+    python -m hybrid_search.snapshot restore /backups/index.snapshot --workers 8
+"""
+import argparse
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tarfile
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict
+
+import numpy as np
+
+from hybrid_search.alias import watermark_key
+from hybrid_search.bm25 import bm25_path
+from hybrid_search.utils import logger, Config, get_redis_client
+
+FORMAT_VERSION = 1
+EXPORT_BATCH = 1000
+
+
+class SnapshotLock:
+    """
+    ✅ Межпроцессная блокировка записи индекса (flock рядом с ChromaDB).
+
+    Индексация страницы берёт разделяемую блокировку (писатели не мешают друг другу),
+    экспорт — эксклюзивную: дожидается записываемых страниц и не пускает новые,
+    поэтому снимок согласован на момент начала экспорта.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(Config.CHROMA_DB_PATH, '.snapshot.lock')
+
+    @contextmanager
+    def _locked(self, mode: int):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a') as handle:
+            fcntl.flock(handle, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def shared(self):
+        return self._locked(fcntl.LOCK_SH)
+
+    def exclusive(self):
+        return self._locked(fcntl.LOCK_EX)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _backup_sqlite(source: str, target: str):
+    """Согласованная копия SQLite (backup API, работает при открытых соединениях)"""
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def _merge_sqlite(target: str, source: str, tables: tuple):
+    """Переносит строки таблиц из снимка в рабочую базу (файл может быть открыт синглтонами)"""
+    conn = sqlite3.connect(target)
+    try:
+        conn.execute("ATTACH DATABASE ? AS snap", (source,))
+        present = {row[0] for row in conn.execute("SELECT name FROM snap.sqlite_master WHERE type = 'table'")}
+        for table in tables:
+            if table not in present:  # снимок старой версии: таблицы ещё не было
+                continue
+            conn.execute(f"INSERT OR REPLACE INTO main.{table} SELECT * FROM snap.{table}")
+        conn.commit()
+        conn.execute("DETACH DATABASE snap")
+    finally:
+        conn.close()
+
+
+def export_snapshot(path: str, include_watermarks: bool = True) -> Dict:
+    """Экспорт индекса в бандл; возвращает содержимое snapshot.json"""
+    from hybrid_search.database import Database
+    from hybrid_search.manifest import IndexManifest
+
+    db = Database()
+    manifest = IndexManifest()
+    started = time.perf_counter()
+    workdir = tempfile.mkdtemp(prefix='snapshot_', dir=os.path.dirname(os.path.abspath(path)) or None)
+    try:
+        with SnapshotLock().exclusive():
+            logger.info("📸 Снимок индекса: запись заблокирована")
+            count = db.count()
+            sample = db.collection.get(limit=1, include=['embeddings'])
+            dim = len(sample['embeddings'][0]) if sample['ids'] else 0
+
+            embeddings = np.lib.format.open_memmap(
+                os.path.join(workdir, 'embeddings.npy'), mode='w+', dtype=np.float32, shape=(count, dim))
+            written = 0
+            with gzip.open(os.path.join(workdir, 'records.jsonl.gz'), 'wt', encoding='utf-8', compresslevel=6) as out:
+                while written < count:
+                    batch = db.collection.get(limit=EXPORT_BATCH, offset=written,
+                                              include=['embeddings', 'documents', 'metadatas'])
+                    if not batch['ids']:
+                        break
+                    n = len(batch['ids'])
+                    embeddings[written:written + n] = np.asarray(batch['embeddings'], dtype=np.float32)
+                    for chunk_id, document, metadata in zip(batch['ids'], batch['documents'], batch['metadatas']):
+                        out.write(json.dumps([chunk_id, document, metadata], ensure_ascii=False) + '\n')
+                    written += n
+                    logger.info(f"📸 Экспорт: {written}/{count} чанков")
+            embeddings.flush()
+            del embeddings
+
+            _backup_sqlite(db.page_store.path, os.path.join(workdir, 'page_store.sqlite3'))
+            _backup_sqlite(manifest.path, os.path.join(workdir, 'index_manifest.sqlite3'))
+            has_bm25 = os.path.exists(bm25_path(db.index_name))
+            if has_bm25:
+                shutil.copyfile(bm25_path(db.index_name), os.path.join(workdir, 'bm25.pickle'))
+            else:
+                logger.warning(f"⚠️  Нет сохранённого BM25 коллекции {db.index_name}: снимок без sparse-модели")
+
+            watermarks = {}
+            if include_watermarks:
+                try:
+                    redis = get_redis_client()
+                    prefix = watermark_key(db.index_name, '')
+                    for key in redis.scan_iter(match=prefix + '*', count=1000):
+                        if ':' not in key[len(prefix):]:  # только отметки этой коллекции, не её версий
+                            watermarks[key] = [redis.get(key), redis.ttl(key)]
+                except Exception as e:
+                    logger.warning(f"⚠️  Отметки синхронизации из Redis не сохранены: {e}")
+            with open(os.path.join(workdir, 'watermarks.json'), 'w', encoding='utf-8') as f:
+                json.dump(watermarks, f, ensure_ascii=False)
+
+        members = ['embeddings.npy', 'records.jsonl.gz', 'page_store.sqlite3',
+                   'index_manifest.sqlite3', 'watermarks.json'] + (['bm25.pickle'] if has_bm25 else [])
+        info = {
+            'format': FORMAT_VERSION,
+            'created_at': time.time(),
+            'collection': db.index_name,
+            'storage_schema': db.schema,
+            'embedding_model': db.embedding_model(),
+            'chunks': written,
+            'dim': dim,
+            'pages': manifest.page_count(),
+            'watermarks': len(watermarks),
+            'sha256': {name: _sha256(os.path.join(workdir, name)) for name in members},
+        }
+        with open(os.path.join(workdir, 'snapshot.json'), 'w', encoding='utf-8') as f:
+            json.dump(info, f, ensure_ascii=False, indent=2)
+
+        tmp_path = path + '.tmp'
+        with tarfile.open(tmp_path, 'w') as tar:
+            for name in ['snapshot.json'] + members:
+                tar.add(os.path.join(workdir, name), arcname=name)
+        os.replace(tmp_path, path)  # атомарно: неполный бандл не подменит прошлый снимок
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    size_mb = os.path.getsize(path) / 2 ** 20
+    logger.info(
+        f"✅ Снимок {path}: {info['chunks']} чанков, {info['pages']} страниц, {size_mb:.1f} МБ "
+        f"за {time.perf_counter() - started:.1f} сек")
+    return info
+
+
+def restore_snapshot(path: str, workers: int = None, force: bool = False,
+                     restore_watermarks: bool = True) -> Dict:
+    """Параллельный импорт бандла в пустую коллекцию (force — очистить существующую)"""
+    from hybrid_search.database import Database, LEGACY_DENSE_MODEL
+    from hybrid_search.manifest import IndexManifest
+
+    workers = workers or Config.SNAPSHOT_RESTORE_WORKERS
+    started = time.perf_counter()
+    db = Database()
+    if db.count():
+        if not force:
+            raise RuntimeError(f"❌ Коллекция не пуста ({db.count()} чанков): восстановление только с --force")
+        db.clear_all()
+        IndexManifest().reset()
+
+    workdir = tempfile.mkdtemp(prefix='restore_', dir=Config.CHROMA_DB_PATH)
+    try:
+        with tarfile.open(path, 'r') as tar:
+            tar.extractall(workdir, filter='data')
+        with open(os.path.join(workdir, 'snapshot.json'), encoding='utf-8') as f:
+            info = json.load(f)
+        if info.get('format') != FORMAT_VERSION:
+            raise RuntimeError(f"❌ Неподдерживаемый формат снимка: {info.get('format')}")
+        for name, digest in info['sha256'].items():
+            if _sha256(os.path.join(workdir, name)) != digest:
+                raise RuntimeError(f"❌ Снимок повреждён: {name}")
+
+        # Векторы снимка — в пространстве его модели: коллекция ищется ею (DENSE_MODEL — перекодированием)
+        model = info.get('embedding_model', LEGACY_DENSE_MODEL)
+        if model != db.embedding_model():
+            db.set_embedding_model(model)
+
+        # Схема хранения и данные PageStore (с родительскими фрагментами PARENT_WINDOW) — до записи чанков
+        _merge_sqlite(db.page_store.path, os.path.join(workdir, 'page_store.sqlite3'),
+                      ('pages', 'sparse', 'parents', 'state'))
+        db.schema = info['storage_schema']
+
+        embeddings = np.load(os.path.join(workdir, 'embeddings.npy'), mmap_mode='r')
+
+        def add_batch(offset: int, rows: list):
+            db.collection.add(
+                ids=[row[0] for row in rows],
+                embeddings=np.ascontiguousarray(embeddings[offset:offset + len(rows)]),
+                documents=[row[1] for row in rows],
+                metadatas=[row[2] or None for row in rows],
+            )
+            return len(rows)
+
+        restored = 0
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="restore") as pool:
+            futures = []
+            with gzip.open(os.path.join(workdir, 'records.jsonl.gz'), 'rt', encoding='utf-8') as records:
+                rows, offset = [], 0
+                for line in records:
+                    rows.append(json.loads(line))
+                    if len(rows) == EXPORT_BATCH:
+                        futures.append(pool.submit(add_batch, offset, rows))
+                        offset += len(rows)
+                        rows = []
+                if rows:
+                    futures.append(pool.submit(add_batch, offset, rows))
+            for future in futures:
+                restored += future.result()
+                if restored % (EXPORT_BATCH * 10) == 0 or restored == info['chunks']:
+                    logger.info(f"📦 Восстановление: {restored}/{info['chunks']} чанков")
+        del embeddings
+
+        manifest = IndexManifest()
+        _merge_sqlite(manifest.path, os.path.join(workdir, 'index_manifest.sqlite3'), ('pages', 'state'))
+
+        # Модель BM25 — вместе с sparse-векторами PageStore (как reindex.copy_state); процессы поиска
+        # подхватят её в Embed.use_bm25
+        if 'bm25.pickle' in info['sha256']:
+            target = bm25_path(db.index_name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(os.path.join(workdir, 'bm25.pickle'), target + '.tmp')
+            os.replace(target + '.tmp', target)
+
+        if restore_watermarks:
+            with open(os.path.join(workdir, 'watermarks.json'), encoding='utf-8') as f:
+                watermarks = json.load(f)
+            if watermarks:
+                redis = get_redis_client()
+                pipe = redis.pipeline()
+                for key, (value, ttl) in watermarks.items():
+                    if value is not None:
+                        # Отметки — в пространство ключей коллекции, в которую восстанавливаем
+                        pipe.set(watermark_key(db.index_name, key.rsplit(':', 1)[-1]), value,
+                                 ex=ttl if ttl and ttl > 0 else None)
+                pipe.execute()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if db.count() != info['chunks']:
+        raise RuntimeError(f"❌ Восстановлено {db.count()} чанков из {info['chunks']}")
+    logger.info(
+        f"✅ Индекс восстановлен из {path}: {info['chunks']} чанков, {info['pages']} страниц "
+        f"за {time.perf_counter() - started:.1f} сек ({workers} потоков)")
+    return info
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Снимок индекса и восстановление")
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help="Экспорт индекса в бандл")
+    export.add_argument('path')
+    export.add_argument('--no-watermarks', action='store_true', help="Не сохранять отметки синхронизации из Redis")
+    restore = sub.add_parser('restore', help="Восстановление индекса из бандла")
+    restore.add_argument('path')
+    restore.add_argument('--workers', type=int, default=None, help="Потоков импорта (SNAPSHOT_RESTORE_WORKERS)")
+    restore.add_argument('--force', action='store_true', help="Очистить непустую коллекцию")
+    restore.add_argument('--no-watermarks', action='store_true', help="Не восстанавливать отметки в Redis")
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        info = export_snapshot(args.path, include_watermarks=not args.no_watermarks)
+    else:
+        info = restore_snapshot(args.path, workers=args.workers, force=args.force,
+                                restore_watermarks=not args.no_watermarks)
+    print(json.dumps({k: v for k, v in info.items() if k != 'sha256'}, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
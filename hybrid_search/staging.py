@@ -0,0 +1,101 @@
+# hybrid_search/staging.py
+import json
+import os
+import sqlite3
+import zlib
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from hybrid_search.utils import logger, Config
+
+# Коммит пачками — fsync на каждую страницу заметно тормозит сбор
+COMMIT_EVERY = 100
+
+
+class StagingStore:
+    """
+    ✅ Дисковый буфер полной загрузки: тексты страниц (zlib) + метаданные в SQLite.
+
+    Тексты не держатся в памяти между сбором и индексацией, а при перезапуске
+    прерванной загрузки уже скачанные страницы (той же версии) не запрашиваются повторно.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or Config.STAGING_PATH or os.path.join(Config.CHROMA_DB_PATH, 'staging.sqlite3')
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                page_id  TEXT PRIMARY KEY,
+                seq      INTEGER NOT NULL,
+                version  TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                text     BLOB NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pages_seq ON pages (seq)")
+        self._conn.commit()
+        self._pending = 0
+
+    def put(self, page_id: str, seq: int, version, text: str, metadata: Dict):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO pages (page_id, seq, version, metadata, text) VALUES (?, ?, ?, ?, ?)",
+            (str(page_id), seq, str(version), json.dumps(metadata, ensure_ascii=False),
+             zlib.compress(text.encode('utf-8'), 6))
+        )
+        self._maybe_commit()
+
+    def set_seq(self, page_id: str, seq: int):
+        """Обновляет порядок уже сохранённой страницы (порядок корпуса BM25)"""
+        self._conn.execute("UPDATE pages SET seq = ? WHERE page_id = ?", (seq, str(page_id)))
+        self._maybe_commit()
+
+    def staged_version(self, page_id: str) -> Optional[str]:
+        row = self._conn.execute("SELECT version FROM pages WHERE page_id = ?", (str(page_id),)).fetchone()
+        return row[0] if row else None
+
+    def retain(self, page_ids: Iterable[str]):
+        """Удаляет страницы, которых больше нет в пространстве"""
+        keep = {str(p) for p in page_ids}
+        stale = [row[0] for row in self._conn.execute("SELECT page_id FROM pages") if row[0] not in keep]
+        if stale:
+            self._conn.executemany("DELETE FROM pages WHERE page_id = ?", [(p,) for p in stale])
+            logger.info(f"🧹 Staging: удалено {len(stale)} устаревших страниц")
+        self.commit()
+
+    def iter_pages(self) -> Iterator[Tuple[str, str, str, Dict]]:
+        """(page_id, version, text, metadata) в порядке seq — по одной странице, без загрузки всего корпуса"""
+        self.commit()
+        cursor = self._conn.execute("SELECT page_id, version, text, metadata FROM pages ORDER BY seq")
+        while True:
+            rows = cursor.fetchmany(64)
+            if not rows:
+                break
+            for page_id, version, blob, metadata in rows:
+                yield page_id, version, zlib.decompress(blob).decode('utf-8'), json.loads(metadata)
+
+    def iter_texts(self) -> Iterator[str]:
+        for _, _, text, _ in self.iter_pages():
+            yield text
+
+    def count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def size_bytes(self) -> int:
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def commit(self):
+        self._conn.commit()
+        self._pending = 0
+
+    def _maybe_commit(self):
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.commit()
+
+    def remove(self):
+        """Удаляет staging после успешной загрузки"""
+        self._conn.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
@@ -0,0 +1,165 @@
+# hybrid_search/startup.py
+import importlib
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, List, Optional
+
+from hybrid_search.utils import singleton, logger, Config
+
+# Точка отсчёта таймлайна — импорт модуля (происходит в самом начале запуска)
+_PROCESS_T0 = time.perf_counter()
+
+
+def timed_import(module_name: str) -> float:
+    """Импортирует модуль и возвращает время импорта (0.0, если он уже был загружен)"""
+    if module_name in sys.modules:
+        return 0.0
+    started = time.perf_counter()
+    importlib.import_module(module_name)
+    return time.perf_counter() - started
+
+
+@singleton
+class StartupManager:
+    """
+    ✅ Быстрый старт: параллельная загрузка компонентов и отслеживание готовности.
+
+    Chroma, модели Embed и проверка Ollama загружаются в фоновых потоках одновременно.
+    Сервис считается готовым, когда загружены критичные компоненты (chroma, embed).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures: Dict[str, Future] = {}
+        self._timeline: List[dict] = []
+        self._critical = set()
+        self._ready_event = threading.Event()
+        self._executor = None
+        self.started = False
+
+    def start(self):
+        """Запускает загрузку компонентов в фоне (не блокирует)"""
+        with self._lock:
+            if self.started:
+                return
+            self.started = True
+
+        logger.info("⚡ FAST_START: параллельная загрузка компонентов...")
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="startup")
+
+        self._submit("chroma", self._open_chroma, critical=True)
+        self._submit("embed", self._load_embed, critical=True)
+        self._submit("ollama", self._check_ollama, critical=False)
+        if Config.TELEGRAM_ENABLED:
+            self._submit("telegram", self._import_telegram, critical=False)
+
+        threading.Thread(target=self._await_critical, daemon=True).start()
+
+    # ===== Компоненты =====
+
+    def _open_chroma(self):
+        self._record_import("chromadb")
+        from hybrid_search.database import Database
+        Database()
+
+    def _load_embed(self):
+        from hybrid_search.embed import Embed, configure_model_cache
+        configure_model_cache()  # HF_HOME / HF_HUB_OFFLINE — до импорта huggingface_hub
+        self._record_import("sentence_transformers")
+        Embed()
+
+    def _check_ollama(self):
+        self._record_import("ollama")
+        from rag_llm.model import Model
+        llm = Model()
+        if not llm.check_model_available():
+            logger.warning(f"⚠️  Модель {llm.model_name} не найдена в Ollama!")
+
+    def _import_telegram(self):
+        self._record_import("telegram")
+
+    # ===== Инфраструктура =====
+
+    def _record_import(self, module_name: str):
+        seconds = timed_import(module_name)
+        if seconds:
+            logger.info(f"📦 import {module_name}: {seconds:.2f} сек")
+            self._add_event(f"import:{module_name}", seconds, ok=True)
+
+    def _submit(self, name: str, fn: Callable, critical: bool):
+        if critical:
+            self._critical.add(name)
+        self._futures[name] = self._executor.submit(self._run, name, fn)
+
+    def _run(self, name: str, fn: Callable):
+        started = time.perf_counter()
+        try:
+            result = fn()
+            self._add_event(name, time.perf_counter() - started, ok=True, started=started)
+            return result
+        except Exception as e:
+            self._add_event(name, time.perf_counter() - started, ok=False, started=started, error=str(e))
+            logger.error(f"❌ Ошибка загрузки компонента {name}: {e}")
+            raise
+
+    def _add_event(self, name: str, seconds: float, ok: bool, started: float = None, error: str = None):
+        start_offset = (started if started is not None else time.perf_counter() - seconds) - _PROCESS_T0
+        with self._lock:
+            self._timeline.append({
+                'component': name,
+                'start': round(start_offset, 3),
+                'duration': round(seconds, 3),
+                'ok': ok,
+                'error': error
+            })
+
+    def _await_critical(self):
+        for name in self._critical:
+            try:
+                self._futures[name].result()
+            except Exception:
+                logger.error(f"❌ Критичный компонент {name} не загружен — сервис не готов")
+                self.log_timeline()
+                return
+        self._ready_event.set()
+        logger.info(f"✅ Сервис готов через {time.perf_counter() - _PROCESS_T0:.2f} сек после старта")
+        self.log_timeline()
+
+    # ===== Публичный API =====
+
+    def wait_for(self, name: str, timeout: Optional[float] = None):
+        """Ждёт загрузки компонента (исключения компонента пробрасываются)"""
+        future = self._futures.get(name)
+        if future is not None:
+            return future.result(timeout=timeout)
+        return None
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready_event.wait(timeout)
+
+    def is_ready(self) -> bool:
+        """Готов, если загружены критичные компоненты (без FAST_START — всегда True)"""
+        return not self.started or self._ready_event.is_set()
+
+    def status(self) -> dict:
+        components = {}
+        for name, future in self._futures.items():
+            if not future.done():
+                components[name] = 'loading'
+            elif future.exception() is not None:
+                components[name] = 'failed'
+            else:
+                components[name] = 'ready'
+        return {'ready': self.is_ready(), 'components': components}
+
+    def log_timeline(self):
+        """Логирует таймлайн загрузки компонентов"""
+        with self._lock:
+            events = sorted(self._timeline, key=lambda e: e['start'])
+        logger.info("⏱️  Таймлайн запуска (сек от старта процесса):")
+        for event in events:
+            mark = "✅" if event['ok'] else "❌"
+            end = event['start'] + event['duration']
+            logger.info(f"   {mark} {event['component']:<28} {event['start']:>7.2f} → {end:>7.2f} ({event['duration']:.2f})")
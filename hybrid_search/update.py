@@ -1,14 +1,41 @@
 # hybrid_search/update.py
 
+import threading
 import time
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from hybrid_search import database, confluence, embed, chunk
+from hybrid_search import bm25 as bm25_store
+from hybrid_search.alias import watermark_key
+from hybrid_search.manifest import IndexManifest
+from hybrid_search.metrics import peak_rss_mb
+from hybrid_search.scheduler import ModelScheduler
+from hybrid_search.snapshot import SnapshotLock
+from hybrid_search.staging import StagingStore
+from hybrid_search.warmup import bump_index_generation
 from hybrid_search.utils import html_to_text, get_redis_client, logger, parse_datetime, format_datetime, Config
 
 
+class PageBudget:
+    """Общий на цикл синхронизации лимит проверяемых страниц: пространства берут из него параллельно"""
+
+    def __init__(self, max_pages: Optional[int]):
+        self.remaining = max_pages
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        if self.remaining is None:
+            return True
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
 class UpdateDatabase:
     def __init__(self):
         self.db = database.Database()
@@ -16,6 +43,9 @@ class UpdateDatabase:
         self.chunker = chunk.SemanticChunk()
         self.embedder = embed.Embed()
         self.redis = get_redis_client()
+        self.scheduler = ModelScheduler()
+        self.manifest = IndexManifest()
+        self.write_lock = SnapshotLock()
         logger.info("✅ UpdateDatabase инициализирован")
 
     def update_page(self, page_id: str, page_metadata: Dict[str, Any] = None) -> bool:
@@ -24,7 +54,8 @@ class UpdateDatabase:
             # Получаем контент + метаданные
             page_data = self.confluence_api.get_page_full(page_id)
             html_data = page_data['content']
-            base_metadata = page_data['metadata'] if page_metadata is None else page_metadata
+            # Полные метаданные страницы (метки, дата) поверх краткой информации из списка страниц
+            base_metadata = {**(page_metadata or {}), **page_data['metadata']}
 
             text = html_to_text(html_data)
             if not text.strip():
@@ -35,27 +66,37 @@ class UpdateDatabase:
             chunks = self.chunker.split(text)
             total_chunks = len(chunks)
 
-            for num, chunk_text in enumerate(chunks):
-                # Векторизация
-                dense_vector = self.embedder.embed_text(chunk_text)
-                sparse_vector = self.embedder.embed_sparse(chunk_text)
+            # Векторизация пакетами (уступает поиску)
+            dense_vectors, sparse_vectors = self._embed_chunks(chunks)
 
-                # Уникальный ID чанка
-                chunk_id = f"{page_id}-{num}"
+            # Запись страницы — под разделяемой блокировкой снимка (экспорт ждёт её завершения)
+            with self.write_lock.shared():
+                for num, chunk_text in enumerate(chunks):
+                    dense_vector = dense_vectors[num]
+                    sparse_vector = sparse_vectors[num]
 
-                # Метаданные чанка
-                chunk_metadata = {
-                    **base_metadata,
-                    'chunk_index': num,
-                    'total_chunks': total_chunks
-                }
+                    # Уникальный ID чанка
+                    chunk_id = f"{page_id}-{num}"
 
-                # Сохранение в ChromaDB
-                self.db.upsert_page(chunk_id, dense_vector, sparse_vector, chunk_text, chunk_metadata)
+                    # Метаданные чанка
+                    chunk_metadata = {
+                        **base_metadata,
+                        'chunk_index': num,
+                        'total_chunks': total_chunks
+                    }
+
+                    # Сохранение в ChromaDB
+                    self.db.upsert_page(chunk_id, dense_vector, sparse_vector, chunk_text, chunk_metadata)
+                self.db.put_parent_spans(page_id, total_chunks)
+
+                # Сохраняем время обновления
+                current_time = datetime.now(timezone.utc)
+                self.redis.setex(watermark_key(self.db.index_name, page_id), 86400 * 30,
+                                 format_datetime(current_time))
 
-            # Сохраняем время обновления
-            current_time = datetime.now(timezone.utc)
-            self.redis.setex(f'update_time:{page_id}', 86400 * 30, format_datetime(current_time))
+                version = base_metadata.get('version', base_metadata.get('page_version', 1))
+                self.manifest.mark_page(page_id, version, total_chunks)
+            bump_index_generation(self.redis)
 
             logger.info(f"✅ Страница {page_id} обработана: {total_chunks} чанков")
             return True
@@ -64,24 +105,74 @@ class UpdateDatabase:
             logger.error(f"❌ Ошибка при обновлении страницы {page_id}: {e}")
             return False
 
-    def load_all(self):
-        """Полная загрузка с расширенными метаданными"""
+    def _embed_chunks(self, chunks: list) -> tuple:
+        """✅ Пакетная векторизация чанков через приоритетный планировщик моделей"""
+        dense_vectors, sparse_vectors = [], []
+        batch_size = max(1, Config.INGEST_BATCH_SIZE)
+        model = self.db.embedding_model()  # векторы — в пространстве коллекции, куда пишем
+        self.embedder.use_bm25(self.db.index_name)
+        for start in range(0, len(chunks), batch_size):
+            batch = chunks[start:start + batch_size]
+            with self.scheduler.background():
+                dense_vectors.extend(self.embedder.embed_texts_batch(batch, model))
+                sparse_vectors.extend(self.embedder.embed_sparse_batch(batch))
+        return dense_vectors, sparse_vectors
+
+    def load_all(self, resume: bool = True):
+        """Полная загрузка с расширенными метаданными (с чекпоинтом после каждой страницы)"""
         logger.info("🔄 Запуск полной загрузки из Confluence...")
 
-        space_id = self.confluence_api.get_space_id()
-        pages = self.confluence_api.get_page_ids(space_id)
+        pages = self.confluence_api.get_all_page_ids()
         total = len(pages)
 
+        # ✅ Чекпоинт: страницы, уже записанные в индекс в текущей версии, пропускаем
+        if not resume:
+            self.manifest.reset()
+        indexed = self.manifest.indexed_versions()
+        done_before = {
+            page_id for page_id, page_info in pages.items()
+            if isinstance(page_info, dict) and indexed.get(page_id) == str(page_info.get('version', 1))
+        }
+        if done_before:
+            logger.info(f"⏩ Продолжение прерванной загрузки: {len(done_before)}/{total} страниц уже в индексе")
+        self.manifest.begin_load(total)
+
+        if Config.STREAMING_INGEST:
+            processed = self._load_streaming(pages, done_before)
+        else:
+            processed = self._load_in_memory(pages, done_before)
+
+        self.manifest.finish_load()
+        logger.info(
+            f"🎉 Загрузка завершена: {processed} страниц проиндексировано"
+            f"{f', {len(done_before)} из чекпоинта' if done_before else ''}")
+        logger.info(f"📈 Пиковая память процесса (RSS): {peak_rss_mb():.0f} МБ")
+
+    def _load_in_memory(self, pages: Dict[str, Any], done_before: set) -> int:
+        """Сбор всех текстов в память, BM25, затем индексация"""
+        total = len(pages)
+
+        # ✅ Продолжение: BM25 прерванного запуска сохранён до индексации — страницы из чекпоинта
+        # не скачиваются заново (и индексы sparse-векторов записанных чанков остаются согласованными)
+        bm25_reused = bool(done_before) and bm25_store.load_model(
+            self.db.index_name, self.embedder.analyzer.describe()) is not None
+        if bm25_reused:
+            self.embedder.use_bm25(self.db.index_name)
+            logger.info(f"⏩ BM25 из чекпоинта: {len(done_before)} страниц не скачиваются повторно")
+
         # Сбор текстов для BM25
         logger.info(f"📚 Сбор текстов для BM25 (0/{total})...")
         all_texts = []
         page_data_cache = {}
+        started = time.perf_counter()
 
         for idx, (page_id, page_info) in enumerate(pages.items(), 1):
             # ✅ ЗАЩИТА: проверяем тип page_info
             if not isinstance(page_info, dict):
                 logger.error(f"⚠️  Пропущена страница {page_id}: page_info имеет тип {type(page_info)}")
                 continue
+            if bm25_reused and page_id in done_before:
+                continue
 
             try:
                 full_data = self.confluence_api.get_page_full(page_id)
@@ -95,29 +186,37 @@ class UpdateDatabase:
 
                 if text.strip():
                     all_texts.append(text)
-                    page_data_cache[page_id] = {
-                        'text': text,
-                        'metadata': full_data.get('metadata', {})
-                    }
+                    if page_id not in done_before:
+                        page_data_cache[page_id] = {
+                            'text': text,
+                            'metadata': full_data.get('metadata', {})
+                        }
 
                 if idx % 100 == 0 or idx == total:
-                    logger.info(f"📚 Сбор текстов: {idx}/{total} ({100 * idx // total}%)")
+                    self._log_progress("📚 Сбор текстов", idx, total, started)
 
             except Exception as e:
                 logger.error(f"⚠️  Пропущена страница {page_id}: {e}")
 
-        # Инициализация BM25
-        if all_texts:
+        # Инициализация BM25 (на всём корпусе — индексы sparse-векторов согласованы между запусками)
+        if all_texts and not bm25_reused:
             logger.info(f"🔧 Инициализация BM25 на {len(all_texts)} документах...")
             self.embedder.fit_bm25(all_texts)
+            self.embedder.save_bm25(self.db.index_name)
 
         # Индексация
         logger.info("📥 Начало индексации...")
+        remaining = total - len(done_before)
+        processed = 0
+        started = time.perf_counter()
+
         for idx, (page_id, page_info) in enumerate(pages.items(), 1):
             # ✅ again проверка типа
             if not isinstance(page_info, dict):
                 logger.warning(f"⚠️  Пропущена страница {page_id}: page_info не dict")
                 continue
+            if page_id in done_before:
+                continue
 
             logger.info(f"📥 [{idx}/{total}] {page_info.get('title', page_id)}")
 
@@ -136,22 +235,109 @@ class UpdateDatabase:
                     logger.error(f"❌ Ошибка: {e}")
                     continue
 
-            self._process_text(page_id, text, metadata)
+            self._index_page(page_id, page_info.get('version', 1), text, metadata)
+
+            processed += 1
+            if processed % 10 == 0 or processed == remaining:
+                self._log_progress("✅ Индексация", processed, remaining, started)
+
+        return processed
+
+    def _load_streaming(self, pages: Dict[str, Any], done_before: set) -> int:
+        """✅ Потоковая загрузка: тексты на диске (staging), BM25 отдельным проходом, память не растёт с корпусом"""
+        total = len(pages)
+        staging = StagingStore()
+        staging.retain(pages.keys())
+
+        # 1. Сбор текстов в staging (скачанные в прошлый запуск страницы той же версии — не запрашиваем)
+        logger.info(f"📚 Сбор текстов в staging {staging.path} (0/{total})...")
+        started = time.perf_counter()
+        reused = 0
+
+        for idx, (page_id, page_info) in enumerate(pages.items(), 1):
+            if not isinstance(page_info, dict):
+                logger.error(f"⚠️  Пропущена страница {page_id}: page_info имеет тип {type(page_info)}")
+                continue
+
+            version = page_info.get('version', 1)
+            if staging.staged_version(page_id) == str(version):
+                staging.set_seq(page_id, idx)
+                reused += 1
+            else:
+                try:
+                    full_data = self.confluence_api.get_page_full(page_id)
+                    if not isinstance(full_data, dict):
+                        logger.error(f"⚠️  Пропущена страница {page_id}: get_page_full вернул {type(full_data)}")
+                        continue
+
+                    text = html_to_text(full_data.get('content', ''))
+                    if text.strip():
+                        staging.put(page_id, idx, version, text, full_data.get('metadata', {}))
+                except Exception as e:
+                    logger.error(f"⚠️  Пропущена страница {page_id}: {e}")
 
             if idx % 100 == 0 or idx == total:
-                logger.info(f"✅ Прогресс: {idx}/{total} ({100 * idx // total}%)")
+                self._log_progress("📚 Сбор текстов", idx, total, started)
 
-        logger.info(f"🎉 Загрузка завершена: {len(page_data_cache)} страниц проиндексировано")
+        staging.commit()
+        logger.info(
+            f"💾 Staging: {staging.count()} страниц, {staging.size_bytes() / 1024 ** 2:.1f} МБ на диске"
+            f"{f', {reused} из прошлого запуска' if reused else ''}")
+
+        # 2. BM25: статистика корпуса потоковым проходом по staging
+        self.embedder.fit_bm25_streaming(staging.iter_texts())
+        self.embedder.save_bm25(self.db.index_name)
+
+        # 3. Индексация страница за страницей из staging
+        logger.info("📥 Начало индексации...")
+        remaining = total - len(done_before)
+        processed = 0
+        started = time.perf_counter()
 
-    def _process_text(self, page_id: str, text: str, metadata: Dict[str, Any]):
-        """Внутренний метод обработки текста с метаданными"""
+        for page_id, version, text, metadata in staging.iter_pages():
+            if page_id in done_before:
+                continue
+
+            logger.info(f"📥 [{processed + 1}/{remaining}] {metadata.get('title', page_id)}")
+            self._index_page(page_id, version, text, metadata)
+
+            processed += 1
+            if processed % 10 == 0 or processed == remaining:
+                self._log_progress("✅ Индексация", processed, remaining, started)
+
+        staging.remove()
+        return processed
+
+    def _index_page(self, page_id: str, version, text: str, metadata: Dict[str, Any]):
+        """Индексирует страницу и фиксирует её в манифесте"""
+        with self.write_lock.shared():
+            total_chunks = self._process_text(page_id, text, metadata)
+            if total_chunks is not None:
+                self.manifest.mark_page(page_id, version, total_chunks)
+        bump_index_generation(self.redis)
+
+    @staticmethod
+    def _log_progress(stage: str, done: int, total: int, started: float):
+        """Прогресс с оценкой оставшегося времени по наблюдаемой скорости (страниц/сек)"""
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (total - done) / rate if rate > 0 else 0.0
+        minutes, seconds = divmod(int(eta), 60)
+        logger.info(
+            f"{stage}: {done}/{total} ({100 * done // max(total, 1)}%), "
+            f"{rate:.2f} стр/сек, осталось ~{minutes} мин {seconds:02d} сек, RSS {peak_rss_mb():.0f} МБ")
+
+    def _process_text(self, page_id: str, text: str, metadata: Dict[str, Any]) -> Optional[int]:
+        """Внутренний метод обработки текста с метаданными (возвращает число чанков или None при ошибке)"""
         try:
             chunks = self.chunker.split(text)
             total_chunks = len(chunks)
 
+            dense_vectors, sparse_vectors = self._embed_chunks(chunks)
+
             for num, chunk_text in enumerate(chunks):
-                dense_vector = self.embedder.embed_text(chunk_text)
-                sparse_vector = self.embedder.embed_sparse(chunk_text)
+                dense_vector = dense_vectors[num]
+                sparse_vector = sparse_vectors[num]
                 chunk_id = f"{page_id}-{num}"
 
                 chunk_metadata = {
@@ -169,28 +355,58 @@ class UpdateDatabase:
                 self.db.upsert_page(chunk_id, dense_vector, sparse_vector, chunk_text, chunk_metadata)
 
                 current_time = datetime.now(timezone.utc)
-                self.redis.setex(f'update_time:{page_id}', 86400 * 30, format_datetime(current_time))
+                self.redis.setex(watermark_key(self.db.index_name, page_id), 86400 * 30,
+                                 format_datetime(current_time))
+
+            self.db.put_parent_spans(page_id, total_chunks)
+            return total_chunks
 
         except Exception as e:
             logger.error(f"❌ Ошибка при обработке {page_id}: {e}")
-
-    def sync_changed_pages(self, max_pages: int = None) -> dict:
-        """Синхронизация только изменённых страниц"""
+            return None
+
+    def sync_all_spaces(self, max_pages: int = None) -> dict:
+        """
+        ✅ Синхронизация всех пространств: параллельно, в общем бюджете HTTP и эмбеддингов.
+        max_pages — лимит проверяемых страниц на весь цикл, а не на каждое пространство.
+        """
+        spaces = self.confluence_api.space_keys
+        if len(spaces) <= 1:
+            return self.sync_changed_pages(max_pages=max_pages)
+
+        budget = PageBudget(max_pages or None)
+        totals = {'checked': 0, 'updated': 0, 'new': 0, 'errors': 0}
+        with ThreadPoolExecutor(max_workers=max(1, Config.SYNC_SPACE_CONCURRENCY),
+                                thread_name_prefix="sync-space") as pool:
+            results = pool.map(lambda key: self.sync_changed_pages(space_key=key, budget=budget), spaces)
+            for stats in results:
+                for key in totals:
+                    totals[key] += stats.get(key, 0)
+        return totals
+
+    def sync_changed_pages(self, max_pages: int = None, space_key: str = None,
+                           budget: PageBudget = None) -> dict:
+        """Синхронизация только изменённых страниц (одного пространства или всех)"""
         stats = {'checked': 0, 'updated': 0, 'new': 0, 'errors': 0}
+        budget = budget or PageBudget(max_pages or None)
 
         try:
-            space_id = self.confluence_api.get_space_id()
-            pages = self.confluence_api.get_page_ids(space_id)
+            if space_key:
+                space_id = self.confluence_api.get_space_id(space_key)
+                pages = self.confluence_api.get_page_ids(space_id, space_key)
+            else:
+                pages = self.confluence_api.get_all_page_ids()
 
-            if max_pages:
-                pages = dict(list(pages.items())[:max_pages])
+            collection = self.db.current_collection()  # отметки — той коллекции, в которую пишем
 
             for page_id, page_info in pages.items():
+                if not budget.take():
+                    break
                 stats['checked'] += 1
 
                 try:
                     confluence_time_str = self.confluence_api.get_time(page_id)
-                    stored_time_str = self.redis.get(f'update_time:{page_id}')
+                    stored_time_str = self.redis.get(watermark_key(collection, page_id))
 
                     need_update = False
 
@@ -215,7 +431,9 @@ class UpdateDatabase:
                     stats['errors'] += 1
                     continue
 
-            logger.info(f"✅ Синхронизация: {stats['updated']} обновлено, {stats['new']} новых")
+            logger.info(
+                f"✅ Синхронизация{f' [{space_key}]' if space_key else ''}: "
+                f"{stats['updated']} обновлено, {stats['new']} новых")
 
         except Exception as e:
             logger.error(f"❌ Ошибка синхронизации: {e}")
@@ -228,7 +446,7 @@ class UpdateDatabase:
 
         while True:
             try:
-                stats = self.sync_changed_pages(max_pages=max_pages_per_cycle)
+                stats = self.sync_all_spaces(max_pages=max_pages_per_cycle)
 
                 if stats['updated'] > 0:
                     logger.info(f"✅ Обновлено: {stats['updated']}/{stats['checked']}")
@@ -27,15 +27,43 @@ class Config:
     FORCE_RELOAD: bool = os.getenv("FORCE_RELOAD", "false").lower() == "true"
     SKIP_LOAD: bool = os.getenv("SKIP_LOAD", "false").lower() == "true"
     ENABLE_PERIODIC_SYNC: bool = os.getenv("ENABLE_PERIODIC_SYNC", "true").lower() == "true"
+    FAST_START: bool = os.getenv("FAST_START", "false").lower() == "true"
 
     # ===== ChromaDB =====
     CHROMA_DB_PATH: str = os.getenv("CHROMA_DB_PATH", "/app/data/chroma_db")
     CHROMA_COLLECTION: str = os.getenv("CHROMA_COLLECTION", "confluence_index")
+    INDEX_MANIFEST_PATH: str = os.getenv("INDEX_MANIFEST_PATH", "")  # по умолчанию рядом с ChromaDB
+    STREAMING_INGEST: bool = os.getenv("STREAMING_INGEST", "false").lower() == "true"
+    STAGING_PATH: str = os.getenv("STAGING_PATH", "")  # по умолчанию рядом с ChromaDB
+    # HNSW: M и construction_ef — при создании коллекции, ef_search — при открытии
+    HNSW_M: int = int(os.getenv("HNSW_M", "16"))
+    HNSW_CONSTRUCTION_EF: int = int(os.getenv("HNSW_CONSTRUCTION_EF", "100"))
+    HNSW_SEARCH_EF: int = int(os.getenv("HNSW_SEARCH_EF", "100"))
+    # Слой первого прохода: hnsw (ChromaDB) или int8 (сжатые векторы в памяти + точный пересчёт)
+    VECTOR_TIER: str = os.getenv("VECTOR_TIER", "hnsw").lower()
+    QUANTIZED_OVERSAMPLE: int = int(os.getenv("QUANTIZED_OVERSAMPLE", "4"))
+    # Снимок индекса: восстановление новой реплики вместо полной загрузки из Confluence
+    SNAPSHOT_RESTORE_PATH: str = os.getenv("SNAPSHOT_RESTORE_PATH", "")
+    SNAPSHOT_RESTORE_WORKERS: int = int(os.getenv("SNAPSHOT_RESTORE_WORKERS", "4"))
+    # Blue/green переиндексация (FORCE_RELOAD при непустом индексе): bluegreen — в новую коллекцию
+    # с проверкой и переключением указателя, inplace — в активную коллекцию (прежнее поведение)
+    REINDEX_MODE: str = os.getenv("REINDEX_MODE", "bluegreen").lower()
+    REINDEX_KEEP_COLLECTIONS: int = int(os.getenv("REINDEX_KEEP_COLLECTIONS", "1"))  # прежних версий для отката
+    REINDEX_SMOKE_QUERIES: str = os.getenv("REINDEX_SMOKE_QUERIES", "")
+    REINDEX_MIN_PAGE_RATIO: float = float(os.getenv("REINDEX_MIN_PAGE_RATIO", "0.95"))
+    # Схема хранения нового индекса: slim (метаданные страниц и sparse — в PageStore) или legacy
+    STORAGE_SCHEMA: str = os.getenv("STORAGE_SCHEMA", "slim").lower()
 
     # ===== Confluence =====
     CONFLUENCE_URL: str = os.getenv("CONFLUENCE_URL", "").rstrip('/')
     CONFLUENCE_API_KEY: str = os.getenv("CONFLUENCE_API_KEY", "")
     CONFLUENCE_SPACE_NAME: str = os.getenv("CONFLUENCE_SPACE_NAME", "")
+    # Несколько пространств через запятую (по умолчанию — одно CONFLUENCE_SPACE_NAME)
+    CONFLUENCE_SPACES: list = [
+        s.strip() for s in (os.getenv("CONFLUENCE_SPACES") or CONFLUENCE_SPACE_NAME).split(',') if s.strip()
+    ]
+    CONFLUENCE_MAX_CONCURRENT_REQUESTS: int = int(os.getenv("CONFLUENCE_MAX_CONCURRENT_REQUESTS", "8"))
+    SYNC_SPACE_CONCURRENCY: int = int(os.getenv("SYNC_SPACE_CONCURRENCY", "4"))
 
     # ===== Ollama =====
     OLLAMA_MODEL: str = os.getenv("OLLAMA_MODEL", "llama3.1")
@@ -53,6 +81,22 @@ class Config:
     RERANK_TOP_K: int = int(os.getenv("RERANK_TOP_K", "10"))
     RERANK_MIN_SCORE: float = float(os.getenv("RERANK_MIN_SCORE", "0.45"))
     RERANKER_MODEL: str = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    # Dense-модель новых коллекций; существующая коллекция ищется моделью, которой построена
+    DENSE_MODEL: str = os.getenv("DENSE_MODEL", "sentence-transformers/all-mpnet-base-v2")
+    # Смена DENSE_MODEL → фоновое перекодирование коллекции (blue/green), поиск пока по прежней
+    DENSE_MODEL_AUTO_MIGRATE: bool = os.getenv("DENSE_MODEL_AUTO_MIGRATE", "true").lower() == "true"
+    MODEL_CACHE_DIR: str = os.getenv("MODEL_CACHE_DIR", "")  # веса моделей (HF_HOME); пусто — ~/.cache
+    MODEL_OFFLINE: bool = os.getenv("MODEL_OFFLINE", "false").lower() == "true"  # только из кэша, без сети
+    # Анализатор BM25 (hybrid_search/analyzer.py): шаги через запятую, пусто — только регулярное выражение
+    ANALYZER_STEPS: str = os.getenv("ANALYZER_STEPS", "stopwords,stem")
+    ANALYZER_SYNONYMS_PATH: str = os.getenv("ANALYZER_SYNONYMS_PATH", "")  # JSON {"кубер": "kubernetes"}
+    ANALYZER_CACHE_SIZE: int = int(os.getenv("ANALYZER_CACHE_SIZE", "200000"))  # слов в кэше анализа
+    # Адаптивный rerank: пакеты в порядке первого этапа, ранний выход, LRU-кэш оценок
+    RERANK_ADAPTIVE: bool = os.getenv("RERANK_ADAPTIVE", "false").lower() == "true"
+    RERANK_BATCH_SIZE: int = int(os.getenv("RERANK_BATCH_SIZE", "8"))
+    RERANK_PATIENCE: int = int(os.getenv("RERANK_PATIENCE", "2"))  # пакетов без изменений топ-K до выхода
+    RERANK_EARLY_EXIT_MARGIN: float = float(os.getenv("RERANK_EARLY_EXIT_MARGIN", "0.05"))
+    RERANK_CACHE_SIZE: int = int(os.getenv("RERANK_CACHE_SIZE", "20000"))  # 0 — без кэша
     MAX_CONTEXT_TOKENS: int = int(os.getenv("MAX_CONTEXT_TOKENS", "3500"))
     INCLUDE_SECTION_IN_PROMPT: bool = os.getenv("INCLUDE_SECTION_IN_PROMPT", "true").lower() == "true"
     RESPONSE_FORMAT: str = os.getenv("RESPONSE_FORMAT", "markdown")
@@ -64,39 +108,131 @@ class Config:
     CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "85"))
     CHUNK_SEPARATORS: str = os.getenv("CHUNK_SEPARATORS", "\n\n,\n,. , ,")
 
+    # ===== Расширение запроса (multi-query / HyDE) =====
+    QUERY_EXPANSION: str = os.getenv("QUERY_EXPANSION", "off")  # off | multi | hyde | both
+    QUERY_EXPANSION_LLM: bool = os.getenv("QUERY_EXPANSION_LLM", "true").lower() == "true"  # false — только правила
+    QUERY_EXPANSION_COUNT: int = int(os.getenv("QUERY_EXPANSION_COUNT", "3"))  # перефразировок
+    QUERY_EXPANSION_BUDGET_MS: float = float(os.getenv("QUERY_EXPANSION_BUDGET_MS", "1500"))
+    QUERY_EXPANSION_WORKERS: int = int(os.getenv("QUERY_EXPANSION_WORKERS", "4"))  # параллельных поисков
+
+    # ===== Прогрев по частым запросам =====
+    WARMUP_ENABLED: bool = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+    WARMUP_QUERIES_PATH: str = os.getenv("WARMUP_QUERIES_PATH", "")  # FAQ: JSON или запрос на строку
+    WARMUP_TOP_N: int = int(os.getenv("WARMUP_TOP_N", "50"))
+    WARMUP_MIN_HITS: int = int(os.getenv("WARMUP_MIN_HITS", "3"))
+
     # ===== Расширение контекста =====
     MAX_CHUNKS_PER_DOC: int = int(os.getenv("MAX_CHUNKS_PER_DOC", "3"))
     SEARCH_NEIGHBOR_WINDOW: int = int(os.getenv("SEARCH_NEIGHBOR_WINDOW", "1"))
     SEARCH_NEIGHBOR_SCORE_MULTIPLIER: float = float(os.getenv("SEARCH_NEIGHBOR_SCORE_MULTIPLIER", "0.8"))
+    # Родительский фрагмент: ±N чанков страницы, записывается при индексации; контекст расширяется
+    # им одним чтением на запрос. 0 — окно соседей (1–3) подбирается при поиске по оценкам rerank
+    PARENT_WINDOW: int = int(os.getenv("PARENT_WINDOW", "0"))
+
+    # ===== Отбор контекста (MMR) =====
+    MMR_ENABLED: bool = os.getenv("MMR_ENABLED", "false").lower() == "true"
+    MMR_LAMBDA: float = float(os.getenv("MMR_LAMBDA", "0.7"))  # 1 — только релевантность, 0 — только разнообразие
+    MMR_DUPLICATE_THRESHOLD: float = float(os.getenv("MMR_DUPLICATE_THRESHOLD", "0.9"))  # косинус почти дубля
+    MMR_TOKEN_BUDGET: int = int(os.getenv("MMR_TOKEN_BUDGET", "1500"))  # токенов текста чанков; 0 — MAX_CONTEXT_TOKENS
 
     # ===== Telegram Bot =====
     TELEGRAM_ENABLED: bool = os.getenv("TELEGRAM_ENABLED", "false").lower() == "true"
     TELEGRAM_BOT_TOKEN: str = os.getenv("TELEGRAM_BOT_TOKEN", "")
     TELEGRAM_WEBHOOK_URL: str = os.getenv("TELEGRAM_WEBHOOK_URL", "")
     TELEGRAM_WEBHOOK_PORT: int = int(os.getenv("TELEGRAM_WEBHOOK_PORT", "8443"))
+    TELEGRAM_WEBHOOK_PATH: str = os.getenv("TELEGRAM_WEBHOOK_PATH", "/telegram")
+    TELEGRAM_WEBHOOK_SECRET: str = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+    TELEGRAM_CONCURRENT_UPDATES: int = int(os.getenv("TELEGRAM_CONCURRENT_UPDATES", "32"))
+    BOT_SESSION_MODE: str = os.getenv("BOT_SESSION_MODE", "coalesce")  # coalesce | queue
+    BOT_MAX_PENDING_PER_SESSION: int = int(os.getenv("BOT_MAX_PENDING_PER_SESSION", "5"))
+    BOT_SEARCH_SLOTS: int = int(os.getenv("BOT_SEARCH_SLOTS", "4"))
+    BOT_LLM_SLOTS: int = int(os.getenv("BOT_LLM_SLOTS", "2"))
+    BOT_SLOTS_PER_CHAT: int = int(os.getenv("BOT_SLOTS_PER_CHAT", "1"))
+
+    # ===== Пул процессов (поиск + индексация) =====
+    QUERY_WORKERS: int = int(os.getenv("QUERY_WORKERS", "0"))  # 0 — поиск в основном процессе
+    WORKER_REQUEST_TIMEOUT: float = float(os.getenv("WORKER_REQUEST_TIMEOUT", "60"))
+    SERVING_TORCH_THREADS: int = int(os.getenv("SERVING_TORCH_THREADS", "0"))  # 0 — ядра поровну между процессами поиска
+    INGEST_TORCH_THREADS: int = int(os.getenv("INGEST_TORCH_THREADS", "1"))  # только в отдельном процессе
+
+    # ===== Изоляция индексации от поиска =====
+    INGEST_BATCH_SIZE: int = int(os.getenv("INGEST_BATCH_SIZE", "16"))
+    INGEST_MAX_BATCHES_PER_SEC: float = float(os.getenv("INGEST_MAX_BATCHES_PER_SEC", "4"))  # 0 — без лимита
+    INGEST_QUERY_LATENCY_TARGET_MS: float = float(os.getenv("INGEST_QUERY_LATENCY_TARGET_MS", "500"))
+    INGEST_MAX_YIELD_SECONDS: float = float(os.getenv("INGEST_MAX_YIELD_SECONDS", "5"))
+    INGEST_MAX_WAIT_SECONDS: float = float(os.getenv("INGEST_MAX_WAIT_SECONDS", "10"))
+    INGEST_MAX_CONCURRENT_BATCHES: int = int(os.getenv("INGEST_MAX_CONCURRENT_BATCHES", "1"))  # общий бюджет эмбеддингов
+
+    # ===== CLI =====
+    CLI_ENABLED: bool = os.getenv("CLI_ENABLED", "true").lower() == "true"
 
     # ===== Логирование =====
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
 
+    # ===== Метрики и трассировка =====
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "9100"))
+    TRACE_LOG_PATH: str = os.getenv("TRACE_LOG_PATH", "")
+    # Каталог multiprocess-режима prometheus_client: /metrics суммирует все процессы пула
+    PROMETHEUS_MULTIPROC_DIR: str = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+    # Журнал запросов для повтора (python -m benchmarks.replay), пусто — выключен
+    QUERY_LOG_PATH: str = os.getenv("QUERY_LOG_PATH", "")
+    QUERY_LOG_MAX_MB: float = float(os.getenv("QUERY_LOG_MAX_MB", "20"))
+    QUERY_LOG_BACKUPS: int = int(os.getenv("QUERY_LOG_BACKUPS", "5"))
+
     @classmethod
     def log(cls):
         """Логирование текущей конфигурации"""
         logger.info("📋 RAG Pipeline Config:")
         logger.info(
-            f"   • Загрузка: force_reload={cls.FORCE_RELOAD}, skip_load={cls.SKIP_LOAD}, sync={cls.ENABLE_PERIODIC_SYNC}")
-        logger.info(f"   • ChromaDB: {cls.CHROMA_DB_PATH}/{cls.CHROMA_COLLECTION}")
-        logger.info(f"   • Confluence: {cls.CONFLUENCE_URL}/{cls.CONFLUENCE_SPACE_NAME}")
+            f"   • Загрузка: force_reload={cls.FORCE_RELOAD}, skip_load={cls.SKIP_LOAD}, sync={cls.ENABLE_PERIODIC_SYNC}, "
+            f"fast_start={cls.FAST_START}, streaming={cls.STREAMING_INGEST}, reindex={cls.REINDEX_MODE}")
+        logger.info(f"   • ChromaDB: {cls.CHROMA_DB_PATH}/{cls.CHROMA_COLLECTION} (schema={cls.STORAGE_SCHEMA}, "
+                    f"hnsw M={cls.HNSW_M} ef={cls.HNSW_SEARCH_EF}/{cls.HNSW_CONSTRUCTION_EF}, tier={cls.VECTOR_TIER})")
+        logger.info(
+            f"   • Confluence: {cls.CONFLUENCE_URL} spaces={','.join(cls.CONFLUENCE_SPACES)}, "
+            f"http_slots={cls.CONFLUENCE_MAX_CONCURRENT_REQUESTS}, sync_concurrency={cls.SYNC_SPACE_CONCURRENCY}")
         logger.info(f"   • Ollama: {cls.OLLAMA_MODEL} @ {cls.OLLAMA_HOST}")
         logger.info(f"   • Redis: {cls.REDIS_HOST}:{cls.REDIS_PORT}/{cls.REDIS_DB}")
-        logger.info(f"   • Retrieval: top_k={cls.RETRIEVAL_TOP_K}")
-        logger.info(f"   • Rerank: top_k={cls.RERANK_TOP_K}, min_score={cls.RERANK_MIN_SCORE}")
+        logger.info(f"   • Retrieval: top_k={cls.RETRIEVAL_TOP_K}, analyzer={cls.ANALYZER_STEPS or 'regex'}")
+        logger.info(
+            f"   • Models: dense={cls.DENSE_MODEL} (auto_migrate={cls.DENSE_MODEL_AUTO_MIGRATE}), "
+            f"reranker={cls.RERANKER_MODEL}, cache={cls.MODEL_CACHE_DIR or 'default'}, offline={cls.MODEL_OFFLINE}")
+        logger.info(
+            f"   • Rerank: top_k={cls.RERANK_TOP_K}, min_score={cls.RERANK_MIN_SCORE}, adaptive={cls.RERANK_ADAPTIVE} "
+            f"(batch={cls.RERANK_BATCH_SIZE}, patience={cls.RERANK_PATIENCE}, cache={cls.RERANK_CACHE_SIZE})")
+        logger.info(
+            f"   • Expansion: mode={cls.QUERY_EXPANSION}, llm={cls.QUERY_EXPANSION_LLM}, "
+            f"count={cls.QUERY_EXPANSION_COUNT}, budget={cls.QUERY_EXPANSION_BUDGET_MS:.0f}ms")
+        logger.info(
+            f"   • Warmup: enabled={cls.WARMUP_ENABLED}, top_n={cls.WARMUP_TOP_N}, min_hits={cls.WARMUP_MIN_HITS}, "
+            f"faq={cls.WARMUP_QUERIES_PATH or '—'}")
         logger.info(f"   • Chunking: size={cls.CHUNK_SIZE}, overlap={cls.CHUNK_OVERLAP}")
-        logger.info(f"   • Neighbor: window={cls.SEARCH_NEIGHBOR_WINDOW}, mult={cls.SEARCH_NEIGHBOR_SCORE_MULTIPLIER}")
+        logger.info(f"   • Neighbor: window={cls.SEARCH_NEIGHBOR_WINDOW}, mult={cls.SEARCH_NEIGHBOR_SCORE_MULTIPLIER}, "
+                    f"parent={cls.PARENT_WINDOW or 'выкл'}")
+        logger.info(f"   • MMR: enabled={cls.MMR_ENABLED}, lambda={cls.MMR_LAMBDA}, "
+                    f"duplicate={cls.MMR_DUPLICATE_THRESHOLD}, budget={cls.MMR_TOKEN_BUDGET or cls.MAX_CONTEXT_TOKENS}")
         logger.info(f"   • Prompt: max_tokens={cls.MAX_CONTEXT_TOKENS}, section={cls.INCLUDE_SECTION_IN_PROMPT}")
         logger.info(f"   • Response: format={cls.RESPONSE_FORMAT}, sources={cls.ALWAYS_SHOW_SOURCES}")
-        logger.info(f"   • Telegram: enabled={cls.TELEGRAM_ENABLED}")
+        logger.info(
+            f"   • Telegram: enabled={cls.TELEGRAM_ENABLED}, "
+            f"mode={'webhook' if cls.TELEGRAM_WEBHOOK_URL else 'polling'}, "
+            f"concurrent_updates={cls.TELEGRAM_CONCURRENT_UPDATES}")
+        logger.info(
+            f"   • Bot scheduler: mode={cls.BOT_SESSION_MODE}, search_slots={cls.BOT_SEARCH_SLOTS}, "
+            f"llm_slots={cls.BOT_LLM_SLOTS}, per_chat={cls.BOT_SLOTS_PER_CHAT}")
+        logger.info(
+            f"   • Workers: query={cls.QUERY_WORKERS}, torch_threads(serve/ingest)="
+            f"{cls.SERVING_TORCH_THREADS}/{cls.INGEST_TORCH_THREADS}")
+        logger.info(
+            f"   • Ingest: batch={cls.INGEST_BATCH_SIZE}, max_batches/s={cls.INGEST_MAX_BATCHES_PER_SEC}, "
+            f"query_target={cls.INGEST_QUERY_LATENCY_TARGET_MS}ms")
+        logger.info(f"   • CLI: enabled={cls.CLI_ENABLED}")
         logger.info(f"   • Device: force_cpu={cls.FORCE_CPU}")
         logger.info(f"   • Max chunks per doc: {cls.MAX_CHUNKS_PER_DOC}")
+        logger.info(f"   • Metrics: enabled={cls.METRICS_ENABLED}, port={cls.METRICS_PORT}, traces={cls.TRACE_LOG_PATH or 'off'}, "
+                    f"query_log={cls.QUERY_LOG_PATH or 'off'}, "
+                    f"multiproc_dir={cls.PROMETHEUS_MULTIPROC_DIR or 'off'}")
 
         # ✅ Проверка на переполнение контекста
         estimated_chunks = cls.RETRIEVAL_TOP_K * (cls.SEARCH_NEIGHBOR_WINDOW * 2 + 1)
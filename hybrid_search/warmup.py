@@ -0,0 +1,335 @@
+# hybrid_search/warmup.py
+"""
+Прогрев по частым запросам: журнал запросов (CLI и Telegram), предвычисленные dense/sparse-векторы
+и результаты поиска, повтор запросов при старте и после синхронизации.
+
+Повтор прогревает веса моделей, страницы HNSW/SQLite и LRU-кэш rerank; для запросов из списка
+поиск берёт сохранённые векторы (без encode), а при неизменном индексе — сохранённый результат.
+
+    python -m hybrid_search.warmup              # топ частых запросов и последний отчёт cold/warm
+    python -m hybrid_search.warmup --run        # прогреть сейчас (нужны модели и индекс)
+"""
+import argparse
+import copy
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from hybrid_search.metrics import Tracer
+from hybrid_search.utils import singleton, logger, Config, get_redis_client
+
+# Счётчик записей в индекс (UpdateDatabase): сохранённые результаты действительны, пока он не изменился
+INDEX_GENERATION_KEY = 'index_generation'
+
+
+def normalize_query(query: str) -> str:
+    return ' '.join(query.lower().split())
+
+
+def bump_index_generation(redis):
+    """Вызывается после записи страницы в индекс: сохранённые результаты прогрева устаревают"""
+    try:
+        redis.incr(INDEX_GENERATION_KEY)
+    except Exception as e:
+        logger.debug(f"⚠️  {INDEX_GENERATION_KEY} не обновлён: {e}")
+
+
+def _latency_summary(timings: List[float]) -> Dict[str, float]:
+    if not timings:
+        return {}
+    return {
+        'p50_ms': round(float(np.percentile(timings, 50)), 2),
+        'p95_ms': round(float(np.percentile(timings, 95)), 2),
+        'avg_ms': round(float(np.mean(timings)), 2),
+    }
+
+
+class WarmEntry:
+    """Сохранённые векторы и результат поиска одного частого запроса"""
+    __slots__ = ('query', 'dense', 'model', 'sparse', 'sparse_fingerprint', 'result', 'stamp')
+
+    def __init__(self, query: str, dense: list, model: Optional[str], sparse: Dict, sparse_fingerprint: int,
+                 result: Optional[Dict], stamp: Optional[str]):
+        self.query = query
+        self.dense = dense
+        self.model = model
+        self.sparse = sparse
+        self.sparse_fingerprint = sparse_fingerprint
+        self.result = result
+        self.stamp = stamp
+
+
+@singleton
+class QueryWarmup:
+    """
+    ✅ Частые запросы: журнал, предвычисленные векторы и результаты, прогрев.
+
+    Журнал и кэш — в SQLite рядом с ChromaDB (общие для процессов-воркеров), в памяти —
+    только записи прогретых запросов (WARMUP_TOP_N × вектор).
+    """
+
+    def __init__(self):
+        self.path = os.path.join(Config.CHROMA_DB_PATH, 'warmup.sqlite3')
+        os.makedirs(Config.CHROMA_DB_PATH, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS queries (
+                key       TEXT PRIMARY KEY,
+                query     TEXT NOT NULL,
+                hits      INTEGER NOT NULL,
+                last_seen REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS warm (
+                key                TEXT PRIMARY KEY,
+                query              TEXT NOT NULL,
+                dense              BLOB NOT NULL,
+                model              TEXT,
+                sparse             TEXT NOT NULL,
+                sparse_fingerprint INTEGER NOT NULL,
+                result             TEXT,
+                stamp              TEXT,
+                computed_at        REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS state (
+                key   TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        if 'model' not in {row[1] for row in self._conn.execute("PRAGMA table_info(warm)")}:
+            self._conn.execute("ALTER TABLE warm ADD COLUMN model TEXT")  # кэш до DENSE_MODEL
+        self._conn.commit()
+        self._entries: Dict[str, WarmEntry] = {}
+        self._run_lock = threading.Lock()
+        self._redis = None
+        self.tracer = Tracer()
+        self._load()
+
+    # ===== Журнал запросов =====
+
+    def record(self, query: str):
+        """Учитывает запрос пользователя (без фильтров) в частоте"""
+        if not Config.WARMUP_ENABLED or not query or not query.strip():
+            return
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT INTO queries (key, query, hits, last_seen) VALUES (?, ?, 1, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET hits = hits + 1, last_seen = excluded.last_seen, "
+                    "query = excluded.query",
+                    (normalize_query(query), query.strip(), time.time())
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️  Запрос не записан в журнал прогрева: {e}")
+
+    def frequent(self, limit: int = None) -> List[str]:
+        """Запросы для прогрева: список WARMUP_QUERIES_PATH (FAQ), затем самые частые из журнала"""
+        limit = Config.WARMUP_TOP_N if limit is None else limit
+        queries = self._seed_queries()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT query FROM queries WHERE hits >= ? ORDER BY hits DESC, last_seen DESC LIMIT ?",
+                (Config.WARMUP_MIN_HITS, limit)
+            ).fetchall()
+        seen, result = set(), []
+        for query in queries + [row[0] for row in rows]:
+            key = normalize_query(query)
+            if key not in seen:
+                seen.add(key)
+                result.append(query)
+        return result[:limit]
+
+    @staticmethod
+    def _seed_queries() -> List[str]:
+        """FAQ-список: JSON (строки или {"query": ...}) или текст, запрос на строку"""
+        path = Config.WARMUP_QUERIES_PATH
+        if not path or not os.path.exists(path):
+            return []
+        with open(path, encoding='utf-8') as f:
+            if path.endswith('.json'):
+                items = json.load(f)
+                return [item if isinstance(item, str) else item['query'] for item in items]
+            return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+    # ===== Кэш векторов и результатов =====
+
+    def lookup(self, query: str) -> Optional[WarmEntry]:
+        return self._entries.get(normalize_query(query))
+
+    @staticmethod
+    def sparse_fingerprint(embedder) -> int:
+        """Sparse-вектор запроса зависит от корпуса BM25: размер корпуса (0 — BM25 не инициализирован)"""
+        if not getattr(embedder, '_bm25_initialized', False) or embedder.bm25 is None:
+            return 0
+        return int(getattr(embedder.bm25, 'corpus_size', 0))
+
+    def vectors(self, entry: WarmEntry, embedder, model: str) -> tuple:
+        """
+        (dense, sparse) из кэша; dense пересчитывается, если коллекция с тех пор перекодирована
+        другой моделью, sparse — если BM25 переобучен
+        """
+        dense = entry.dense if entry.model == model else embedder.embed_text(entry.query, model)
+        if entry.sparse_fingerprint == self.sparse_fingerprint(embedder):
+            return dense, entry.sparse
+        return dense, embedder.embed_sparse(entry.query)
+
+    def index_stamp(self, embedder) -> Optional[str]:
+        """Состояние индекса: коллекция + счётчик записей + корпус BM25 (None — Redis недоступен)"""
+        from hybrid_search.database import Database
+        try:
+            if self._redis is None:
+                self._redis = get_redis_client()
+            generation = self._redis.get(INDEX_GENERATION_KEY) or 0
+        except Exception:
+            return None
+        return f"{Database().index_name}:{generation}:{self.sparse_fingerprint(embedder)}"
+
+    def cached_result(self, entry: WarmEntry, embedder) -> Optional[Dict]:
+        """Сохранённый результат поиска, если индекс с момента прогрева не менялся"""
+        if entry.result is None or entry.stamp is None:
+            return None
+        if entry.stamp != self.index_stamp(embedder):
+            return None
+        return copy.deepcopy(entry.result)
+
+    def _store(self, query: str, dense: list, model: str, sparse: Dict, fingerprint: int, result: Dict,
+               stamp: Optional[str]):
+        key = normalize_query(query)
+        # Результат без ошибки и с найденными чанками — иначе только векторы
+        result = result if result.get('matches') and not result.get('error') else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO warm (key, query, dense, model, sparse, sparse_fingerprint, result, stamp, "
+                "computed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, query, np.asarray(dense, dtype=np.float32).tobytes(), model, json.dumps(sparse), fingerprint,
+                 json.dumps(result, ensure_ascii=False, default=str) if result else None, stamp, time.time())
+            )
+            self._conn.commit()
+        self._entries[key] = WarmEntry(query, dense, model, sparse, fingerprint, result, stamp)
+
+    def _load(self):
+        """Сохранённые записи частых запросов — в память"""
+        keys = {normalize_query(q) for q in self.frequent()}
+        if not keys:
+            return
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, query, dense, model, sparse, sparse_fingerprint, result, stamp FROM warm").fetchall()
+        for key, query, dense, model, sparse, fingerprint, result, stamp in rows:
+            if key in keys:
+                self._entries[key] = WarmEntry(
+                    query, np.frombuffer(dense, dtype=np.float32).tolist(), model, json.loads(sparse), fingerprint,
+                    json.loads(result) if result else None, stamp)
+        if self._entries:
+            logger.info(f"✅ Прогрев: загружено {len(self._entries)} сохранённых запросов")
+
+    # ===== Прогрев =====
+
+    def run(self, semantic=None, trigger: str = 'startup') -> Dict:
+        """
+        ✅ Векторы и результаты частых запросов + замер латентности.
+
+        cold — первый проход полного поиска (после старта — холодные веса и страницы индекса),
+        warm — второй проход того же пайплайна, cached — ответ из кэша прогрева.
+        """
+        if not Config.WARMUP_ENABLED:
+            return {}
+        if not self._run_lock.acquire(blocking=False):
+            logger.info("⏭️  Прогрев уже выполняется")
+            return {}
+        try:
+            return self._run(semantic, trigger)
+        finally:
+            self._run_lock.release()
+
+    def _run(self, semantic, trigger: str) -> Dict:
+        if semantic is None:
+            from hybrid_search.search import SemanticSearch
+            semantic = SemanticSearch()
+        queries = self.frequent()
+        if not queries:
+            logger.info("⏭️  Прогрев: частых запросов пока нет")
+            return {}
+
+        started = time.perf_counter()
+        embedder = semantic.embedder
+        model = semantic.db.embedding_model()
+        embedder.use_bm25(semantic.db.index_name)
+        stamp = self.index_stamp(embedder)
+        fingerprint = self.sparse_fingerprint(embedder)
+        timings = {'cold': [], 'warm': [], 'cached': []}
+
+        for query in queries:
+            begin = time.perf_counter()
+            result = semantic.search(query, warmup=False)
+            timings['cold'].append((time.perf_counter() - begin) * 1000)
+            self._store(query, embedder.embed_text(query, model), model, embedder.embed_sparse(query), fingerprint,
+                        result, stamp)
+
+        for query in queries:
+            begin = time.perf_counter()
+            semantic.search(query, warmup=False)
+            timings['warm'].append((time.perf_counter() - begin) * 1000)
+
+        for query in queries:
+            begin = time.perf_counter()
+            semantic.search(query)
+            timings['cached'].append((time.perf_counter() - begin) * 1000)
+
+        for mode, values in timings.items():
+            for value in values:
+                self.tracer.observe(f"warmup_{mode}", value / 1000)
+
+        report = {
+            'trigger': trigger,
+            'at': time.time(),
+            'queries': len(queries),
+            'cached_results': sum(1 for q in queries if self.lookup(q).result is not None),
+            'seconds': round(time.perf_counter() - started, 2),
+            **{mode: _latency_summary(values) for mode, values in timings.items()},
+        }
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('last_report', ?)",
+                               (json.dumps(report),))
+            self._conn.commit()
+        logger.info(
+            f"🔥 Прогрев ({trigger}): {len(queries)} запросов за {report['seconds']:.1f} сек — p50 "
+            f"cold {report['cold']['p50_ms']:.0f} мс → warm {report['warm']['p50_ms']:.0f} мс → "
+            f"cached {report['cached']['p50_ms']:.1f} мс")
+        return report
+
+    def last_report(self) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM state WHERE key = 'last_report'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def top(self, limit: int = 20) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT query, hits, last_seen FROM queries ORDER BY hits DESC LIMIT ?", (limit,)).fetchall()
+        return [{'query': q, 'hits': hits, 'last_seen': last_seen} for q, hits, last_seen in rows]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Прогрев по частым запросам")
+    parser.add_argument('--run', action='store_true', help="Выполнить прогрев и показать отчёт")
+    parser.add_argument('--top', type=int, default=20, help="Сколько частых запросов показать")
+    args = parser.parse_args(argv)
+
+    warmup = QueryWarmup()
+    report = warmup.run(trigger='manual') if args.run else warmup.last_report()
+    print(json.dumps({'top': warmup.top(args.top), 'report': report}, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,9 @@
 # main.py
-from controllers import AppController, BotController, SyncController
+import hybrid_search.startup  # noqa: F401 — фиксирует точку отсчёта таймлайна запуска
+from hybrid_search.embed import configure_model_cache
+configure_model_cache()  # кэш и офлайн-режим HF — до первого импорта huggingface_hub
+from controllers import AppController, BotController, MetricsController, SyncController, WorkerPoolController
+from hybrid_search.metrics import prepare_multiprocess_dir
 from hybrid_search.utils import logger, Config
 import signal
 import sys
@@ -13,6 +17,8 @@ class Application:
         self.app_controller = AppController()
         self.bot_controller = None
         self.sync_controller = None
+        self.metrics_controller = None
+        self.worker_pool = None
         self._setup_signals()
 
     def _setup_signals(self):
@@ -31,23 +37,41 @@ class Application:
         try:
             # 1. Инициализация
             os.environ['TOKENIZERS_PARALLELISM'] = 'true'
+            prepare_multiprocess_dir()  # файлы метрик прошлого запуска исказили бы счётчики
             self.app_controller.initialize()
 
+            if Config.METRICS_ENABLED:
+                self.metrics_controller = MetricsController()
+                self.metrics_controller.start()
+
             # 2. Загрузка данных
             self.app_controller.load_data()
 
-            # 3. Запуск синхронизатора
-            if Config.ENABLE_PERIODIC_SYNC:
+            # 3. Пул процессов: воркеры поиска + ingestion-воркер (вместо SyncController)
+            if Config.QUERY_WORKERS > 0:
+                self.worker_pool = WorkerPoolController()
+                self.worker_pool.start()
+                self.app_controller.attach_worker_pool(self.worker_pool)
+
+            # Запуск синхронизатора
+            elif Config.ENABLE_PERIODIC_SYNC:
                 self.sync_controller = SyncController()
                 self.sync_controller.start()
 
+            # Прогрев частых запросов (кэш векторов и результатов, холодные веса моделей)
+            self.app_controller.start_warmup()
+
             # 4. Запуск Telegram бота
             if Config.TELEGRAM_ENABLED:
-                self.bot_controller = BotController()
+                self.bot_controller = BotController(search_backend=self.worker_pool)
                 self.bot_controller.start()
 
-            # 5. Основной цикл (CLI)
-            self.app_controller.run_cli()
+            # 5. Основной цикл (CLI) или ожидание сигнала (headless, например webhook-реплика)
+            if Config.CLI_ENABLED:
+                self.app_controller.run_cli()
+            else:
+                logger.info("🎧 CLI отключён (CLI_ENABLED=false) — ожидание сигнала завершения")
+                signal.pause()
 
         except Exception as e:
             logger.error(f"❌ Критическая ошибка: {e}")
@@ -61,6 +85,10 @@ class Application:
             self.bot_controller.stop()
         if self.sync_controller:
             self.sync_controller.stop()
+        if self.worker_pool:
+            self.worker_pool.stop()
+        if self.metrics_controller:
+            self.metrics_controller.stop()
         self.app_controller.cleanup()
         logger.info("✅ Завершено")
 
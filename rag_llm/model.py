@@ -1,6 +1,7 @@
 # rag_llm/model.py
 
 import ollama
+from hybrid_search.metrics import Tracer
 from hybrid_search.utils import load_env_variable, singleton, logger
 import os
 
@@ -12,15 +13,18 @@ class Model:
         ollama_host = os.getenv('OLLAMA_HOST', 'http://ollama:11434')
 
         self.client = ollama.Client(host=ollama_host, timeout=1200)
+        self.tracer = Tracer()
         logger.info(f"🤖 Ollama модель: {self.model_name}, хост: {ollama_host}")
 
     def get_response(self, messages: list[dict]) -> dict:
         try:
-            response = self.client.chat(
-                model=self.model_name,
-                messages=messages,
-                options={'temperature': 0.7, 'top_p': 0.9, 'num_predict': 1024},
-            )
+            with self.tracer.span("llm_total"):
+                response = self.client.chat(
+                    model=self.model_name,
+                    messages=messages,
+                    options={'temperature': 0.7, 'top_p': 0.9, 'num_predict': 1024},
+                )
+            self._record_timings(response)
 
             # ← Добавьте проверку структуры ответа:
             if not response or 'message' not in response:
@@ -38,6 +42,32 @@ class Model:
             logger.error(f"❌ Ошибка Ollama: {e}")
             return {'message': {'content': f"⚠️ Ошибка: {str(e)[:200]}"}}
 
+    def complete(self, prompt: str, max_tokens: int = 128, temperature: float = 0.3) -> str:
+        """Короткий ответ на один промпт без истории (расширение запроса); ошибки — вызывающему"""
+        response = self.client.chat(
+            model=self.model_name,
+            messages=[{'role': 'user', 'content': prompt}],
+            options={'temperature': temperature, 'num_predict': max_tokens},
+        )
+        return (response.get('message') or {}).get('content', '').strip()
+
+    def _record_timings(self, response):
+        """Переносит тайминги Ollama (наносекунды) в метрики стадий prompt-eval / generation"""
+        try:
+            prompt_eval_ns = response.get('prompt_eval_duration') or 0
+            eval_ns = response.get('eval_duration') or 0
+            if prompt_eval_ns:
+                self.tracer.observe("llm_prompt_eval", prompt_eval_ns / 1e9)
+            if eval_ns:
+                self.tracer.observe("llm_generation", eval_ns / 1e9)
+            prompt_tokens = response.get('prompt_eval_count') or 0
+            generated_tokens = response.get('eval_count') or 0
+            self.tracer.inc("llm_prompt_tokens", prompt_tokens)
+            self.tracer.inc("llm_generated_tokens", generated_tokens)
+            self.tracer.annotate(prompt_tokens=prompt_tokens, generated_tokens=generated_tokens)
+        except Exception as e:
+            logger.debug(f"⚠️  Нет таймингов в ответе Ollama: {e}")
+
     def check_model_available(self) -> bool:
         """Проверяет, доступна ли модель в Ollama"""
         try:
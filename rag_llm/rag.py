@@ -18,7 +18,7 @@ class RAG:
         for match in matches:
             metadata = match.get('metadata', {})
             doc = {
-                'text': metadata.get('content', match.get('text', '')),
+                'text': match.get('text') or metadata.get('content', ''),
                 'title': metadata.get('title', 'Без названия'),
                 'section': metadata.get('section', ''),
                 'url': metadata.get('url', ''),
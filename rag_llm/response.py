@@ -1,8 +1,11 @@
 # rag_llm/response.py
 
 from rag_llm import model, rag, context
+from hybrid_search.metrics import Tracer
+from hybrid_search.querylog import QueryLog
 from hybrid_search.utils import singleton, logger, Config, format_markdown_response
 import re
+import time
 from typing import List, Dict
 
 
@@ -12,11 +15,22 @@ class Response:
         self.model = model.Model()
         self.rag = rag.RAG()
         self.session_manager = context.RedisSession()
+        self.tracer = Tracer()
+        self.query_log = QueryLog()
         logger.info("✅ Response инициализирован")
 
     def query_model(self, session_id: str, query: str, matches: Dict) -> str:
         """Генерирует ответ с Markdown-форматированием и ссылками"""
-        documents = self.rag.get_documents(matches)
+        started, begin = time.time(), time.perf_counter()
+        with self.tracer.trace("generate_total", session_id=session_id) as trace:
+            answer = self._query_model(session_id, query, matches)
+        self.query_log.log_generate(trace, started, time.perf_counter() - begin, query, matches, answer)
+        return answer
+
+    def _query_model(self, session_id: str, query: str, matches: Dict) -> str:
+        with self.tracer.span("prompt_build"):
+            documents = self.rag.get_documents(matches)
+            prompt = self.rag.create_prompt(query, documents) if documents else None
 
         if not documents:
             no_context = (
@@ -31,7 +45,6 @@ class Response:
             self.session_manager.store_conversation(session_id, 'assistant', no_context)
             return no_context
 
-        prompt = self.rag.create_prompt(query, documents)
         self.session_manager.store_conversation(session_id, 'user', query)
 
         messages = self.session_manager.get_conversation(session_id)
@@ -1,21 +1,42 @@
 # telegram_bot/bot.py
 import os
 import asyncio
+import functools
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from hybrid_search.filters import parse_filters
 from hybrid_search.utils import logger, Config
+from hybrid_search.warmup import QueryWarmup
+from telegram_bot.scheduler import SessionScheduler, SessionOverloaded, FairLimiter
+
+NOT_FOUND_MESSAGE = (
+    "⚠️ *Ничего не найдено*\n\n"
+    "Я не нашёл релевантной информации в документации.\n"
+    "Попробуйте:\n"
+    "• Переформулировать вопрос\n"
+    "• Использовать другие ключевые слова"
+)
 
 
 class TelegramBot:
     """✅ Telegram Bot (без обработки сигналов для потока)"""
 
-    def __init__(self):
+    def __init__(self, search_backend=None):
         self.token = Config.TELEGRAM_BOT_TOKEN
         self.webhook_url = Config.TELEGRAM_WEBHOOK_URL
         self.webhook_port = Config.TELEGRAM_WEBHOOK_PORT
         self.semantic = None
         self.response = None
         self.app = None
+        self._search_backend = search_backend  # например, WorkerPoolController
+
+        # ✅ Одна генерация на сессию + честное распределение общих executor'ов между чатами
+        self.scheduler = SessionScheduler(
+            mode=Config.BOT_SESSION_MODE,
+            max_pending=Config.BOT_MAX_PENDING_PER_SESSION
+        )
+        self.search_limiter = FairLimiter("search", Config.BOT_SEARCH_SLOTS, Config.BOT_SLOTS_PER_CHAT)
+        self.llm_limiter = FairLimiter("llm", Config.BOT_LLM_SLOTS, Config.BOT_SLOTS_PER_CHAT)
         logger.info("✅ TelegramBot инициализирован")
 
     def _init_rag_components(self):
@@ -23,7 +44,7 @@ class TelegramBot:
         if self.semantic is None:
             from hybrid_search.search import SemanticSearch
             from rag_llm.response import Response
-            self.semantic = SemanticSearch()
+            self.semantic = self._search_backend or SemanticSearch()
             self.response = Response()
             logger.info("✅ RAG-компоненты инициализированы для Telegram Bot")
 
@@ -50,6 +71,9 @@ class TelegramBot:
             "• /clear — очистить историю переписки\n"
             "• /status — проверить статус системы\n"
             "• /start — начать заново\n\n"
+            "*Фильтры* (в любом месте вопроса):\n"
+            "`space:HR` — пространство, `label:vpn,wifi` — метки,\n"
+            "`since:30d` / `after:2024-01-01` / `before:2024-06-01` — дата обновления\n\n"
             "_Ответы формируются на основе данных из Confluence._"
         )
 
@@ -92,6 +116,8 @@ class TelegramBot:
 
             if not query:
                 return
+            if not parse_filters(query)[1]:
+                QueryWarmup().record(query)
 
             # ✅ Инициализация RAG-компонентов в первом запросе
             self._init_rag_components()
@@ -100,27 +126,21 @@ class TelegramBot:
             await update.message.chat.send_action(action="typing")
             logger.info(f"🔍 Telegram запрос от {chat_id}: {query[:100]}")
 
-            # ✅ Асинхронный вызов блокирующих операций
-            loop = asyncio.get_event_loop()
-            matches = await loop.run_in_executor(None, self.semantic.search, query)
-
-            if not matches.get('matches'):
+            try:
+                answer = await self.scheduler.submit(
+                    session_id,
+                    query,
+                    lambda q: self._answer(chat_id, session_id, q)
+                )
+            except SessionOverloaded:
                 await update.message.reply_text(
-                    "⚠️ *Ничего не найдено*\n\n"
-                    "Я не нашёл релевантной информации в документации.\n"
-                    "Попробуйте:\n"
-                    "• Переформулировать вопрос\n"
-                    "• Использовать другие ключевые слова"
+                    "⏳ Слишком много сообщений подряд — дождитесь ответа на предыдущие."
                 )
                 return
 
-            answer = await loop.run_in_executor(
-                None,
-                self.response.query_model,
-                session_id,
-                query,
-                matches
-            )
+            if answer is None:
+                # Сообщение объединено с предыдущим — ответ придёт на него
+                return
 
             # Telegram лимит 4096 символов
             if len(answer) > 4000:
@@ -136,6 +156,35 @@ class TelegramBot:
                 "⚠️ *Ошибка*\n\nПроизошла ошибка при обработке запроса. Попробуйте позже."
             )
 
+    async def _answer(self, chat_id: int, session_id: str, query: str) -> str:
+        """Поиск + генерация в общих executor'ах с учётом лимитов на чат"""
+        # ✅ Асинхронный вызов блокирующих операций
+        loop = asyncio.get_event_loop()
+
+        # Фильтры из текста (space:, label:, since:, after:, before:) — в where поиска
+        query, search_filters = parse_filters(query)
+        if not query:
+            return "⚠️ Напишите вопрос после фильтров, например: `label:vpn как подключиться?`"
+
+        async with self.search_limiter.slot(chat_id):
+            matches = await loop.run_in_executor(
+                None, functools.partial(self.semantic.search, query, filters=search_filters)
+            )
+
+        if not matches.get('matches'):
+            if search_filters:
+                return f"{NOT_FOUND_MESSAGE}\n\n_Фильтры: {search_filters.describe()}_"
+            return NOT_FOUND_MESSAGE
+
+        async with self.llm_limiter.slot(chat_id):
+            return await loop.run_in_executor(
+                None,
+                self.response.query_model,
+                session_id,
+                query,
+                matches
+            )
+
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Логирование ошибок"""
         logger.error(f"❌ Telegram error: {context.error}")
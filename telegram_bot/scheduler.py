@@ -0,0 +1,158 @@
+# telegram_bot/scheduler.py
+import asyncio
+from collections import OrderedDict, defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+from hybrid_search.metrics import Tracer
+from hybrid_search.utils import logger
+
+
+class SessionOverloaded(Exception):
+    """В очереди сессии слишком много необработанных сообщений"""
+
+
+class FairLimiter:
+    """
+    ✅ Глобальный лимит параллельных задач с честным распределением между ключами (чатами).
+
+    Не больше `capacity` задач одновременно и не больше `per_key_limit` от одного ключа;
+    ожидающие обслуживаются по кругу (round-robin по ключам), а не FIFO —
+    один шумный чат не может занять очередь перед остальными.
+    """
+
+    def __init__(self, name: str, capacity: int, per_key_limit: int):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.per_key_limit = max(1, per_key_limit)
+        self.active = 0
+        self.active_by_key: Dict[Hashable, int] = defaultdict(int)
+        self.waiters: "OrderedDict[Hashable, deque]" = OrderedDict()
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self.waiters.values())
+
+    def _can_grant(self, key) -> bool:
+        return self.active < self.capacity and self.active_by_key[key] < self.per_key_limit
+
+    def _grant(self, key):
+        self.active += 1
+        self.active_by_key[key] += 1
+
+    async def acquire(self, key):
+        if not self.waiters and self._can_grant(key):
+            self._grant(key)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(key, deque()).append(future)
+        # Ожидающие могут упираться только в свой per_key_limit: свободный слот выдаётся сразу
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже выдан, но задача отменена — возвращаем его
+                self.release(key)
+            else:
+                queue = self.waiters.get(key)
+                if queue and future in queue:
+                    queue.remove(future)
+                    if not queue:
+                        del self.waiters[key]
+            raise
+
+    def release(self, key):
+        self.active -= 1
+        self.active_by_key[key] -= 1
+        if self.active_by_key[key] <= 0:
+            del self.active_by_key[key]
+        self._dispatch()
+
+    def _dispatch(self):
+        """Выдаёт освободившиеся слоты ожидающим по кругу"""
+        progressed = True
+        while progressed and self.waiters and self.active < self.capacity:
+            progressed = False
+            for key in list(self.waiters.keys()):
+                if not self._can_grant(key):
+                    continue
+                queue = self.waiters[key]
+                future = queue.popleft()
+                if not queue:
+                    del self.waiters[key]
+                else:
+                    self.waiters.move_to_end(key)
+                if future.cancelled():
+                    progressed = True
+                    continue
+                self._grant(key)
+                future.set_result(True)
+                progressed = True
+                break
+
+    @asynccontextmanager
+    async def slot(self, key):
+        await self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+
+class _SessionState:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = []
+        self.waiting = 0
+
+
+class SessionScheduler:
+    """
+    ✅ Планировщик запросов Telegram-сессий.
+
+    В каждой сессии выполняется не больше одной генерации одновременно.
+    Сообщения, пришедшие во время генерации, либо ставятся в очередь (mode="queue"),
+    либо склеиваются в один запрос (mode="coalesce").
+    """
+
+    def __init__(self, mode: str = "coalesce", max_pending: int = 5):
+        self.mode = mode if mode in ("coalesce", "queue") else "coalesce"
+        self.max_pending = max(1, max_pending)
+        self._sessions: Dict[str, _SessionState] = {}
+        self.tracer = Tracer()
+
+    async def submit(self, session_id: str, query: str,
+                     work: Callable[[str], Awaitable[str]]) -> Optional[str]:
+        """
+        Выполняет work(query) в очереди сессии.
+        Возвращает результат или None, если сообщение склеено с другим и ответ уйдёт туда.
+        """
+        state = self._sessions.setdefault(session_id, _SessionState())
+        if state.waiting >= self.max_pending:
+            self.tracer.inc("bot_session_rejected")
+            raise SessionOverloaded(session_id)
+
+        state.pending.append(query)
+        state.waiting += 1
+        try:
+            async with state.lock:
+                if self.mode == "coalesce":
+                    if not state.pending:
+                        # Наш текст уже обработан вместе с предыдущим запуском
+                        self.tracer.inc("bot_session_coalesced")
+                        return None
+                    queries, state.pending = state.pending, []
+                    combined = "\n".join(queries)
+                    if len(queries) > 1:
+                        logger.info(f"🧩 Сессия {session_id}: объединено {len(queries)} сообщений")
+                else:
+                    state.pending.remove(query)
+                    combined = query
+
+                return await work(combined)
+        finally:
+            state.waiting -= 1
+            if state.waiting == 0 and not state.lock.locked():
+                self._sessions.pop(session_id, None)
@@ -0,0 +1,115 @@
+# telegram_bot/webhook.py
+import json
+from http import HTTPStatus
+
+from prometheus_client import CONTENT_TYPE_LATEST
+from telegram import Update
+
+from hybrid_search.metrics import Tracer
+from hybrid_search.startup import StartupManager
+from hybrid_search.utils import logger
+
+
+class WebhookApp:
+    """
+    ✅ ASGI-приложение для webhook-режима Telegram.
+
+    POST <path>  — приём Update от Telegram (быстрый ack, обработка в очереди PTB)
+    GET /health  — liveness: процесс жив и отвечает
+    GET /ready   — readiness: PTB запущен и RAG-компоненты загружены
+    GET /metrics — метрики в формате Prometheus
+    """
+
+    def __init__(self, application, bot, path: str = "/telegram", secret_token: str = ""):
+        self.application = application
+        self.bot = bot
+        self.path = path
+        self.secret_token = secret_token
+        self.tracer = Tracer()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        path = scope.get('path', '')
+        method = scope.get('method', 'GET')
+
+        if path == self.path and method == 'POST':
+            await self._handle_update(scope, receive, send)
+        elif path == '/health':
+            await self._respond(send, HTTPStatus.OK, b'ok')
+        elif path == '/ready':
+            ready = self.is_ready()
+            await self._respond(send, HTTPStatus.OK if ready else HTTPStatus.SERVICE_UNAVAILABLE,
+                                b'ready' if ready else b'not ready')
+        elif path == '/metrics':
+            body = self.tracer.render_prometheus().encode('utf-8')
+            await self._respond(send, HTTPStatus.OK, body, CONTENT_TYPE_LATEST)
+        else:
+            await self._respond(send, HTTPStatus.NOT_FOUND, b'not found')
+
+    def is_ready(self) -> bool:
+        """Готовность принимать трафик (для балансировщика)"""
+        return bool(
+            self.application.running
+            and self.bot.semantic is not None
+            and StartupManager().is_ready()
+        )
+
+    async def _handle_update(self, scope, receive, send):
+        if self.secret_token:
+            headers = dict(scope.get('headers') or [])
+            received = headers.get(b'x-telegram-bot-api-secret-token', b'').decode('latin-1')
+            if received != self.secret_token:
+                logger.warning("⚠️  Webhook: неверный secret token")
+                await self._respond(send, HTTPStatus.FORBIDDEN, b'forbidden')
+                return
+
+        try:
+            payload = json.loads(await self._read_body(receive))
+            update = Update.de_json(payload, self.application.bot)
+        except Exception as e:
+            logger.warning(f"⚠️  Webhook: некорректный Update: {e}")
+            await self._respond(send, HTTPStatus.BAD_REQUEST, b'bad request')
+            return
+
+        # Отвечаем Telegram сразу — сама обработка идёт в очереди Application
+        await self.application.update_queue.put(update)
+        self.tracer.inc("webhook_updates")
+        await self._respond(send, HTTPStatus.OK, b'ok')
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+        return body
+
+    @staticmethod
+    async def _respond(send, status: HTTPStatus, body: bytes, content_type: str = 'text/plain; charset=utf-8'):
+        await send({
+            'type': 'http.response.start',
+            'status': int(status),
+            'headers': [
+                (b'content-type', content_type.encode('latin-1')),
+                (b'content-length', str(len(body)).encode('latin-1')),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    async def _lifespan(receive, send):
+        # Жизненным циклом PTB управляет BotController — здесь только подтверждаем события
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,19 @@
+# tests/test_bm25.py
+from hybrid_search import bm25 as bm25_store
+from hybrid_search.utils import Config
+
+
+def test_model_is_loaded_only_with_its_analyzer(tmp_path, monkeypatch):
+    """Модель, обученная другим конвейером ANALYZER_STEPS, не загружается"""
+    monkeypatch.setattr(Config, 'CHROMA_DB_PATH', str(tmp_path))
+    model = bm25_store.StreamingBM25()
+    bm25_store.save_model(model, Config.CHROMA_COLLECTION, 'stopwords+stem')
+
+    assert bm25_store.load_model(Config.CHROMA_COLLECTION, 'regex') is None
+    assert isinstance(bm25_store.load_model(Config.CHROMA_COLLECTION, 'stopwords+stem'), bm25_store.StreamingBM25)
+
+
+def test_missing_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'CHROMA_DB_PATH', str(tmp_path))
+    assert bm25_store.load_model(Config.CHROMA_COLLECTION, 'regex') is None
+    assert bm25_store.model_mtime(Config.CHROMA_COLLECTION) is None
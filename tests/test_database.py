@@ -0,0 +1,60 @@
+# tests/test_database.py
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DATABASE_SCRIPT = """
+import json
+import sys
+import types
+
+from benchmarks.stubs import QUERIES_PATH, install_stand_ins
+from hybrid_search.utils import Config
+
+Config.WARMUP_ENABLED = False
+install_stand_ins(sys.argv[1])
+from hybrid_search.database import Database
+from hybrid_search.embed import Embed
+from hybrid_search.update import UpdateDatabase
+
+UpdateDatabase().load_all()
+db, embedder = Database(), Embed()
+embedder.use_bm25(db.index_name)  # как SemanticSearch перед поиском
+with open(QUERIES_PATH, encoding='utf-8') as f:
+    query = json.load(f)[0]['query']
+dense, sparse = embedder.embed_text(query), embedder.embed_sparse(query)
+
+ids = [chunk['id'] for chunk in db.search(dense, sparse)]
+with db.page_store._lock:
+    db.page_store._conn.executemany("DELETE FROM sparse WHERE chunk_id = ?", [(i,) for i in ids[:3]])
+    db.page_store._conn.commit()
+without_rows = [chunk['id'] for chunk in db.search(dense, sparse)]
+
+# Legacy-индекс, у первого чанка которого нет терминов (sparse_indices не записан)
+legacy_chunks = [{'document_id': '1', 'content': 'a'}, {'document_id': '2', 'content': 'b', 'sparse_indices': '[1]'}]
+fake = types.SimpleNamespace(index_name='legacy_probe', collection=types.SimpleNamespace(
+    get=lambda limit, include: {'ids': ['1-0', '2-0'][:limit], 'metadatas': legacy_chunks[:limit]}))
+type(db)._init_schema(fake)
+db.page_store.bind(db.index_name)
+
+print(json.dumps({'sparse': sparse['indices'][:5], 'with_rows': ids, 'without_rows': without_rows,
+                  'legacy_schema': fake.schema, 'schema': db.schema}))
+"""
+
+
+def test_sparse_boost_tolerates_chunks_without_sparse_row(tmp_path):
+    """Чанк без строки в PageStore.sparse не обнуляет выдачу; legacy-схема определяется не по одному чанку"""
+    script = tmp_path / 'database_probe.py'
+    script.write_text(DATABASE_SCRIPT)
+    output = subprocess.run([sys.executable, str(script), str(tmp_path / 'chroma')],
+                            env=dict(os.environ, PYTHONPATH=ROOT), capture_output=True, text=True,
+                            check=True, cwd=tmp_path).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+
+    assert result['schema'] == 'slim' and result['sparse'] != [0]
+    assert result['with_rows']
+    assert sorted(result['without_rows']) == sorted(result['with_rows'])
+    assert result['legacy_schema'] == 'legacy'
@@ -0,0 +1,41 @@
+# tests/test_expansion.py
+import threading
+
+import pytest
+
+from hybrid_search.expansion import QueryExpander, rule_variants
+from hybrid_search.utils import Config
+
+
+@pytest.fixture
+def expander(monkeypatch):
+    monkeypatch.setattr(Config, 'QUERY_EXPANSION_LLM', True)
+    monkeypatch.setattr(Config, 'QUERY_EXPANSION_BUDGET_MS', 100.0)
+    instance = QueryExpander()
+    release = threading.Event()
+
+    def slow_llm(query, mode):
+        release.wait(2.0)
+        return [f"{query} (перефразировка)"]
+
+    monkeypatch.setattr(instance, '_ask_llm', slow_llm)
+    monkeypatch.setattr(instance, '_search_cost', 0.03)
+    with instance._lock:
+        instance._cache.clear()
+    yield instance
+    release.set()
+    instance._llm_pool.submit(lambda: None).result()  # дождаться освобождения потока LLM
+
+
+def test_llm_timeout_falls_back_to_rules(expander):
+    """LLM не успевает в бюджет — варианты по правилам, а не отказ от расширения"""
+    query = "Как настроить VPN на ноутбуке?"
+    variants, source = expander.expand(query, mode='both')
+
+    assert source == 'rules'
+    assert variants == rule_variants(query, 'both')
+
+
+def test_expansion_skipped_when_search_alone_exceeds_budget(expander, monkeypatch):
+    monkeypatch.setattr(expander, '_search_cost', 0.2)
+    assert expander.expand("Как настроить VPN?", mode='both') == ([], 'budget')
@@ -0,0 +1,18 @@
+# tests/test_filters.py
+from hybrid_search.filters import SearchFilters, parse_filters
+
+
+def test_merge_does_not_mutate_caller_filters():
+    _, filters = parse_filters("space:HR label:vpn как подключить VPN?")
+
+    merged = SearchFilters.merge(filters, ['IT'])
+    again = SearchFilters.merge(filters, ['DEV'])
+
+    assert filters.spaces == ['HR']
+    assert merged.spaces == ['HR', 'IT'] and merged.labels == ['vpn']
+    assert again.spaces == ['HR', 'DEV']
+
+
+def test_merge_without_filters():
+    assert SearchFilters.merge(None, ['HR', 'HR']).spaces == ['HR']
+    assert not SearchFilters.merge(None, None)
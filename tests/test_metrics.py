@@ -0,0 +1,62 @@
+# tests/test_metrics.py
+import os
+import subprocess
+import sys
+import textwrap
+
+from prometheus_client.parser import text_string_to_metric_families
+
+from hybrid_search.metrics import Tracer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def samples(text: str):
+    return {(s.name, tuple(sorted(s.labels.items()))): s.value
+            for family in text_string_to_metric_families(text) for s in family.samples}
+
+
+def test_render_prometheus_exposes_stages_and_events():
+    tracer = Tracer()
+    tracer.reset()
+    tracer.observe('rerank', 0.02)
+    tracer.observe('rerank', 0.3)
+    tracer.inc('rerank_pairs_scored', 12)
+
+    parsed = samples(tracer.render_prometheus())
+
+    assert parsed[('rag_stage_duration_seconds_count', (('stage', 'rerank'),))] == 2
+    assert parsed[('rag_stage_duration_seconds_bucket', (('le', '0.025'), ('stage', 'rerank')))] == 1
+    assert parsed[('rag_events_total', (('event', 'rerank_pairs_scored'),))] == 12
+
+
+def test_multiprocess_mode_sums_pool_processes(tmp_path):
+    """Наблюдения из процессов-воркеров видны в /metrics основного процесса"""
+    script = textwrap.dedent("""
+        import multiprocessing as mp
+        from hybrid_search.metrics import Tracer, mark_process_dead, prepare_multiprocess_dir
+
+        def worker():
+            Tracer().observe('query_encode', 0.01)
+            Tracer().inc('search_errors')
+
+        if __name__ == '__main__':
+            prepare_multiprocess_dir()
+            Tracer().inc('search_errors')
+            processes = [mp.get_context('spawn').Process(target=worker) for _ in range(2)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+                mark_process_dead(process.pid)
+            print(Tracer().render_prometheus())
+    """)
+    path = tmp_path / 'pool.py'
+    path.write_text(script)
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path / 'metrics'), PYTHONPATH=ROOT)
+    output = subprocess.run([sys.executable, str(path)], env=env, capture_output=True, text=True,
+                            check=True, cwd=tmp_path).stdout
+
+    parsed = samples(output)
+    assert parsed[('rag_events_total', (('event', 'search_errors'),))] == 3
+    assert parsed[('rag_stage_duration_seconds_count', (('stage', 'query_encode'),))] == 2
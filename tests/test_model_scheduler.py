@@ -0,0 +1,51 @@
+# tests/test_model_scheduler.py
+import sys
+import threading
+import types
+
+import pytest
+
+import hybrid_search.scheduler as scheduler
+from hybrid_search.scheduler import ModelScheduler
+from hybrid_search.utils import Config
+
+
+@pytest.fixture
+def torch_threads(monkeypatch):
+    """Вызовы torch.set_num_threads (модуль torch подменяется записью вызовов)"""
+    calls = []
+    monkeypatch.setitem(sys.modules, 'torch', types.SimpleNamespace(set_num_threads=calls.append))
+    monkeypatch.setattr(scheduler, '_process_threads', None)
+    monkeypatch.setattr(scheduler.os, 'cpu_count', lambda: 8)
+    monkeypatch.setattr(Config, 'SERVING_TORCH_THREADS', 0)
+    monkeypatch.setattr(Config, 'INGEST_TORCH_THREADS', 1)
+    monkeypatch.setattr(Config, 'QUERY_WORKERS', 0)
+    return calls
+
+
+def test_background_batches_keep_serving_thread_budget(torch_threads):
+    """Синхронизация в потоке основного процесса не сужает бюджет torch поиска"""
+    models = ModelScheduler()
+
+    def ingest():
+        with models.background():
+            pass
+
+    thread = threading.Thread(target=ingest)
+    thread.start()
+    thread.join()
+    with models.foreground():
+        pass
+    with models.foreground():
+        pass
+
+    assert torch_threads == [8]
+
+
+def test_worker_budget_is_not_overridden(torch_threads):
+    """Бюджет, выставленный при старте воркера пула, остаётся в силе"""
+    scheduler.set_torch_threads(2)
+    with ModelScheduler().foreground():
+        pass
+
+    assert torch_threads == [2]
@@ -0,0 +1,48 @@
+# tests/test_quantized.py
+import threading
+import time
+
+import numpy as np
+
+from hybrid_search.quantized import Int8VectorIndex
+
+
+class FakeCollection:
+    """collection.get ChromaDB по словарю id → вектор; gate задерживает чтение (фоновая сборка)"""
+
+    def __init__(self, vectors, gate: threading.Event = None):
+        self.vectors = vectors
+        self.gate = gate
+
+    def get(self, limit, offset, include):
+        if self.gate is not None:
+            self.gate.wait(5)
+        ids = list(self.vectors)[offset:offset + limit]
+        return {'ids': ids, 'embeddings': [self.vectors[i] for i in ids]}
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+def test_refresh_serves_old_codes_until_rebuilt():
+    index = Int8VectorIndex()
+    index.build(FakeCollection({'a': unit(1, 0, 0), 'b': unit(0, 1, 0)}))
+
+    gate = threading.Event()
+    index.refresh(FakeCollection({'a': unit(1, 0, 0), 'b': unit(0, 1, 0), 'c': unit(0, 0, 1)}, gate))
+    assert index.search(unit(0, 0, 1), 1) != ['c']  # сборка ещё идёт — прежние коды
+    index.upsert(['d'], unit(1, 1, 0))  # запись во время сборки не теряется
+
+    gate.set()
+    wait_for(lambda: len(index) == 4)
+    assert index.search(unit(0, 0, 1), 1) == ['c']
+    assert index.search(unit(1, 1, 0), 1) == ['d']
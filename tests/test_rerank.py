@@ -0,0 +1,51 @@
+# tests/test_rerank.py
+import numpy as np
+import pytest
+
+from hybrid_search.rerank import AdaptiveReranker
+from hybrid_search.utils import Config
+
+
+@pytest.fixture(autouse=True)
+def rerank_config(monkeypatch):
+    monkeypatch.setattr(Config, 'RERANK_TOP_K', 10)
+    monkeypatch.setattr(Config, 'RERANK_MIN_SCORE', 0.45)
+    monkeypatch.setattr(Config, 'RERANK_BATCH_SIZE', 8)
+    monkeypatch.setattr(Config, 'RERANK_PATIENCE', 2)
+    monkeypatch.setattr(Config, 'RERANK_EARLY_EXIT_MARGIN', 0.05)
+    monkeypatch.setattr(Config, 'RERANK_CACHE_SIZE', 0)
+
+
+def candidates(n: int):
+    """Кандидаты первого этапа c0..c{n-1} по убыванию score"""
+    return [{'id': f'c{i}', 'text': f'text {i}', 'score': 1.0 - i / n} for i in range(n)]
+
+
+def predict_relevant(relevant):
+    def predict(pairs):
+        return np.array([0.9 if text.split()[1] in relevant else 0.1 for _, text in pairs])
+    return predict
+
+
+def test_adaptive_keeps_scoring_until_top_is_full():
+    """Релевантные чанки на позициях 20–24 первого этапа: пустой топ не повод для раннего выхода"""
+    predict = predict_relevant({str(i) for i in range(20, 25)})
+
+    adaptive = AdaptiveReranker(predict).rerank('q', candidates(40), adaptive=True)
+    exhaustive = AdaptiveReranker(predict).rerank('q', candidates(40), adaptive=False)
+
+    assert {c['id'] for c in exhaustive} == {f'c{i}' for i in range(20, 25)}
+    assert [c['id'] for c in adaptive] == [c['id'] for c in exhaustive]
+
+
+def test_adaptive_exits_early_once_top_is_full_and_stable():
+    predict_calls = []
+
+    def predict(pairs):
+        predict_calls.append(len(pairs))
+        return np.array([0.9 if int(text.split()[1]) < 10 else 0.1 for _, text in pairs])
+
+    result = AdaptiveReranker(predict).rerank('q', candidates(60), adaptive=True)
+
+    assert [c['id'] for c in result] == [f'c{i}' for i in range(10)]
+    assert sum(predict_calls) < 60
@@ -0,0 +1,44 @@
+# tests/test_scheduler.py
+import asyncio
+
+from telegram_bot.scheduler import FairLimiter
+
+
+def test_blocked_chat_does_not_stall_others():
+    """Чат A упёрся в per_key_limit и ждёт; чат B получает свободный глобальный слот сразу"""
+    async def scenario():
+        limiter = FairLimiter("test", capacity=4, per_key_limit=1)
+        await limiter.acquire('A')
+        queued_a = asyncio.create_task(limiter.acquire('A'))
+        await asyncio.sleep(0)
+        assert limiter.queued == 1
+
+        await asyncio.wait_for(limiter.acquire('B'), timeout=0.2)
+        assert limiter.active == 2
+        assert not queued_a.done()
+
+        limiter.release('A')
+        await asyncio.wait_for(queued_a, timeout=0.2)
+        assert limiter.active_by_key == {'A': 1, 'B': 1}
+
+    asyncio.run(scenario())
+
+
+def test_waiters_are_served_round_robin():
+    async def scenario():
+        limiter = FairLimiter("test", capacity=1, per_key_limit=1)
+        await limiter.acquire('A')
+        order = []
+
+        async def worker(key):
+            async with limiter.slot(key):
+                order.append(key)
+                await asyncio.sleep(0)
+
+        tasks = [asyncio.create_task(worker(key)) for key in ('A', 'A', 'B')]
+        await asyncio.sleep(0)
+        limiter.release('A')
+        await asyncio.gather(*tasks)
+        assert order == ['A', 'B', 'A']
+
+    asyncio.run(scenario())
@@ -0,0 +1,96 @@
+# tests/test_snapshot.py
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tarfile
+
+from hybrid_search.snapshot import _merge_sqlite
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCHEMA = """
+    CREATE TABLE pages (page_id TEXT PRIMARY KEY, metadata TEXT NOT NULL);
+    CREATE TABLE parents (chunk_id TEXT PRIMARY KEY, page_id TEXT NOT NULL,
+                          first INTEGER NOT NULL, last INTEGER NOT NULL);
+"""
+
+
+def make_db(path, script: str):
+    conn = sqlite3.connect(path)
+    conn.executescript(script)
+    conn.commit()
+    conn.close()
+
+
+def test_merge_restores_parent_windows(tmp_path):
+    target, source = str(tmp_path / 'live.sqlite3'), str(tmp_path / 'snap.sqlite3')
+    make_db(target, SCHEMA)
+    make_db(source, SCHEMA + "INSERT INTO parents VALUES ('p1_chunk_3', 'p1', 2, 4);")
+
+    _merge_sqlite(target, source, ('pages', 'parents'))
+
+    conn = sqlite3.connect(target)
+    assert conn.execute("SELECT * FROM parents").fetchall() == [('p1_chunk_3', 'p1', 2, 4)]
+    conn.close()
+
+
+def test_merge_skips_tables_missing_in_old_snapshot(tmp_path):
+    target, source = str(tmp_path / 'live.sqlite3'), str(tmp_path / 'snap.sqlite3')
+    make_db(target, SCHEMA)
+    make_db(source, "CREATE TABLE pages (page_id TEXT PRIMARY KEY, metadata TEXT NOT NULL);"
+                    "INSERT INTO pages VALUES ('p1', '{}');")
+
+    _merge_sqlite(target, source, ('pages', 'parents'))
+
+    conn = sqlite3.connect(target)
+    assert conn.execute("SELECT page_id FROM pages").fetchall() == [('p1',)]
+    conn.close()
+
+
+RESTORE_SCRIPT = """
+import json
+import sys
+
+from benchmarks.stubs import QUERIES_PATH, install_stand_ins
+from hybrid_search.utils import Config
+
+phase, chroma_path, bundle = sys.argv[1:4]
+Config.WARMUP_ENABLED = False
+install_stand_ins(chroma_path)
+from hybrid_search import snapshot
+
+if phase == 'export':
+    from hybrid_search.update import UpdateDatabase
+    UpdateDatabase().load_all()
+    snapshot.export_snapshot(bundle, include_watermarks=False)
+else:
+    from hybrid_search.embed import Embed
+    from hybrid_search.search import SemanticSearch
+    snapshot.restore_snapshot(bundle, restore_watermarks=False)
+    with open(QUERIES_PATH, encoding='utf-8') as f:
+        query = json.load(f)[0]['query']
+    matches = SemanticSearch().search(query, warmup=False)['matches']
+    print(json.dumps({'sparse': Embed().embed_sparse(query)['indices'], 'matches': len(matches)}))
+"""
+
+
+def test_restored_replica_searches_with_sparse_boost(tmp_path):
+    """Снимок переносит модель BM25: sparse-вектор запроса на восстановленной реплике не пустой"""
+    script = tmp_path / 'snapshot_roundtrip.py'
+    script.write_text(RESTORE_SCRIPT)
+    bundle = str(tmp_path / 'index.snapshot')
+    env = dict(os.environ, PYTHONPATH=ROOT)
+
+    def run(phase: str, chroma_dir: str) -> str:
+        return subprocess.run([sys.executable, str(script), phase, str(tmp_path / chroma_dir), bundle],
+                              env=env, capture_output=True, text=True, check=True, cwd=tmp_path).stdout
+
+    run('export', 'source')
+    with tarfile.open(bundle) as tar:
+        assert 'bm25.pickle' in tar.getnames()
+
+    result = json.loads(run('restore', 'replica').strip().splitlines()[-1])
+    assert result['matches'] > 0
+    assert result['sparse'] != [0]
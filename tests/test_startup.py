@@ -0,0 +1,27 @@
+# tests/test_startup.py
+import os
+
+import hybrid_search.embed as embed
+import hybrid_search.startup as startup
+from hybrid_search.startup import StartupManager
+from hybrid_search.utils import Config
+
+
+def test_model_cache_is_configured_before_hf_import(monkeypatch, tmp_path):
+    """HF_HOME и HF_HUB_OFFLINE выставлены до импорта sentence_transformers (их читает huggingface_hub)"""
+    for name in ('HF_HOME', 'SENTENCE_TRANSFORMERS_HOME', 'HF_HUB_OFFLINE', 'TRANSFORMERS_OFFLINE'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(Config, 'MODEL_CACHE_DIR', str(tmp_path / 'models'))
+    monkeypatch.setattr(Config, 'MODEL_OFFLINE', True)
+    seen = {}
+
+    def record_import(module_name):
+        seen[module_name] = (os.environ.get('HF_HOME'), os.environ.get('HF_HUB_OFFLINE'))
+        return 0.0
+
+    monkeypatch.setattr(startup, 'timed_import', record_import)
+    monkeypatch.setattr(embed, 'Embed', lambda: None)
+
+    StartupManager()._load_embed()
+
+    assert seen['sentence_transformers'] == (str(tmp_path / 'models'), '1')
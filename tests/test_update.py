@@ -0,0 +1,97 @@
+# tests/test_update.py
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RESUME_SCRIPT = """
+import json
+import sqlite3
+import sys
+
+from benchmarks.stubs import install_stand_ins
+from hybrid_search.utils import Config
+
+Config.WARMUP_ENABLED = False
+stand_ins = install_stand_ins(sys.argv[1])
+confluence = stand_ins['confluence']
+fetched = []
+get_page_full = confluence.get_page_full
+confluence.get_page_full = lambda page_id: fetched.append(page_id) or get_page_full(page_id)
+
+from hybrid_search.manifest import IndexManifest
+from hybrid_search.update import UpdateDatabase
+
+updater = UpdateDatabase()
+updater.load_all()
+total = len(fetched)
+
+# Прерванная загрузка: две последние страницы не успели попасть в манифест
+manifest = IndexManifest()
+pending = list(confluence.index)[-2:]
+conn = sqlite3.connect(manifest.path)
+conn.executemany("DELETE FROM pages WHERE page_id = ?", [(page_id,) for page_id in pending])
+conn.commit()
+conn.close()
+
+fetched.clear()
+updater.load_all(resume=True)
+print(json.dumps({'total': total, 'pending': pending, 'fetched': fetched}))
+"""
+
+
+def test_resumed_in_memory_load_fetches_only_pending_pages(tmp_path):
+    script = tmp_path / 'resume.py'
+    script.write_text(RESUME_SCRIPT)
+    output = subprocess.run([sys.executable, str(script), str(tmp_path / 'chroma')],
+                            env=dict(os.environ, PYTHONPATH=ROOT), capture_output=True, text=True,
+                            check=True, cwd=tmp_path).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+
+    assert result['total'] > len(result['pending'])
+    assert result['fetched'] == result['pending']
+
+
+class FakeConfluence:
+    def __init__(self, spaces):
+        self.spaces = spaces
+        self.space_keys = list(spaces)
+
+    def get_space_id(self, space_key):
+        return space_key
+
+    def get_page_ids(self, space_id, space_key=None):
+        return {page_id: {'title': page_id} for page_id in self.spaces[space_key]}
+
+    def get_time(self, page_id):
+        return '2024-01-01T00:00:00.000Z'
+
+
+class FakeRedis:
+    def get(self, key):
+        return None
+
+
+class FakeDatabase:
+    def current_collection(self):
+        return 'confluence'
+
+
+def test_sync_all_spaces_shares_max_pages(monkeypatch):
+    """max_pages — на весь цикл: три пространства по 10 страниц при лимите 12 проверяют 12 страниц"""
+    from hybrid_search.update import UpdateDatabase
+
+    updater = UpdateDatabase.__new__(UpdateDatabase)
+    updater.confluence_api = FakeConfluence({key: [f'{key}-{i}' for i in range(10)] for key in 'ABC'})
+    updater.redis = FakeRedis()
+    updater.db = FakeDatabase()
+    updated = []
+    monkeypatch.setattr(updater, 'update_page', lambda page_id, info: updated.append(page_id) or 1, raising=False)
+
+    stats = updater.sync_all_spaces(max_pages=12)
+
+    assert stats['checked'] == 12
+    assert len(updated) == 12
+    assert updater.sync_all_spaces()['checked'] == 30
@@ -0,0 +1,38 @@
+# tests/test_worker_pool.py
+import queue
+import time
+import types
+
+import hybrid_search.search
+import hybrid_search.warmup
+from controllers.worker_controller import _query_worker_main
+from hybrid_search.metrics import Tracer
+
+
+class CountingSearch:
+    def __init__(self):
+        self.queries = []
+
+    def search(self, query, n_results=None, spaces=None, filters=None):
+        self.queries.append(query)
+        return {'matches': [], 'query': query}
+
+
+def test_worker_skips_requests_past_deadline(monkeypatch):
+    """Запрос, дождавшийся воркера после таймаута клиента, не выполняется"""
+    semantic = CountingSearch()
+    monkeypatch.setattr(hybrid_search.search, 'SemanticSearch', lambda: semantic)
+    monkeypatch.setattr(hybrid_search.warmup, 'QueryWarmup', lambda: types.SimpleNamespace(run=lambda *a, **k: None))
+    tracer = Tracer()
+    tracer.reset()
+
+    requests, responses = queue.Queue(), queue.Queue()
+    requests.put((1, time.time() - 1, 'expired', None, None, None))
+    requests.put((2, time.time() + 60, 'fresh', None, None, None))
+    requests.put(None)
+    _query_worker_main(0, requests, responses, types.SimpleNamespace(value=0), torch_threads=0)
+
+    assert semantic.queries == ['fresh']
+    replies = [responses.get_nowait() for _ in range(responses.qsize())]
+    assert [(kind, key) for kind, key, _ in replies] == [('ready', 'query-0'), ('result', 2)]
+    assert tracer.counters()['worker_expired_requests'] == 1